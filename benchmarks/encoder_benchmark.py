@@ -0,0 +1,74 @@
+"""Micro-benchmark of the frame encoding: the compiled encoder plan against the original conversion path.
+
+Run from the root of the repository:
+
+    python -m benchmarks.encoder_benchmark [-c config.ini] [-n 20000]
+"""
+import argparse
+import timeit
+
+from weathervane.parser import WeathervaneConfigParser
+from weathervane.weathervaneinterface import WeatherVaneInterface
+
+WEATHER_DATA = {
+    "winddirection": "WZW",
+    "windspeed": 3.3,
+    "windgusts": 5.5,
+    "windspeedBft": 2,
+    "airpressure": 1014.8,
+    "temperature": 20.2,
+    "feeltemperature": 20.2,
+    "humidity": 73.0,
+    "data_from_fallback": False,
+    "barometric_trend": 4,
+    "precipitation": 45.2,
+    "error": False,
+    "rainFallLastHour": 1.3,
+    "rainFallLast24Hour": 4.0,
+    "sunpower": 355.0,
+}
+
+
+def original_convert_data(interface, weather_data):
+    """The conversion as it was done before the encoder plan: the configuration is re-read on every call"""
+    t_data = interface.transmittable_data(weather_data, interface.bits)
+    r = 0b0
+    length = 0
+    for data in interface.bits:
+        bit_length = int(data["length"])
+        length += bit_length
+        r = r << bit_length
+        r += t_data[data["key"]]
+    return r.to_bytes(length // 8, byteorder="big")
+
+
+def create_interface(config_file):
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(config_file)
+    configuration = config_parser.parse_config()
+    configuration["test"] = True
+    return WeatherVaneInterface(**configuration)
+
+
+def measure(function, number):
+    seconds = min(timeit.repeat(function, number=number, repeat=5))
+    return number / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the encodes per second of both conversion paths")
+    parser.add_argument("-c", "--config", default="config.ini", help="the configuration with the [Bit Packing]")
+    parser.add_argument("-n", "--number", type=int, default=20000, help="the number of encodes per measurement")
+    args = parser.parse_args()
+
+    interface = create_interface(args.config)
+    original = measure(lambda: original_convert_data(interface, WEATHER_DATA), args.number)
+    compiled = measure(lambda: interface.convert_data(WEATHER_DATA), args.number)
+
+    print(f"{interface.encoder!r}")
+    print(f"original path: {original:12.0f} encodes/s")
+    print(f"encoder plan:  {compiled:12.0f} encodes/s ({compiled / original:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
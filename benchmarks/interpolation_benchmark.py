@@ -0,0 +1,68 @@
+"""Benchmark of the interpolation between two collections: the interpolation engine against the original path.
+
+The weather data comes from the offline test data source, decoded in full, so it holds the strings (station name,
+timestamp, description) that the original path tried to convert into numbers on every frame.
+
+Run from the root of the repository:
+
+    python -m benchmarks.interpolation_benchmark [-n 20000]
+"""
+import argparse
+import timeit
+
+from weathervane.interpolation import NON_INTERPOLATABLE_VARIABLES, Interpolator
+from weathervane.testsource import TestDataSource
+
+BITS = [{"key": key} for key in ("windspeed", "windgusts", "airpressure", "temperature", "humidity", "winddirection")]
+
+
+def original_interpolate(old_weatherdata, new_weatherdata, percentage):
+    """The interpolation as it was done before the engine: every value is converted on every frame"""
+    percentage = min(percentage, 1)
+    if new_weatherdata["error"]:
+        return new_weatherdata
+    if not old_weatherdata:
+        return new_weatherdata
+
+    interpolated_wd = {}
+    for key, old_value in old_weatherdata.items():
+        new_value = new_weatherdata.get(key, None)
+        if not new_value:
+            interpolated_wd[key] = old_value
+        elif key in NON_INTERPOLATABLE_VARIABLES:
+            interpolated_wd[key] = new_value
+        else:
+            try:
+                interpolated_wd[key] = float(old_value) + (percentage * (float(new_value) - float(old_value)))
+            except ValueError:
+                interpolated_wd[key] = new_value
+            except TypeError:
+                interpolated_wd[key] = new_value
+    return interpolated_wd
+
+
+def measure(function, number):
+    return number / min(timeit.repeat(function, number=number, repeat=5))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the frames per second of both interpolation paths")
+    parser.add_argument("-n", "--number", type=int, default=20000, help="the number of frames per measurement")
+    args = parser.parse_args()
+
+    source = TestDataSource(stations=[6275, 6260], bits=BITS)
+    old, new = source.collect(), source.collect()
+    interpolator = Interpolator(old, new)
+
+    original = measure(lambda: original_interpolate(old, new, 0.5), args.number)
+    engine = measure(lambda: interpolator.frame(0.5), args.number)
+    build = measure(lambda: Interpolator(old, new), args.number)
+
+    print(f"{len(new)} fields, {interpolator!r}")
+    print(f"original path: {original:12.0f} frames/s")
+    print(f"engine:        {engine:12.0f} frames/s ({engine / original:.1f}x)")
+    print(f"engine build:  {build:12.0f} builds/s, once per collection")
+
+
+if __name__ == "__main__":
+    main()
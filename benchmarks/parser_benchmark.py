@@ -0,0 +1,93 @@
+"""Benchmark of the Buienradar parsing modes: decoding the full feed against extracting the configured stations.
+
+Both modes are measured on tests/buienradar.json and on a synthetic feed that is ten times as large. In the synthetic
+feed the stations of the original feed come last, which is the worst case for the early exit of the targeted mode.
+
+Run from the root of the repository:
+
+    python -m benchmarks.parser_benchmark [-c config.ini] [-n 200]
+"""
+import argparse
+import copy
+import json
+import os
+import timeit
+import tracemalloc
+from datetime import datetime
+
+from weathervane.clock import REAL_CLOCK, Clock, VirtualClock
+from weathervane.parser import BuienradarParser, WeathervaneConfigParser
+
+FEED = os.path.join(os.path.dirname(__file__), os.pardir, "tests", "buienradar.json")
+
+
+def load_feed():
+    with open(FEED, "r", encoding="UTF-8") as f:
+        return f.read()
+
+
+def scale_feed(data: str, factor: int) -> str:
+    """Return a feed with factor times the stations and forecasts of the given feed"""
+    feed = json.loads(data)
+    stations = feed["actual"]["stationmeasurements"]
+    copies = []
+    for n in range(1, factor):
+        for station in stations:
+            station_copy = dict(station)
+            station_copy["stationid"] = station["stationid"] + 10000 * n
+            copies.append(station_copy)
+    feed["actual"]["stationmeasurements"] = copies + stations
+    feed["forecast"] = [copy.deepcopy(feed["forecast"]) for _ in range(factor)]
+    return json.dumps(feed, indent=2)
+
+
+def feed_clock(data: str) -> VirtualClock:
+    """Return a clock at the time of the measurements in the feed, so that the parser does not find them stale"""
+    timestamp = json.loads(data)["actual"]["stationmeasurements"][0]["timestamp"]
+    return VirtualClock(datetime.fromisoformat(timestamp).timestamp())
+
+
+def create_parser(config_file, parse_mode, clock: Clock = REAL_CLOCK):
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(config_file)
+    configuration = config_parser.parse_config()
+    configuration["parse_mode"] = parse_mode
+    configuration["clock"] = clock
+    return BuienradarParser(**configuration)
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(parser, data, number):
+    seconds = min(timeit.repeat(lambda: parser.parse(data), number=number, repeat=5)) / number
+    return seconds, peak_memory(lambda: parser.parse(data))
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description="Compare parse time and peak memory of both parse modes")
+    argument_parser.add_argument("-c", "--config", default="config.ini", help="the configuration with the stations")
+    argument_parser.add_argument("-n", "--number", type=int, default=200, help="the number of parses per measurement")
+    args = argument_parser.parse_args()
+
+    data = load_feed()
+    feeds = {"buienradar.json": data, "synthetic 10x": scale_feed(data, 10)}
+    for name, feed in feeds.items():
+        print(f"{name} ({len(feed) / 1024:.0f} kB)")
+        results = {}
+        for parse_mode in (BuienradarParser.FULL, BuienradarParser.TARGETED):
+            parser = create_parser(args.config, parse_mode, feed_clock(feed))
+            results[parse_mode] = seconds, peak = measure(parser, feed, args.number)
+            print(f"  {parse_mode:8}: {seconds * 1000:8.3f} ms/parse, {peak / 1024:8.1f} kB peak")
+        full, targeted = results[BuienradarParser.FULL], results[BuienradarParser.TARGETED]
+        print(f"  targeted is {full[0] / targeted[0]:.1f}x faster and uses {full[1] / targeted[1]:.1f}x less memory")
+
+
+if __name__ == "__main__":
+    main()
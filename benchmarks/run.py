@@ -0,0 +1,176 @@
+"""Benchmark suite of the hot paths of the weathervane, to detect performance regressions.
+
+Each benchmark is timed in a few rounds, of as many calls as fit in about 0.2 seconds. The results are printed, and
+can be written as json. A run can be compared with an earlier one, in which case the runner exits with status 1 when a
+benchmark became slower by more than the threshold.
+
+Run from the root of the repository:
+
+    python -m benchmarks.run [-c config.ini] [-o results.json] [--compare baseline.json] [--threshold 0.1]
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import statistics
+import sys
+import time
+import timeit
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.encoder_benchmark import WEATHER_DATA, create_interface
+from benchmarks.parser_benchmark import create_parser, feed_clock, load_feed, scale_feed
+from main import WeatherVane
+from weathervane.parser import BuienradarParser, WeathervaneConfigParser
+from weathervane.testsource import TestDataSource
+
+FALLBACK_STATIONS = 50
+
+
+def parse_benchmark(config_file, parse_mode, data) -> Callable:
+    parser = create_parser(config_file, parse_mode, feed_clock(data))
+    return lambda: parser.parse(data)
+
+
+def merge_benchmark(config_file) -> Callable:
+    """Merge a primary station that only has a wind direction with many fallback stations, of which only the last
+    one has the other fields"""
+    parser = create_parser(config_file, BuienradarParser.FULL)
+    stations = list(range(1, FALLBACK_STATIONS + 2))
+    template = {station: {"stationid": station} for station in stations}
+    template[stations[0]]["winddirection"] = "N"
+    template[stations[-1]].update(WEATHER_DATA)
+
+    def merge():
+        weather_data = {station: dict(data) for station, data in template.items()}
+        return BuienradarParser.merge(weather_data, stations, parser.bits)
+
+    return merge
+
+
+def convert_data_benchmark(config_file) -> Callable:
+    interface = create_interface(config_file)
+    return lambda: interface.convert_data(WEATHER_DATA)
+
+
+def interpolate_benchmark() -> Callable:
+    source = TestDataSource(stations=[6260], bits=[{"key": key} for key in WEATHER_DATA])
+    old, new = source.collect(), source.collect()
+    return lambda: WeatherVane.interpolate(old, new, 0.5)
+
+
+def parse_config_benchmark(config_file) -> Callable:
+    def parse_config():
+        config_parser = WeathervaneConfigParser()
+        config_parser.read(config_file)
+        return config_parser.parse_config()
+
+    return parse_config
+
+
+def benchmarks(config_file) -> List[Tuple[str, Callable[[], Callable]]]:
+    """Return the name of each benchmark and a function that prepares it, so that the preparation is not timed"""
+    feed = load_feed()
+    synthetic_feed = scale_feed(feed, 10)
+    result = []
+    for parse_mode in (BuienradarParser.FULL, BuienradarParser.TARGETED):
+        for name, data in (("buienradar.json", feed), ("synthetic 10x", synthetic_feed)):
+            result.append((f"parse[{parse_mode}, {name}]", partial(parse_benchmark, config_file, parse_mode, data)))
+    result.append((f"merge[{FALLBACK_STATIONS} fallback stations]", partial(merge_benchmark, config_file)))
+    result.append(("convert_data[config]", partial(convert_data_benchmark, config_file)))
+    result.append(("interpolate", interpolate_benchmark))
+    result.append(("parse_config", partial(parse_config_benchmark, config_file)))
+    return result
+
+
+def measure(function: Callable, rounds: int) -> Dict[str, float]:
+    """Time a function, and return the seconds per call of the fastest round, the mean and the standard deviation"""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(1, number)
+    times = [seconds / number for seconds in timer.repeat(repeat=rounds, number=number)]
+    return {
+        "min": min(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "rounds": rounds,
+        "number": number,
+    }
+
+
+def run(config_file: str, rounds: int, only: str = "") -> dict:
+    results = {}
+    for name, prepare in benchmarks(config_file):
+        if only and only not in name:
+            continue
+        results[name] = stats = measure(prepare(), rounds)
+        print(f"{name:45} {stats['min'] * 1e6:12.2f} us/call (mean {stats['mean'] * 1e6:.2f}, "
+              f"stdev {stats['stdev'] * 1e6:.2f})")
+    return {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "config": config_file,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[str]:
+    """Compare the fastest rounds of two runs
+
+    @param threshold: the fraction by which a benchmark may become slower, such as 0.1 for 10 %
+    @return: the names of the benchmarks that became slower by more than the threshold
+    """
+    regressions = []
+    for name, stats in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:45} {'new':>12}")
+            continue
+        change = stats["min"] / before["min"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:45} {before['min'] * 1e6:12.2f} -> {stats['min'] * 1e6:12.2f} us/call {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmarks of the weathervane and compare with a baseline")
+    parser.add_argument("-c", "--config", default="config.ini", help="the configuration to benchmark with")
+    parser.add_argument("-o", "--output", help="write the results as json to this file")
+    parser.add_argument("--compare", help="the json results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="the fraction by which a benchmark may become slower before it is a regression")
+    parser.add_argument("--rounds", type=int, default=5, help="the number of rounds per benchmark")
+    parser.add_argument("-k", "--only", default="", help="only run the benchmarks whose name contains this text")
+    args = parser.parse_args()
+    # the merge benchmark takes most fields from a fallback station, and merge warns about each of them
+    multiprocessing.get_logger().setLevel(logging.ERROR)
+
+    started = time.monotonic()
+    results = run(args.config, args.rounds, args.only)
+    print(f"Ran {len(results['results'])} benchmarks in {time.monotonic() - started:.1f} s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.compare} ({baseline['meta']['time']}, Python {baseline['meta']['python']})")
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmarks became more than {args.threshold:.0%} slower")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
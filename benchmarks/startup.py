@@ -0,0 +1,108 @@
+"""Startup benchmark of the weathervane: the time from starting Python until the first frame is sent over SPI.
+
+Each run starts a new interpreter that imports main, creates the weathervane in test mode, collects the test data
+source once and sends the frame to the fake SPI device. The fastest run is compared with the budget. One more run with
+-X importtime shows which imports took the longest. The runner exits with status 1 when the budget is exceeded, or when
+one of the dependencies that should only be imported when needed was imported anyway.
+
+Run from the root of the repository:
+
+    python -m benchmarks.startup [-c config.ini] [--budget 1.0] [--runs 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import List, NamedTuple, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# imported only by the subsystems that need them: the Buienradar fetcher, the SPI device, the display pin, the metrics
+# server and the profiler
+LAZY_MODULES = ("requests", "urllib3", "spidev", "gpiozero", "unittest.mock", "http.server", "cProfile")
+
+FIRST_FRAME = """
+import sys
+
+import main
+from weathervane.parser import WeathervaneConfigParser
+
+config_parser = WeathervaneConfigParser()
+config_parser.read(sys.argv[1])
+configuration = dict(
+    config_parser.parse_config(), test=True, source="test", cache_file="", history_file="", metrics_port=0,
+    record_file="",
+)
+wv = main.WeatherVane(**configuration)
+wv.interface.send(wv.create_data_source().collect())
+print(",".join(name for name in sys.argv[2:] if name in sys.modules))
+"""
+
+
+class Startup(NamedTuple):
+    seconds: float
+    lazy_modules_imported: List[str]
+    stderr: str
+
+
+def first_frame(config_file: str = "config.ini", importtime: bool = False) -> Startup:
+    """Start a new interpreter and return how long it took until the first frame was sent"""
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", FIRST_FRAME, config_file, *LAZY_MODULES]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+    seconds = time.perf_counter() - start
+    imported = result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ""
+    return Startup(seconds, [name for name in imported.split(",") if name], result.stderr)
+
+
+def slowest_imports(stderr: str, count: int = 12, depth: int = 1) -> List[Tuple[int, str]]:
+    """Return the slowest imports in the output of -X importtime
+
+    @param depth: the deepest level of nesting to include, where 0 is the imports of the script itself
+    @return: the cumulative microseconds and the name of each import
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line.split("|")
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if level > depth or not cumulative.strip().isdigit():
+            continue
+        imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the time until the weathervane sends its first frame")
+    parser.add_argument("-c", "--config", default="config.ini", help="the configuration to start with")
+    parser.add_argument("--budget", type=float, default=1.0,
+                        help="the seconds that the fastest run may take until the first frame")
+    parser.add_argument("--runs", type=int, default=5, help="the number of runs")
+    args = parser.parse_args()
+
+    runs = [first_frame(args.config) for _ in range(args.runs)]
+    fastest = min(run.seconds for run in runs)
+    print(f"First frame after {fastest * 1000:.1f} ms (fastest of {args.runs} runs, budget "
+          f"{args.budget * 1000:.0f} ms)")
+    print("Slowest imports:")
+    for microseconds, name in slowest_imports(first_frame(args.config, importtime=True).stderr):
+        print(f"{microseconds / 1000:10.1f} ms  {name}")
+
+    failed = False
+    if runs[0].lazy_modules_imported:
+        print(f"Imported although they are not needed: {', '.join(runs[0].lazy_modules_imported)}")
+        failed = True
+    if fastest > args.budget:
+        print(f"The first frame took longer than the budget of {args.budget * 1000:.0f} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,58 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import gpiozero
 from behave import given, step, then, use_step_matcher, when
+from gpiozero.pins.mock import MockFactory
+
+from weathervane.clock import VirtualClock
+from weathervane.weathervaneinterface import Display
 
 use_step_matcher("parse")
 
+DISPLAY_CONFIGURATION = {"auto-turn-off": True, "start-time": "06:45", "end-time": "22:00", "pin": 4}
+STATUS_TIMES = {"on": "12:00", "off": "03:00"}
+SWITCH_TIMES = {"turn-on": "06:45", "turn-off": "22:01"}
+
+
+def run_display_until(context, time_text):
+    """Run the display task on the virtual clock until the next time the clock shows time_text"""
+    clock = context.clock
+    hours, minutes = (int(part) for part in time_text.split(":"))
+    now = clock.now()
+    target = now.replace(hour=hours, minute=minutes, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+
+    async def run():
+        try:
+            await asyncio.wait_for(context.display.run(), (target - now).total_seconds())
+        except asyncio.TimeoutError:
+            pass
+
+    loop = clock.new_event_loop()
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.close()
+    context.display.tick()
+
 
 @given("a display")
 def step_impl(context):
     """
     :type context: behave.runner.Context
     """
-    pass
+    previous = gpiozero.Device.pin_factory
+    gpiozero.Device.pin_factory = MockFactory()
+
+    def restore():
+        gpiozero.Device.pin_factory.reset()
+        gpiozero.Device.pin_factory = previous
+
+    context.add_cleanup(restore)
+    context.clock = VirtualClock(datetime(2021, 6, 19).timestamp())
+    context.display = Display(clock=context.clock, **DISPLAY_CONFIGURATION)
 
 
 @given("the display is turned {status}")
@@ -16,8 +60,8 @@ def step_impl(context, status):
     """
     :type context: behave.runner.Context
     """
-
-    pass
+    run_display_until(context, STATUS_TIMES[status])
+    assert context.display.display.is_lit == (status == "on")
 
 
 @when("the {switch_time} time is reached")
@@ -25,8 +69,7 @@ def step_impl(context, switch_time):
     """
     :type context: behave.runner.Context
     """
-
-    pass
+    run_display_until(context, SWITCH_TIMES[switch_time])
 
 
 @then("the display is turned {status}")
@@ -34,5 +77,4 @@ def step_impl(context, status):
     """
     :type context: behave.runner.Context
     """
-
-    pass
+    assert context.display.display.is_lit == (status == "on")
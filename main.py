@@ -1,28 +1,43 @@
 #!/usr/bin/env python
 import argparse
-import logging.handlers
+import asyncio
 import multiprocessing
+import os
 import time
-from multiprocessing import Pipe, Process
+from datetime import datetime
+from typing import List, Optional
 
-from weathervane.datasources import fetch_weather_data
-from weathervane.parser import WeathervaneConfigParser
+from weathervane.cache import LastKnownGoodCache
+from weathervane.clock import REAL_CLOCK, VirtualClock
+from weathervane.collector import Collector
+from weathervane.config import InvalidConfigException
+from weathervane.datasources import DEFAULT_WEATHER_DATA, UNCHANGED, VANES, create_data_source
+from weathervane.encoder import EncoderPlan
+from weathervane.fanout import Vane, display_tick
+from weathervane.history import ObservationHistory
+from weathervane.interpolation import Interpolator
+from weathervane.logs import setup_logging
+from weathervane.metrics import REGISTRY, MetricsServer
+from weathervane.parser import is_weather_data_stale, load_config
+from weathervane.profiling import PROFILER
+from weathervane.scheduler import JitterStats, run_periodically
+from weathervane.watcher import FileWatcher
 from weathervane.weathervaneinterface import Display, WeatherVaneInterface
 
-NON_INTERPOLATABLE_VARIABLES = ["error", "winddirection", "winddirection", "rain", "barometric_trend"]
-SLEEP_INTERVAL = 0.1
+# the parts of the configuration that can change while the weathervane runs; the others take a restart
+RELOADABLE = ("bits", "stations", "display")
 
-logger = multiprocessing.get_logger()
-logger.setLevel(logging.INFO)
-formatter = logging.Formatter("%(asctime)s:%(levelname)s:%(module)s:%(message)s")
-handler = logging.handlers.TimedRotatingFileHandler(
-    filename="weathervane.log", when="midnight", interval=1, backupCount=1
+CACHE_LOADS = REGISTRY.counter(
+    "weathervane_cache_loads_total", "Attempts to start from the last known good weather data", ["result"]
+)
+COLLECTIONS = REGISTRY.counter(
+    "weathervane_collections_total", "Weather data received from the collector", ["result"]
+)
+CONFIG_RELOADS = REGISTRY.counter(
+    "weathervane_config_reloads_total", "Changes of the configuration file while running", ["result"]
 )
-handler.setFormatter(formatter)
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(formatter)
-logger.addHandler(stream_handler)
-logger.addHandler(handler)
+
+logger = multiprocessing.get_logger()
 
 
 class WeatherVane(object):
@@ -30,87 +45,389 @@ class WeatherVane(object):
         self.old_weatherdata = None
         self.args = args
         self.configuration = configuration
+        self.clock = configuration.get("clock", REAL_CLOCK)
         self.interface = WeatherVaneInterface(*args, **configuration)
-        self.display = Display(**configuration["display"])
+        self.display = Display(clock=self.clock, **configuration["display"])
         logger.info("Using " + str(self.interface))
         self.wd = None
+        self.interpolator = None
+        self.easing = configuration.get("interpolation", "linear")
         self.data_collection_interval = configuration["data_collection_interval"]
         self.data_display_interval = configuration["data_display_interval"]
-        self.start_collection_time = time.monotonic()
-        self.end_collection_time = time.monotonic()
-
-    def start_data_collection(self, pipe_end):
-        arguments = [pipe_end]
-        arguments.extend(self.args)
-        p = Process(
-            target=fetch_weather_data, args=arguments, kwargs=self.configuration
+        self.data_arrival_time = self.clock.monotonic()
+        vanes = configuration.get("vanes", [])
+        self.display_tick = display_tick(
+            [self.data_display_interval] + [vane["data_display_interval"] for vane in vanes]
+        )
+        self.every = max(1, round(self.data_display_interval / self.display_tick))
+        self.ticks = 0
+        self.vanes = [Vane(tick=self.display_tick, **dict(configuration, **vane)) for vane in vanes]
+        for vane in self.vanes:
+            logger.info(f"Using {vane!r}")
+        self.display_jitter = JitterStats("display", report_every=max(1, round(300 / self.display_tick)))
+        self.history = ObservationHistory(
+            self.data_collection_interval,
+            path=configuration.get("history_file", ""),
+            min_interval=configuration.get("cache_interval", 900.0),
+        )
+        self.collector = Collector(self.create_data_source, clock=self.clock)
+        self.metrics_server = None
+        self.config_file = configuration.get("config_file", "")
+        self.file_configuration = None
+        self.config_watcher = None
+        REGISTRY.gauge(
+            "weathervane_data_age_seconds", "Age of the measurements on the display", function=self.data_age
+        )
+        REGISTRY.gauge(
+            "weathervane_data_from_fallback", "Whether some of the data comes from a fallback station",
+            function=lambda: float(bool(self.wd and self.wd.get("data_from_fallback"))) if self.wd else None,
+        )
+        REGISTRY.gauge(
+            "weathervane_data_error", "Whether the weathervane shows an error",
+            function=lambda: float(bool(self.wd.get("error"))) if self.wd else None,
         )
-        p.start()
+        self.cache = None
+        if configuration.get("cache_file"):
+            self.cache = LastKnownGoodCache(
+                configuration["cache_file"], configuration["cache_interval"], layout=self.interface.encoder.layout
+            )
 
-    def retrieve_data(self, pipe_end):
-        wd = pipe_end.recv()
+    def create_data_source(self):
+        return create_data_source(*self.args, history=self.history, **self.configuration)
+
+    def start_data_collection(self):
+        self.collector.collect_now()
+
+    def retrieve_data(self):
+        wd = self.collector.receive()
+        if wd is None:
+            return None
+        unchanged = wd.pop(UNCHANGED, False)
+        vanes = wd.pop(VANES, {})
+        for vane in self.vanes:
+            vane.receive(vanes.get(vane.name, DEFAULT_WEATHER_DATA), unchanged)
+        if unchanged and self.wd:
+            COLLECTIONS.inc(labels=("error" if wd["error"] else "unchanged",))
+            logger.info("Weather data unchanged")
+            self.wd = wd
+            self.interpolator = Interpolator(self.old_weatherdata, wd, self.easing)
+            return wd
         self.old_weatherdata, self.wd = self.wd, wd
+        self.interpolator = Interpolator(self.old_weatherdata, wd, self.easing)
+        self.data_arrival_time = self.clock.monotonic()
+        COLLECTIONS.inc(labels=("error" if wd["error"] else "ok",))
         logger.info("weather data", extra=wd)
+        if self.cache and not wd["error"]:
+            self.cache.save(wd, bytes(self.interface.convert_data(wd)))
+        self.history.save()
         return wd
 
+    def reload_config(self) -> bool:
+        """Load the configuration file again, and apply the changes to the bit fields, the stations and the display.
+
+        The changes are applied all at once, between two ticks of the event loop, and the weather data is kept, so the
+        display goes on with the next frame as if nothing happened. When the new configuration is not valid, the
+        current one stays in effect. Changes to the other settings only take effect after a restart.
+
+        @return: whether changes were applied
+        """
+        loaded = self.read_config_file()
+        if loaded is None:
+            return False
+        changed = self.diff_config(loaded)
+        if not changed:
+            CONFIG_RELOADS.inc(labels=("unchanged",))
+            return False
+        if not self.apply_config(loaded, changed):
+            return False
+        CONFIG_RELOADS.inc(labels=("applied",))
+        logger.info(f"Applied the changes to {', '.join(changed)} in {self.config_file}")
+        return True
+
+    def read_config_file(self) -> Optional[dict]:
+        """Return the configuration in the configuration file, or None when it cannot be read or is not valid"""
+        try:
+            return load_config(self.config_file).as_dict()
+        except InvalidConfigException as e:
+            CONFIG_RELOADS.inc(labels=("invalid",))
+            logger.error(f"Keeping the current configuration, because {self.config_file} is not valid: {e}")
+        except Exception as e:
+            CONFIG_RELOADS.inc(labels=("invalid",))
+            logger.error(f"Keeping the current configuration, because {self.config_file} cannot be read: {e!r}")
+        return None
+
+    def diff_config(self, loaded: dict) -> List[str]:
+        """Return the names of the settings in L{RELOADABLE} that differ from the ones in effect
+
+        The changes to the other settings since the file was read the previous time are only logged.
+        """
+        previous = self.file_configuration or self.configuration
+        restart = sorted(
+            name for name, value in loaded.items() if name not in RELOADABLE and value != previous.get(name)
+        )
+        if restart:
+            logger.warning(f"Changes to {', '.join(restart)} in {self.config_file} take effect after a restart")
+        self.file_configuration = loaded
+        return [name for name in RELOADABLE if loaded[name] != self.configuration[name]]
+
+    def apply_config(self, loaded: dict, changed: List[str]) -> bool:
+        """Put the changed settings into effect, or none of them when the display or the bit fields cannot take them
+
+        @return: whether the changes were applied
+        """
+        encoder = None
+        try:
+            # the encoder is compiled before the display takes its new pin and schedule, so that either both change
+            # or neither does
+            if "bits" in changed:
+                encoder = EncoderPlan(loaded["bits"])
+            if "display" in changed:
+                self.display.configure(**loaded["display"])
+        except Exception as e:
+            CONFIG_RELOADS.inc(labels=("invalid",))
+            logger.error(f"Keeping the current configuration, because it cannot be applied: {e!r}")
+            return False
+        if encoder is not None:
+            self.interface.set_bits(loaded["bits"], encoder)
+            if self.cache:
+                self.cache.set_layout(encoder.layout)
+        self.interface.stations = loaded["stations"]
+        self.configuration = dict(self.configuration, **{name: loaded[name] for name in RELOADABLE})
+        if "stations" in changed:
+            self.collector.reload()
+        if "display" in changed:
+            self.display.tick()
+        return True
+
+    def watch_config(self, loop: asyncio.AbstractEventLoop):
+        """Reload the configuration file whenever it changes, see L{reload_config}"""
+        interval = self.configuration.get("config_poll_interval", 5.0)
+        if not self.config_file or interval <= 0:
+            return
+        try:
+            self.file_configuration = load_config(self.config_file).as_dict()
+        except Exception as e:
+            logger.warning(f"Cannot read {self.config_file} to watch it: {e!r}")
+        self.config_watcher = FileWatcher(self.config_file, self.reload_config, interval).start(loop)
+
+    def data_age(self) -> Optional[float]:
+        """Return the seconds since the measurements on the display were taken, if there are any"""
+        try:
+            return self.clock.time() - datetime.fromisoformat(self.wd["timestamp"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def warm_start(self):
+        """Feed the display with the last good weather data from the cache, unless that data is stale"""
+        self.history.load()
+        if not self.cache:
+            return
+        try:
+            cached = self.cache.load()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cannot read {self.cache!r}: {e!r}")
+            return
+        if cached is None:
+            CACHE_LOADS.inc(labels=("miss",))
+            return
+        wd, frame = cached
+        if is_weather_data_stale(wd["timestamp"], self.clock):
+            CACHE_LOADS.inc(labels=("stale",))
+            return
+        CACHE_LOADS.inc(labels=("hit",))
+        self.wd = wd
+        self.interpolator = Interpolator(None, wd)
+        self.data_arrival_time = self.clock.monotonic() - self.data_collection_interval
+        if frame:
+            self.interface.send_frame(frame)
+        else:
+            self.interface.send(wd)
+
+    def send_data(self):
+        """Send the weather data to the displays that are due, interpolated between the previous and the latest
+        collection
+
+        The frames of the weathervane and of the other vanes are encoded and sent in the same tick, every display_tick
+        seconds. Each display is due every whole number of ticks, by its own display interval.
+        """
+        tick, self.ticks = self.ticks, self.ticks + 1
+        percentage = (self.clock.monotonic() - self.data_arrival_time) / self.data_collection_interval
+        if self.wd and tick % self.every == 0:
+            with PROFILER.span("interpolate"):
+                frame = self.interpolator.frame(percentage)
+            self.interface.send(frame)
+        for vane in self.vanes:
+            if tick % vane.every == 0:
+                vane.send(percentage)
+
+    def profile(self, cycles: int, source):
+        """Run the pipeline for a number of cycles, as fast as possible, and time each stage with the L{PROFILER}
+
+        Each cycle collects the data from the data source and sends one frame to the display, halfway between the
+        previous and the latest data.
+        """
+        PROFILER.enable()
+        try:
+            for _ in range(cycles):
+                with PROFILER.span("cycle"):
+                    wd = dict(source.collect())
+                    wd.pop(UNCHANGED, None)
+                    self.old_weatherdata, self.wd = self.wd, wd
+                    self.interpolator = Interpolator(self.old_weatherdata, wd, self.easing)
+                    self.data_arrival_time = self.clock.monotonic() - self.data_collection_interval / 2
+                    self.send_data()
+        finally:
+            PROFILER.disable()
+
     @staticmethod
     def interpolate(old_weatherdata, new_weatherdata, percentage):
-        percentage = min(percentage, 1)
-        if new_weatherdata["error"]:
-            return new_weatherdata
-        if not old_weatherdata:
-            return new_weatherdata
-
-        interpolated_wd = {}
-
-        for key, old_value in old_weatherdata.items():
-            new_value = new_weatherdata.get(key, None)
-            if not new_value:
-                interpolated_wd[key] = old_value
-            elif key in NON_INTERPOLATABLE_VARIABLES:
-                interpolated_wd[key] = new_value
-            else:
-                try:
-                    interpolated_wd[key] = float(old_value) + (percentage * (float(new_value) - float(old_value)))
-                except ValueError:
-                    interpolated_wd[key] = new_value
-                except TypeError:
-                    interpolated_wd[key] = new_value
-
-        return interpolated_wd
-
-    def main(self):
-        pipe_end_1, pipe_end_2 = Pipe()
-        prev_data_collection_start_time = time.monotonic()
-        prev_display_data_send_time = time.monotonic()
-        self.start_data_collection(pipe_end_1)
-        wd = None
-
-        while True:
-            self.display.tick()
+        return Interpolator(old_weatherdata, new_weatherdata).frame(percentage)
 
-            if time.monotonic() - prev_data_collection_start_time > self.data_collection_interval:
-                prev_data_collection_start_time = time.monotonic()
-                self.start_data_collection(pipe_end_1)
-            if pipe_end_2.poll(0):
-                wd = self.retrieve_data(pipe_end_2)
+    def main(self, seconds: Optional[float] = None):
+        """Run the weathervane in the event loop of its clock, until it is interrupted
 
-            display_time_elapsed = time.monotonic() - prev_display_data_send_time
-            if wd and display_time_elapsed > self.data_display_interval:
-                prev_display_data_send_time = time.monotonic()
-                percentage = display_time_elapsed / self.data_collection_interval
-                interpolated_wd = self.interpolate(self.old_weatherdata, wd, percentage)
-                self.interface.send(interpolated_wd)
+        @param seconds: stop after this many seconds of the clock instead
+        """
+        loop = self.clock.new_event_loop(busy=lambda: self.collector.in_flight)
+        task = loop.create_task(self.run() if seconds is None else self.run_for(seconds))
+        try:
+            loop.run_until_complete(task)
+        finally:
+            if not task.done():
+                # on a KeyboardInterrupt, let run() save its state before the loop closes
+                task.cancel()
+                loop.run_until_complete(asyncio.wait([task]))
+            self.collector.stop(timeout=5)
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
 
-            time.sleep(SLEEP_INTERVAL)
+    async def run_for(self, seconds: float):
+        """Run the weathervane for a number of seconds of its event loop, and stop it as if it was interrupted"""
+        try:
+            await asyncio.wait_for(self.run(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        """Run the timed tasks of the weathervane: collecting data, sending it to the display and switching the display
+        on or off. Each task sleeps until its next deadline, and arriving data wakes up the loop by itself.
+        """
+        loop = asyncio.get_running_loop()
+        if self.configuration.get("metrics_port"):
+            try:
+                self.metrics_server = MetricsServer(REGISTRY, self.configuration["metrics_port"]).start()
+            except OSError as e:
+                logger.error(f"Cannot serve metrics on port {self.configuration['metrics_port']}: {e}")
+        self.warm_start()
+        self.watch_config(loop)
+        self.collector.on_result = lambda: loop.call_soon_threadsafe(self.retrieve_data)
+        try:
+            await asyncio.gather(
+                run_periodically(self.data_collection_interval, self.start_data_collection),
+                run_periodically(self.display_tick, self.send_data, jitter=self.display_jitter),
+                self.display.run(),
+            )
+        finally:
+            self.collector.on_result = None
+            for vane in self.vanes:
+                vane.close()
+            if self.config_watcher:
+                self.config_watcher.stop()
+            if self.metrics_server:
+                self.metrics_server.stop()
+            self.history.save(force=True)
+            if self.cache:
+                if self.wd and not self.wd["error"]:
+                    self.cache.save(self.wd, bytes(self.interface.convert_data(self.wd)), force=True)
+                self.cache.close()
 
 
 def get_configuration(args):
-    config_parser = WeathervaneConfigParser()
-    config_file = args.config
-    config_parser.read(config_file)
-    config = config_parser.parse_config()
-    return config
+    return load_config(args.config).as_dict()
+
+
+def profile(configuration: dict, cycles: int, feed: Optional[str] = None, output: Optional[str] = None):
+    """Profile the pipeline offline: against the test data source or a recorded feed, and the fake SPI device
+
+    @param cycles: the amount of times to run the pipeline
+    @param feed: the file with a recorded Buienradar feed. Without it, the feed of the test data source is used.
+    @param output: the file to write the folded stacks to, or the statistics of cProfile when it ends in .prof
+    """
+    import cProfile
+
+    from weathervane.buienradar import BuienradarDataSource, FileFetcher
+
+    os.environ.setdefault("GPIOZERO_PIN_FACTORY", "mock")
+    configuration = dict(
+        configuration, test=True, source="test", keep_alive=0, cache_file="", history_file="", metrics_port=0,
+        config_file="",
+    )
+    listener = setup_logging(file="", level="ERROR")
+    wv = WeatherVane(**configuration)
+    source = BuienradarDataSource(fetcher=FileFetcher(feed), **configuration) if feed else wv.create_data_source()
+    try:
+        if output and output.endswith(".prof"):
+            cprofile = cProfile.Profile()
+            cprofile.runcall(wv.profile, cycles, source)
+            cprofile.dump_stats(output)
+        else:
+            wv.profile(cycles, source)
+            if output:
+                PROFILER.write_folded(output)
+    finally:
+        source.close()
+        wv.display.close()
+        listener.stop()
+    print(PROFILER.report())
+
+
+def replay(configuration: dict, archive: str, hours: Optional[float] = None, speed: float = 0.0):
+    """Run the weathervane offline against a recorded feed, in virtual time, with the fake SPI device
+
+    The virtual clock starts at the first record of the archive. The collections, the frames and the staleness checks
+    all follow the virtual clock, so a day of operation takes seconds.
+
+    @param archive: the archive with the recorded feed, see L{weathervane.replay}
+    @param hours: the virtual hours to run, by default until one collection interval after the last record
+    @param speed: how many times faster than the real time to run, or 0 to run as fast as possible
+    @return: the L{weathervane.replay.ReplayStats} of the run
+    """
+    import resource
+
+    from weathervane.replay import ReplayStats, read_archive
+
+    os.environ.setdefault("GPIOZERO_PIN_FACTORY", "mock")
+    records = read_archive(archive)
+    if not records:
+        raise SystemExit(f"There are no records in {archive}")
+    clock = VirtualClock(records[0].time, speed)
+    seconds = hours * 3600 if hours else records[-1].time - records[0].time + configuration["data_collection_interval"]
+    configuration = dict(
+        configuration, test=True, source="replay", replay_file=archive, clock=clock, cache_file="", history_file="",
+        metrics_port=0, record_file="", config_file="",
+    )
+    listener = setup_logging(file="", level="ERROR")
+    wv = WeatherVane(**configuration)
+    collections = {result: COLLECTIONS.value((result,)) for result in ("ok", "unchanged", "error")}
+    rss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        wv.main(seconds)
+    finally:
+        wv.display.close()
+        listener.stop()
+    collections = {result: COLLECTIONS.value((result,)) - count for result, count in collections.items()}
+    return ReplayStats(
+        virtual_seconds=clock.monotonic(),
+        wall_seconds=time.perf_counter() - wall_start,
+        cpu_seconds=time.process_time() - cpu_start,
+        collections=int(sum(collections.values())),
+        errors=int(collections["error"]),
+        frames_sent=wv.interface.frames_sent,
+        frames_suppressed=wv.interface.frames_suppressed,
+        max_rss_start_kib=rss_start,
+        max_rss_end_kib=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    )
 
 
 def run():
@@ -124,16 +441,61 @@ def run():
         default="config.ini",
         help="get the configuration from a specific configuration file",
     )
+    parser.add_argument(
+        "--profile",
+        type=int,
+        metavar="CYCLES",
+        help="run the pipeline this many times against a local or recorded feed and a fake SPI device, and print how "
+             "long each stage took",
+    )
+    parser.add_argument(
+        "--feed",
+        help="with --profile, the file with a recorded Buienradar feed to use instead of the test data source",
+    )
+    parser.add_argument(
+        "--profile-output",
+        help="with --profile, write the folded stacks of the stages to this file, or the statistics of cProfile when "
+             "the name ends in .prof",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="ARCHIVE",
+        help="append every response of the provider to this archive, to replay it later",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="ARCHIVE",
+        help="run offline against the feed recorded in this archive, in virtual time and with a fake SPI device, and "
+             "print what it took",
+    )
+    parser.add_argument("--replay-hours", type=float, help="with --replay, the virtual hours to run")
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=0.0,
+        help="with --replay, how many times faster than the real time to run; by default as fast as possible",
+    )
     args = parser.parse_args()
 
     wv_config = get_configuration(args)
-    logger.info("Weathervane started with properties", extra=wv_config)
-    wv = WeatherVane(**wv_config)
-    wv.main()
-
-
-if __name__ == "__main__":
+    wv_config["config_file"] = args.config
+    if args.record:
+        wv_config["record_file"] = args.record
+    if args.replay:
+        print(replay(wv_config, args.replay, args.replay_hours, args.replay_speed).report())
+        return
+    if args.profile:
+        profile(wv_config, args.profile, args.feed, args.profile_output)
+        return
+    listener = setup_logging(**wv_config["logging"])
     try:
-        run()
+        logger.info("Weathervane started with properties", extra=wv_config)
+        wv = WeatherVane(**wv_config)
+        wv.main()
     finally:
         logger.info("Shutting down")
+        listener.stop()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,77 @@
+"""A local stand-in for the Buienradar feed, serving tests/buienradar.json over HTTP/1.1 with keep-alive.
+
+The responses can be scripted: each entry in L{BuienradarServer.script} is used for one request, after which the
+server falls back to a plain 200 response. Conditional requests with a matching ETag or Last-Modified are answered
+with a 304.
+"""
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, NamedTuple
+
+
+class Response(NamedTuple):
+    status: int = 200
+    delay: float = 0.0
+
+
+class BuienradarRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        response = server.script.pop(0) if server.script else Response()
+        server.requests.append((self.client_address, dict(self.headers)))
+        time.sleep(response.delay)
+
+        status = response.status
+        if status == 200 and server.not_modified(self.headers):
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = server.body if status == 200 else b"{}"
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if server.etag:
+            self.send_header("ETag", server.etag)
+        if server.last_modified:
+            self.send_header("Last-Modified", server.last_modified)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BuienradarServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super(BuienradarServer, self).__init__(("127.0.0.1", 0), BuienradarRequestHandler)
+        with open(os.path.join(os.path.dirname(__file__), "buienradar.json"), "rb") as f:
+            self.body = f.read()
+        self.script: List[Response] = []
+        self.requests = []
+        self.etag = None
+        self.last_modified = None
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+
+    def not_modified(self, headers):
+        if self.etag and headers.get("If-None-Match") == self.etag:
+            return True
+        return bool(self.last_modified) and headers.get("If-Modified-Since") == self.last_modified
+
+    @property
+    def url(self):
+        return "http://%s:%d/2.0/feed/json" % self.server_address
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
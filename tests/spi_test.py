@@ -1,6 +1,6 @@
-from unittest.mock import MagicMock
+import pytest
 
-from weathervane.gpio import GPIO
+from weathervane.gpio import GPIO, FakeSpiDev, SPIDataTransmissionError, SPISetupException
 
 
 def test_initialization():
@@ -9,8 +9,52 @@ def test_initialization():
 
 def test_transmission():
     spi = GPIO(channel=0, frequency=25000, test=True)
-    spi.spi.xfer = MagicMock()
     data = [1]
     spi.send_data(data)
-    assert spi.spi.xfer.called
+    assert spi.spi.transfers[0].payload == bytes(data)
 
+
+def test_device_is_configured():
+    device = FakeSpiDev()
+    GPIO(channel=1, frequency=25000, spi_mode=3, spi=device)
+    assert (device.bus, device.device, device.max_speed_hz, device.mode) == (0, 1, 25000, 3)
+
+
+def test_invalid_channel():
+    with pytest.raises(SPISetupException):
+        GPIO(channel=2, frequency=25000, test=True)
+
+
+def test_buffer_is_sent_in_one_transfer():
+    spi = GPIO(channel=0, frequency=25000, test=True)
+    spi.send_data(bytearray(b"\x01\x02\x03"))
+    spi.send_data(memoryview(b"\x04\x05"))
+    assert [t.payload for t in spi.spi.transfers] == [b"\x01\x02\x03", b"\x04\x05"]
+    assert spi.transfers == 2
+    assert spi.transfer_seconds >= spi.last_transfer_seconds > 0
+
+
+def test_exchange_returns_response():
+    spi = GPIO(channel=0, frequency=25000, spi=FakeSpiDev(respond=lambda payload: payload[::-1]))
+    assert spi.exchange(b"\x01\x02") == b"\x02\x01"
+
+
+def test_transfer_is_retried():
+    spi = GPIO(channel=0, frequency=25000, spi_retries=2, spi=FakeSpiDev(failures=2))
+    spi.send_data(b"\x01")
+    assert spi.failures == 2
+    assert len(spi.spi.transfers) == 1
+
+
+def test_retries_are_bounded():
+    spi = GPIO(channel=0, frequency=25000, spi_retries=2, spi=FakeSpiDev(failures=3))
+    with pytest.raises(SPIDataTransmissionError):
+        spi.send_data(b"\x01")
+    assert spi.spi.transfers == []
+
+
+def test_set_frequency():
+    spi = GPIO(channel=0, frequency=25000, test=True)
+    spi.set_frequency(50000)
+    spi.send_data(b"\x01")
+    assert spi.spi.transfers[0].max_speed_hz == 50000
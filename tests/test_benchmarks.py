@@ -0,0 +1,18 @@
+from benchmarks.run import compare, measure
+
+
+def results(**seconds):
+    return {"meta": {}, "results": {name: {"min": value} for name, value in seconds.items()}}
+
+
+def test_compare_reports_regressions_beyond_the_threshold():
+    baseline = results(parse=1.0, encode=1.0, merge=1.0)
+    current = results(parse=1.05, encode=1.2, merge=0.5, interpolate=1.0)
+    assert compare(baseline, current, 0.1) == ["encode"]
+
+
+def test_measure():
+    stats = measure(lambda: None, rounds=3)
+    assert stats["rounds"] == 3
+    assert stats["number"] >= 1
+    assert 0 <= stats["min"] <= stats["mean"]
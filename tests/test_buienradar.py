@@ -0,0 +1,122 @@
+from multiprocessing import Pipe
+
+import pytest
+
+from tests.buienradar_server import BuienradarServer, Response
+from weathervane.buienradar import BuienradarDataSource, BuienradarFetcher
+from weathervane.datasources import DEFAULT_WEATHER_DATA, UNCHANGED, DataCollectionException, fetch_weather_data
+
+
+@pytest.fixture
+def server():
+    with BuienradarServer() as s:
+        yield s
+
+
+def create_fetcher(server, **kwargs):
+    config = {"retries": 2, "backoff_factor": 0, "read_timeout": 1}
+    config.update(kwargs)
+    return BuienradarFetcher(url=server.url, **config)
+
+
+def test_fetch(server):
+    fetcher = create_fetcher(server)
+    assert fetcher.get_weather_string().startswith("{")
+    assert [a.status for a in fetcher.attempts] == [200]
+
+
+def test_connection_is_reused(server):
+    fetcher = create_fetcher(server)
+    fetcher.get_weather_string()
+    fetcher.get_weather_string()
+    first_client, second_client = [client for client, headers in server.requests]
+    assert first_client == second_client
+
+
+def test_retry_on_server_error(server):
+    server.script = [Response(status=503), Response(status=500)]
+    fetcher = create_fetcher(server)
+    assert fetcher.get_weather_string()
+    assert [a.status for a in fetcher.attempts] == [503, 500, 200]
+
+
+def test_retry_on_read_timeout(server):
+    server.script = [Response(delay=0.5)]
+    fetcher = create_fetcher(server, read_timeout=0.1)
+    assert fetcher.get_weather_string()
+    assert [a.status for a in fetcher.attempts] == [None, 200]
+    assert fetcher.attempts[0].latency >= 0.1
+
+
+def test_give_up_after_retries(server):
+    server.script = [Response(status=502)] * 3
+    fetcher = create_fetcher(server)
+    with pytest.raises(DataCollectionException):
+        fetcher.get_weather_string()
+    assert len(fetcher.attempts) == 3
+
+
+def test_no_retry_on_client_error(server):
+    server.script = [Response(status=404)]
+    fetcher = create_fetcher(server)
+    with pytest.raises(DataCollectionException):
+        fetcher.get_weather_string()
+    assert len(server.requests) == 1
+
+
+def test_backoff_is_bounded():
+    fetcher = BuienradarFetcher(backoff_factor=1, backoff_max=5)
+    assert all(0 <= fetcher.backoff(n) <= 5 for n in range(10))
+
+
+def create_source(server):
+    return BuienradarDataSource(stations=[6275], bits=[{"key": "windspeed"}], fetcher=create_fetcher(server))
+
+
+def test_fetch_weather_data_with_source(server):
+    p1, p2 = Pipe()
+    fetch_weather_data(p1, data_source=create_source(server))
+    assert p2.recv()["windspeed"] == 3.3
+
+
+def test_fetch_weather_data_when_unavailable(server):
+    server.script = [Response(status=503)] * 3
+    p1, p2 = Pipe()
+    fetch_weather_data(p1, data_source=create_source(server))
+    assert p2.recv() == DEFAULT_WEATHER_DATA
+
+
+def test_conditional_request_with_etag(server):
+    server.etag = '"feed-1"'
+    fetcher = create_fetcher(server)
+    body = fetcher.get_weather_string()
+    assert fetcher.get_weather_string() is None
+    assert server.requests[-1][1]["If-None-Match"] == '"feed-1"'
+    assert fetcher.status_counts[200] == 1
+    assert fetcher.status_counts[304] == 1
+    assert fetcher.bytes_saved == len(body.encode("utf-8"))
+
+
+def test_conditional_request_with_last_modified(server):
+    server.last_modified = "Sat, 19 Jun 2021 13:40:00 GMT"
+    fetcher = create_fetcher(server)
+    fetcher.get_weather_string()
+    assert fetcher.get_weather_string() is None
+
+
+def test_unchanged_data_is_not_parsed_again(server):
+    server.etag = '"feed-1"'
+    source = create_source(server)
+    first = source.collect()
+    source.parser.parse = None
+    second = source.collect()
+    assert second.pop(UNCHANGED)
+    assert second == first
+
+
+def test_forget_validators_after_failed_parse(server):
+    server.etag = '"feed-1"'
+    server.body = b"not json"
+    source = create_source(server)
+    assert source.collect() == DEFAULT_WEATHER_DATA
+    assert source.fetcher.etag is None
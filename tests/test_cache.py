@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from weathervane.cache import LastKnownGoodCache
+
+weather_data = {"timestamp": "2021-06-19T13:40:00", "windspeed": 3.3, "winddirection": "WZW", "error": False}
+frame = bytes([1, 2, 3, 4])
+
+
+@pytest.fixture
+def path(tmp_path):
+    return os.path.join(tmp_path, "weathervane.cache")
+
+
+def test_empty_cache(path):
+    cache = LastKnownGoodCache(path)
+    assert cache.load() is None
+    assert os.path.getsize(path) == LastKnownGoodCache.SLOT_SIZE * LastKnownGoodCache.SLOTS
+
+
+def test_save_and_load(path):
+    cache = LastKnownGoodCache(path, layout=b"layout")
+    assert cache.save(weather_data, frame)
+    cache.close()
+
+    assert LastKnownGoodCache(path, layout=b"layout").load() == (weather_data, frame)
+
+
+def test_frame_of_other_layout_is_not_used(path):
+    LastKnownGoodCache(path, layout=b"layout").save(weather_data, frame)
+    assert LastKnownGoodCache(path, layout=b"other layout").load() == (weather_data, None)
+
+
+def test_writes_are_rate_limited(path):
+    cache = LastKnownGoodCache(path, min_interval=60)
+    assert cache.save(weather_data, frame)
+    assert not cache.save(dict(weather_data, windspeed=4.0), frame)
+    assert cache.save(dict(weather_data, windspeed=4.0), frame, force=True)
+
+
+def test_unchanged_data_is_not_written(path):
+    cache = LastKnownGoodCache(path, min_interval=0)
+    assert cache.save(weather_data, frame)
+    assert not cache.save(dict(weather_data), frame)
+
+
+def test_damaged_slot_falls_back_to_previous_record(path):
+    cache = LastKnownGoodCache(path, min_interval=0)
+    cache.save(weather_data, frame)
+    cache.save(dict(weather_data, windspeed=4.0), frame)
+    offset = (cache.sequence % cache.SLOTS) * cache.SLOT_SIZE
+    cache.mm[offset + cache.HEADER.size] ^= 0xFF
+    cache.close()
+
+    assert LastKnownGoodCache(path).load()[0] == weather_data
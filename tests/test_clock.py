@@ -0,0 +1,107 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import gpiozero
+import pytest
+from gpiozero.pins.mock import MockFactory
+
+from main import WeatherVane
+from weathervane.clock import VirtualClock
+from weathervane.interpolation import Interpolator
+from weathervane.parser import BuienradarParser, WeathervaneConfigParser
+from weathervane.scheduler import run_periodically
+from weathervane.weathervaneinterface import Display
+
+START = datetime(2021, 6, 19)
+
+
+@pytest.fixture(autouse=True)
+def pins():
+    previous = gpiozero.Device.pin_factory
+    gpiozero.Device.pin_factory = MockFactory()
+    yield
+    gpiozero.Device.pin_factory.reset()
+    gpiozero.Device.pin_factory = previous
+
+
+@pytest.fixture
+def clock():
+    return VirtualClock(START.timestamp())
+
+
+def run_for(clock, seconds, coroutine):
+    async def run():
+        try:
+            await asyncio.wait_for(coroutine, seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    loop = clock.new_event_loop()
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+
+def test_virtual_clock(clock):
+    clock.sleep(90)
+    assert clock.monotonic() == 90
+    assert clock.now() == START + timedelta(seconds=90)
+    clock.advance(-10)
+    assert clock.monotonic() == 90, "the clock should not go back"
+
+
+def test_event_loop_jumps_to_the_next_deadline(clock):
+    calls = []
+    run_for(clock, 24 * 3600, run_periodically(60, lambda: calls.append(clock.now())))
+    assert len(calls) == 24 * 60
+    assert calls[-1] == START + timedelta(hours=23, minutes=59)
+
+
+def test_display_switches_on_and_off_for_days(clock):
+    display = Display(clock=clock, **{"auto-turn-off": True, "start-time": "06:45", "end-time": "22:00", "pin": 4})
+    switches = []
+    ticks = []
+    tick = display.tick
+
+    def record():
+        ticks.append(clock.now())
+        lit = display.lit
+        tick()
+        if display.lit != lit:
+            switches.append((clock.now(), display.display.is_lit))
+
+    display.tick = record
+    run_for(clock, 3 * 24 * 3600, display.run())
+    expected = [(START, False)]
+    for day in range(3):
+        expected.append((START + timedelta(days=day, hours=6, minutes=45), True))
+        expected.append((START + timedelta(days=day, hours=22, minutes=1), False))
+    assert switches == expected
+    assert len(ticks) < 3 * 26, "the display should sleep until the next switch"
+
+
+def test_stale_detection(clock):
+    parser = BuienradarParser(clock=clock)
+    assert not parser.enrich({"stationid": 6260, "timestamp": START.isoformat()})["error"]
+    clock.advance(2 * 3600 + 1)
+    assert parser.enrich({"stationid": 6260, "timestamp": START.isoformat()})["error"]
+
+
+def test_interpolation_across_intervals(clock):
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(os.path.join(os.path.dirname(__file__), "config-test1.ini"))
+    configuration = dict(config_parser.parse_config(), test=True, clock=clock)
+    wv = WeatherVane(**configuration)
+    frames = []
+    wv.interface.send = frames.append
+    wv.wd = {"windspeed": 10.0}
+    wv.interpolator = Interpolator({"windspeed": 0.0}, wv.wd)
+    wv.data_arrival_time = clock.monotonic()
+
+    for _ in range(4):
+        wv.send_data()
+        clock.advance(wv.data_collection_interval / 2)
+
+    assert [frame["windspeed"] for frame in frames] == [0.0, 5.0, 10.0, 10.0]
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from weathervane.collector import Collector
+from weathervane.datasources import DEFAULT_WEATHER_DATA
+
+
+class CountingSource(object):
+    instances = 0
+
+    def __init__(self, fail_with=None, release=None):
+        CountingSource.instances += 1
+        self.collections = 0
+        self.fail_with = fail_with
+        self.release = release
+
+    def collect(self):
+        self.collections += 1
+        if self.release:
+            self.release.wait(5)
+        if self.fail_with:
+            failure, self.fail_with = self.fail_with, None
+            raise failure
+        return {"windspeed": self.collections}
+
+
+def test_collect():
+    collector = Collector(CountingSource)
+    assert collector.collect_now()
+    assert collector.receive(timeout=5) == {"windspeed": 1}
+    assert collector.collect_now()
+    assert collector.receive(timeout=5) == {"windspeed": 2}, "the data source should be kept between collections"
+    collector.stop(timeout=5)
+    assert not collector.is_alive()
+
+
+def test_only_one_collection_in_flight():
+    release = threading.Event()
+    source = CountingSource(release=release)
+    collector = Collector(lambda: source)
+    assert collector.collect_now()
+    assert not collector.collect_now()
+    release.set()
+    assert collector.receive(timeout=5) == {"windspeed": 1}
+    assert collector.receive() is None
+    assert source.collections == 1
+
+
+def test_failed_collection_sends_default_data():
+    collector = Collector(lambda: CountingSource(fail_with=ValueError("broken")))
+    collector.collect_now()
+    assert collector.receive(timeout=5) == DEFAULT_WEATHER_DATA
+    assert collector.is_alive()
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_restart_after_crash():
+    CountingSource.instances = 0
+    collector = Collector(lambda: CountingSource(fail_with=None if CountingSource.instances else SystemExit()))
+    collector.collect_now()
+    collector.thread.join(5)
+    assert not collector.is_alive()
+
+    assert collector.receive() is None
+    assert collector.restarts == 1
+    assert collector.receive(timeout=5) == {"windspeed": 1}, "the collection in flight should be retried"
+    assert CountingSource.instances == 2
+
+
+def test_notify_on_result():
+    ready = threading.Event()
+    collector = Collector(CountingSource, on_result=ready.set)
+    collector.collect_now()
+    assert ready.wait(5)
+    assert collector.receive() == {"windspeed": 1}
+
+
+def test_reload_creates_a_new_data_source():
+    CountingSource.instances = 0
+    collector = Collector(CountingSource)
+    collector.collect_now()
+    assert collector.receive(timeout=5) == {"windspeed": 1}
+    collector.reload()
+    collector.collect_now()
+    assert collector.receive(timeout=5) == {"windspeed": 1}, "the new data source should have collected"
+    assert CountingSource.instances == 2
+    collector.stop(timeout=5)
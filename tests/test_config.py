@@ -1,3 +1,12 @@
+import os
+
+import pytest
+
+from weathervane.config import BitField, Config, DisplayWindow, InvalidConfigException
+from weathervane.parser import WeathervaneConfigParser, load_config
+
+CONFIG_FILE = os.path.join(os.path.dirname(__file__), "config-test1.ini")
+
 config = {
     "bits": [
         {"key": "winddirection", "length": "4"},
@@ -43,3 +52,109 @@ config = {
         "pins": [3, 4, 5],
     },
 }
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "config.ini"
+    with open(CONFIG_FILE) as f:
+        path.write_text(f.read())
+    return str(path)
+
+
+def write_config(path, old, new):
+    with open(path) as f:
+        text = f.read()
+    assert old in text
+    with open(path, "w") as f:
+        f.write(text.replace(old, new))
+
+
+def test_bit_field():
+    assert BitField.parse("winddirection,4", "[Bit Packing] 0") == BitField("winddirection", 4)
+    field = BitField.parse("temperature, 10, -39.9, 49.9, 0.1", "[Bit Packing] 5")
+    assert (field.key, field.length, field.min, field.max, field.step) == ("temperature", 10, -39.9, 49.9, 0.1)
+    assert field.extended
+    assert "step" in field and "step" not in BitField("random", 8)
+    assert field.get("min", 0) == -39.9 and BitField("random", 8).get("min", 0) == 0
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ("windspeed,6,0,63", r"\[Bit Packing\] 1 = windspeed,6,0,63: expected 'key,length' or"),
+        ("windspeed,six", r"\[Bit Packing\] 1: the length of windspeed must be an integer, not 'six'"),
+        ("windspeed,6,0,max,1", r"\[Bit Packing\] 1: the maximum of windspeed must be a number, not 'max'"),
+        (",6", "the key is empty"),
+    ],
+)
+def test_bit_field_errors(text, message):
+    with pytest.raises(InvalidConfigException, match=message):
+        BitField.parse(text, "[Bit Packing] 1")
+
+
+def test_compiled_config_cannot_be_changed():
+    config = WeathervaneConfigParser()
+    config.read(CONFIG_FILE)
+    compiled = config.compile("digest")
+    with pytest.raises(AttributeError):
+        compiled.stations = (6260,)
+    with pytest.raises(AttributeError):
+        compiled.bits[0].length = 8
+    with pytest.raises(TypeError):
+        compiled.settings["frequency"] = 1
+    assert compiled.display == DisplayWindow(False, 6 * 60 + 45, 22 * 60, 4)
+    assert hash(compiled) == hash(config.compile("digest"))
+
+
+def test_as_dict_is_what_parse_config_returns():
+    config = WeathervaneConfigParser()
+    config.read(CONFIG_FILE)
+    assert config.compile().as_dict() == config.parse_config()
+
+
+@pytest.mark.parametrize(
+    "old, new, message",
+    [
+        ("channel=0", "channel=zero", r"\[SPI\] channel: invalid literal"),
+        ("channel=0", "channel=2", r"\[SPI\] channel must be one of \(0, 1\), not 2"),
+        ("[SPI]", "[SPI]\nbus=9", r"\[SPI\] bus must be one of"),
+        ("[SPI]", "[SPI]\nerror_threshold=0", r"\[SPI\] error_threshold must be more than 0 and at most 1, not 0.0"),
+        ("[SPI]", "[SPI]\nerror_threshold=1.5", r"\[SPI\] error_threshold must be more than 0 and at most 1"),
+        ("[SPI]", "[SPI]\nmax_retransmits=-1", r"\[SPI\] max_retransmits must be 0 or more, not -1"),
+        ("[SPI]", "[SPI]\nmin_frequency=-1", r"\[SPI\] min_frequency must be 0 or more, not -1"),
+        ("[Bit Packing]", "[Bit Packing]\nchecksum=md5", r"\[Bit Packing\] checksum must be one of none, crc8, crc16"),
+        ("start-time=06:45", "start-time=6.45", r"\[Display\] start-time must be a time from 00:00 to 23:59"),
+        ("0=winddirection,4", "0=winddirection,5", "not a multiple of 8"),
+        ("0=6320\n1=6308", "", r"\[Stations\] lists no stations"),
+    ],
+)
+def test_invalid_configs_are_rejected_with_a_message(config_file, old, new, message):
+    write_config(config_file, old.replace("\\n", "\n"), new)
+    with pytest.raises(InvalidConfigException, match=message):
+        load_config(config_file)
+
+
+def test_compiled_config_is_cached(config_file, monkeypatch):
+    compiled = load_config(config_file)
+    assert os.path.exists(config_file + ".compiled")
+    assert compiled.digest
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the configuration should come from the cache")
+
+    monkeypatch.setattr(WeathervaneConfigParser, "compile", fail)
+    cached = load_config(config_file)
+    assert cached == compiled
+    assert cached.as_dict() == compiled.as_dict()
+
+    monkeypatch.undo()
+    write_config(config_file, "frequency=", "frequency=1")
+    changed = load_config(config_file)
+    assert changed.digest != compiled.digest
+    assert changed.settings["frequency"] != compiled.settings["frequency"]
+
+
+def test_without_cache(config_file):
+    assert isinstance(load_config(config_file, cache_path=""), Config)
+    assert not os.path.exists(config_file + ".compiled")
@@ -1,6 +1,13 @@
+import subprocess
+import sys
+from datetime import datetime
 from multiprocessing import Pipe
 
-from weathervane.datasources import fetch_weather_data
+import pytest
+
+from weathervane.datasources import (DATA_SOURCES, DataSource, UnknownDataSourceException, create_data_source,
+                                     fetch_weather_data, get_data_source_class, register_data_source)
+from weathervane.testsource import TestDataSource
 
 
 def test_fetch():
@@ -20,3 +27,71 @@ def test_fetch():
     assert "windgusts" in data
     assert "windspeedBft" in data
     assert "airpressure" in data
+
+
+bits = [{"key": "windspeed"}, {"key": "winddirection"}, {"key": "airpressure"}, {"key": "error"}]
+
+
+def now():
+    return datetime(2021, 6, 19, 13, 44, 12)
+
+
+def test_default_source_is_buienradar():
+    assert get_data_source_class("buienradar").__name__ == "BuienradarDataSource"
+
+
+def test_unknown_source():
+    with pytest.raises(UnknownDataSourceException, match="buienradar, replay, test"):
+        create_data_source(source="knmi")
+
+
+def test_register_source(monkeypatch):
+    # register into a copy, so that the data source does not stay registered for the other tests
+    monkeypatch.setattr("weathervane.datasources.DATA_SOURCES", dict(DATA_SOURCES))
+    register_data_source("dummy", "tests.test_data_sources:DummySource")
+    assert isinstance(create_data_source(source="dummy"), DummySource)
+
+
+def test_test_source_needs_no_network():
+    source = create_data_source(source="test", stations=[6275, 6308], bits=bits)
+    assert isinstance(source, TestDataSource)
+
+
+def test_providers_are_loaded_lazily():
+    code = (
+        "import sys; from weathervane.datasources import create_data_source; "
+        "create_data_source(source='test', stations=[6275], bits=[]).collect(); "
+        "assert 'requests' not in sys.modules; assert 'weathervane.buienradar' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_test_source_is_deterministic():
+    first = TestDataSource(stations=[6275], bits=bits, now=now)
+    second = TestDataSource(stations=[6275], bits=bits, now=now)
+    for _ in range(3):
+        assert first.collect() == second.collect()
+
+
+def test_test_source_is_normalized():
+    wd = TestDataSource(stations=[6275, 6308], bits=bits, now=now).collect()
+    assert wd["timestamp"] == "2021-06-19T13:40:00"
+    assert wd["stationid"] == 6275
+    assert wd["winddirection"] == "NNO"
+    assert wd["data_from_fallback"] is False
+    assert "barometric_trend" in wd
+
+
+def test_test_source_is_recent():
+    assert not TestDataSource(stations=[6275], bits=bits).collect()["error"]
+
+
+def test_fetch_weather_data_from_test_source():
+    p1, p2 = Pipe()
+    fetch_weather_data(p1, source="test", stations=[6275], bits=bits)
+    assert "windspeed" in p2.recv()
+
+
+class DummySource(DataSource):
+    def collect(self):
+        return {}
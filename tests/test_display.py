@@ -0,0 +1,164 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import gpiozero
+import pytest
+from gpiozero.pins.mock import MockFactory
+
+from weathervane.clock import VirtualClock
+from weathervane.config import DisplayWindow, InvalidConfigException
+from weathervane.weathervaneinterface import Display
+
+# 2021-06-19 is a Saturday
+SATURDAY = datetime(2021, 6, 19)
+
+
+@pytest.fixture(autouse=True)
+def pins():
+    previous = gpiozero.Device.pin_factory
+    gpiozero.Device.pin_factory = MockFactory()
+    yield
+    gpiozero.Device.pin_factory.reset()
+    gpiozero.Device.pin_factory = previous
+
+
+@pytest.fixture
+def amsterdam(monkeypatch):
+    monkeypatch.setenv("TZ", "Europe/Amsterdam")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def display_with(clock=None, **settings):
+    return Display(clock=clock or VirtualClock(SATURDAY.timestamp()), **dict({"auto-turn-off": True}, **settings))
+
+
+def switches_during(display, clock, seconds):
+    switches = []
+    tick = display.tick
+
+    def record():
+        lit = display.lit
+        tick()
+        if display.lit != lit:
+            switches.append((clock.now(), display.lit))
+
+    async def run():
+        try:
+            await asyncio.wait_for(display.run(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    display.tick = record
+    loop = clock.new_event_loop()
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.close()
+    return switches
+
+
+@pytest.mark.parametrize("minute, active", [(23 * 60, True), (60, True), (120, True), (121, False), (12 * 60, False)])
+def test_is_active_past_midnight(minute, active):
+    display = display_with(**{"start-time": "22:00", "end-time": "02:00"})
+    assert display.is_active(minute) == active
+
+
+def test_window_past_midnight():
+    display = display_with(**{"start-time": "22:00", "end-time": "02:00"})
+    assert display.state_at(SATURDAY + timedelta(hours=1)) == (True, SATURDAY + timedelta(hours=2, minutes=1))
+    assert display.state_at(SATURDAY + timedelta(hours=12)) == (False, SATURDAY + timedelta(hours=22))
+
+
+def test_schedule_per_weekday():
+    display = display_with(schedule="mon-fri 06:45-08:30 17:00-22:00; sat,sun 08:00-23:00; fri 23:30-01:00")
+    monday = SATURDAY + timedelta(days=2)
+    friday = SATURDAY - timedelta(days=1)
+    assert display.state_at(SATURDAY + timedelta(hours=7)) == (False, SATURDAY + timedelta(hours=8))
+    assert display.state_at(SATURDAY + timedelta(minutes=30)) == (True, SATURDAY + timedelta(hours=1, minutes=1))
+    assert display.state_at(monday + timedelta(hours=7)) == (True, monday + timedelta(hours=8, minutes=31))
+    assert display.state_at(monday + timedelta(hours=12)) == (False, monday + timedelta(hours=17))
+    late = friday + timedelta(hours=22, minutes=15)
+    assert display.state_at(late) == (False, friday + timedelta(hours=23, minutes=30))
+
+
+def test_overlapping_windows_are_merged():
+    display = display_with(schedule="06:00-12:00 11:00-14:00")
+    assert display.periods(SATURDAY)[1] == (SATURDAY + timedelta(hours=6), SATURDAY + timedelta(hours=14, minutes=1))
+
+
+def test_always_on():
+    clock = VirtualClock(SATURDAY.timestamp())
+    display = display_with(clock, schedule="00:00-00:00")
+    assert switches_during(display, clock, 3 * 24 * 3600) == [(SATURDAY, True)]
+
+
+def test_switches_with_the_schedule():
+    clock = VirtualClock(SATURDAY.timestamp())
+    display = display_with(clock, schedule="sat 08:00-09:59; sun 10:00-11:59")
+    assert switches_during(display, clock, 2 * 24 * 3600) == [
+        (SATURDAY, False),
+        (SATURDAY + timedelta(hours=8), True),
+        (SATURDAY + timedelta(hours=10), False),
+        (SATURDAY + timedelta(days=1, hours=10), True),
+        (SATURDAY + timedelta(days=1, hours=12), False),
+    ]
+
+
+def test_pin_is_only_set_when_the_display_switches():
+    clock = VirtualClock(SATURDAY.timestamp())
+    display = display_with(clock, **{"start-time": "06:45", "end-time": "22:00"})
+    calls = []
+    display.display.on = lambda: calls.append("on")
+    display.display.off = lambda: calls.append("off")
+    for _ in range(24 * 60):
+        display.tick()
+        clock.advance(60)
+    assert calls == ["off", "on", "off"]
+
+
+def test_daylight_saving_time(amsterdam):
+    # daylight saving time begins on Sunday 2021-03-28 at 02:00, and ends on Sunday 2021-10-31 at 03:00
+    for start in (datetime(2021, 3, 27), datetime(2021, 10, 30)):
+        clock = VirtualClock(start.timestamp())
+        display = display_with(clock, **{"start-time": "06:45", "end-time": "22:00"})
+        switches = switches_during(display, clock, 3 * 24 * 3600)
+        display.close()
+        turned_on = [moment for moment, lit in switches if lit]
+        assert turned_on == [start + timedelta(days=day, hours=6, minutes=45) for day in range(3)]
+
+
+def test_reconfigure_wakes_the_display():
+    clock = VirtualClock(SATURDAY.timestamp())
+    display = display_with(clock, **{"start-time": "06:45", "end-time": "22:00"})
+    display.tick()
+    assert display.lit is False
+    pin = display.display
+    display.configure(**{"auto-turn-off": True, "start-time": "00:00", "end-time": "22:00"})
+    display.tick()
+    assert display.lit is True
+    assert display.display is pin, "the pin should be kept when it does not change"
+
+
+@pytest.mark.parametrize(
+    "schedule, message",
+    [
+        ("mon-fri", "'mon-fri' has no times"),
+        ("weekdays 06:00-08:00", "'weekdays' are not weekdays"),
+        ("06:00", "'06:00' is not a time such as 06:45-22:00"),
+        ("06:00-24:00", "schedule must be a time from 00:00 to 23:59, not '24:00'"),
+        (";", "lists no times"),
+    ],
+)
+def test_invalid_schedule(schedule, message):
+    with pytest.raises(InvalidConfigException, match=message):
+        DisplayWindow.parse(True, "06:45", "22:00", 4, schedule)
+
+
+def test_weekdays():
+    assert DisplayWindow.parse_days("daily") == tuple(range(7))
+    assert DisplayWindow.parse_days("mon,wed,fri-sun") == (0, 2, 4, 5, 6)
+    assert DisplayWindow.parse_days("sat-mon") == (0, 5, 6)
@@ -0,0 +1,121 @@
+import os
+
+import pytest
+
+from tests import test_config
+from weathervane.encoder import EncoderPlan
+from weathervane.parser import InvalidConfigException, WeathervaneConfigParser
+
+weather_data = {
+    "winddirection": "WNW",
+    "windspeed": 12.3,
+    "windgusts": 10.1,
+    "windspeedBft": 6,
+    "airpressure": 1014.8,
+    "temperature": 20.2,
+    "feeltemperature": -41,
+    "humidity": 73.0,
+    "data_from_fallback": False,
+    "barometric_trend": 4,
+    "precipitation": 45.2,
+    "error": False,
+    "rainFallLastHour": 1.3,
+    "rainFallLast24Hour": 300,
+}
+
+
+def reference_frame(bits, data):
+    """Packs the data the way convert_data did before the plan was introduced"""
+    r = 0
+    for bit_config in bits:
+        length = int(bit_config["length"])
+        value = data.get(bit_config["key"], 0)
+        r = (r << length) + value
+    return r.to_bytes(sum(int(b["length"]) for b in bits) // 8, byteorder="big")
+
+
+def load_bits(config_file_name):
+    cp = WeathervaneConfigParser()
+    cp.read(os.path.join(os.getcwd(), "tests", config_file_name))
+    return cp.parse_bit_packing_section()
+
+
+def test_frame_length():
+    plan = EncoderPlan(load_bits("config-test1.ini"))
+    assert len(plan.encode(weather_data)) == 12
+
+
+def test_values_are_scaled_and_clamped():
+    plan = EncoderPlan(test_config.config["bits"])
+    values = dict(zip([f.key for f in plan.fields], plan.values(weather_data)))
+    assert values["winddirection"] == 0x0D
+    assert values["windgusts"] == 10
+    assert values["windspeed"] == 10, "wind speed may not exceed the wind gusts"
+    assert values["airpressure"] == 114
+    assert values["feeltemperature"] == 0
+    assert values["service_byte"] == 0
+
+
+def test_encode_matches_reference_packing():
+    bits = test_config.config["bits"]
+    plan = EncoderPlan(bits)
+    values = dict(zip([f.key for f in plan.fields], plan.values(weather_data)))
+    assert bytes(plan.encode(weather_data)) == reference_frame(bits, values)
+
+
+def test_buffer_is_reused():
+    plan = EncoderPlan(test_config.config["bits"])
+    first = plan.encode(weather_data)
+    second = plan.encode({"winddirection": "N"})
+    assert first is second
+
+
+def test_non_numeric_value():
+    plan = EncoderPlan([{"key": "stationname", "length": "8"}])
+    assert plan.values({"stationname": "Meetstation Arnhem"}) == [0]
+    assert plan.values({"stationname": None}) == [0]
+
+
+def test_simple_field_does_not_overflow():
+    plan = EncoderPlan([{"key": "barometric_trend", "length": "3"}, {"key": "DUMMY_BYTE", "length": "5"}])
+    assert bytes(plan.encode({"barometric_trend": 200})) == bytes([0b11100000])
+
+
+def test_byte_offsets():
+    plan = EncoderPlan(test_config.config["bits"])
+    assert [f.byte_offset for f in plan.fields] == [0, 0, 1, 2, 2, 3, 4, 6, 6, 7]
+    assert plan.fields[-1].shift == 0
+
+
+def test_field_across_bytes():
+    bits = [{"key": "winddirection", "length": "4"}, {"key": "airpressure", "length": "12", "max": "4095"},
+            {"key": "DUMMY_BYTE", "length": "8"}]
+    plan = EncoderPlan(bits)
+    assert (plan.fields[1].byte_offset, plan.fields[1].last_byte, plan.fields[1].shift) == (0, 1, 0)
+    data = {"winddirection": "NNW", "airpressure": 0xABC}
+    assert bytes(plan.encode(data)) == bytes([0xFA, 0xBC, 0x00])
+    assert plan.values(data) == [0x0F, 0xABC, 0]
+
+
+def test_total_length_must_be_multiple_of_eight():
+    with pytest.raises(InvalidConfigException, match="not a multiple of 8"):
+        EncoderPlan([{"key": "winddirection", "length": "4"}])
+
+
+def test_range_must_fit_in_field():
+    bits = [{"key": "humidity", "length": "6", "min": "0", "max": "100", "step": "1"}, {"key": "x", "length": "2"}]
+    with pytest.raises(InvalidConfigException, match="humidity"):
+        EncoderPlan(bits)
+
+
+def test_step_must_be_positive():
+    bits = [{"key": "humidity", "length": "8", "min": "0", "max": "100", "step": "0"}]
+    with pytest.raises(InvalidConfigException, match="step"):
+        EncoderPlan(bits)
+
+
+def test_fixed_random_value():
+    plan = EncoderPlan([{"key": "winddirection", "length": "4"}, {"key": "random", "length": "4"}])
+    assert plan.has_random
+    assert plan.values({"winddirection": "NO"}, random_value=0x1F5) == [0x02, 0x05]
+    assert bytes(plan.encode({}, 0xA)) == bytes(plan.encode({}, 0xA)) == bytes([0x0A])
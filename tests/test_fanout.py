@@ -0,0 +1,128 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from main import WeatherVane
+from weathervane.clock import VirtualClock
+from weathervane.config import BitField, InvalidConfigException
+from weathervane.datasources import VANES
+from weathervane.fanout import display_tick
+from weathervane.parser import BuienradarParser, WeathervaneConfigParser, load_config
+
+CONFIG_FILE = os.path.join(os.path.dirname(__file__), "config-test1.ini")
+FEED_TIME = datetime(2021, 6, 19, 13, 40)
+
+with open(os.path.join(os.path.dirname(__file__), "buienradar.json")) as f:
+    FEED = f.read()
+
+KITCHEN = """
+[Vane kitchen]
+channel=1
+stations=6260,6370
+data_display_interval=4
+0=windspeed,8,0,255,1
+"""
+
+
+def config_with(tmp_path, vanes):
+    path = tmp_path / "config.ini"
+    with open(CONFIG_FILE) as f:
+        path.write_text(f.read() + vanes)
+    return str(path)
+
+
+@pytest.mark.parametrize("intervals, tick", [([2], 2.0), ([2, 3], 1.0), ([2, 0.5], 0.5), ([0.3, 0.2], 0.1)])
+def test_display_tick(intervals, tick):
+    assert display_tick(intervals) == tick
+
+
+@pytest.mark.parametrize("intervals", [[2, 0.999], [0.05]])
+def test_display_tick_too_short(intervals):
+    with pytest.raises(InvalidConfigException, match="multiples of at least 0.1 s"):
+        display_tick(intervals)
+
+
+def test_vanes_in_the_configuration(tmp_path):
+    path = config_with(tmp_path, KITCHEN + "\n[Vane hall]\nbus=1\n")
+    config = load_config(path)
+    kitchen, hall = config.vanes
+    assert (kitchen.name, kitchen.spi_bus, kitchen.channel, kitchen.data_display_interval) == ("kitchen", 0, 1, 4.0)
+    assert kitchen.stations == (6260, 6370)
+    assert kitchen.bits == (BitField("windspeed", 8, 0.0, 255.0, 1.0),)
+    assert (hall.spi_bus, hall.channel, hall.stations, hall.bits) == (1, 0, config.stations, config.bits)
+    assert hall.frequency == config.settings["frequency"]
+    assert load_config(path) == config, "the vanes should be cached as well"
+
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(path)
+    assert config.as_dict() == config_parser.parse_config()
+
+
+@pytest.mark.parametrize(
+    "vanes, message",
+    [
+        ("[Vane hall]\n", r"\[Vane hall\] uses SPI bus 0, channel 0, which \[SPI\] uses already"),
+        (KITCHEN + "[Vane hall]\nchannel=1\n", r"\[Vane hall\] uses SPI bus 0, channel 1, which \[Vane kitchen\]"),
+        ("[Vane hall]\nchannel=1\n0=windspeed,7\n", r"\[Vane hall\] .*not a multiple of 8"),
+        ("[Vane hall]\nchannel=1\nstations=6260,x\n", r"\[Vane hall\] stations must be an integer, not 'x'"),
+        ("[Vane]\nchannel=1\n", r"\[Vane\] has no name"),
+        ("[Vane hall]\nchannel=1\nbus=9\n", r"\[Vane hall\] bus must be one of"),
+        ("[Vane hall]\nchannel=1\ndata_display_interval=1.999\n", r"only all whole multiples of 0.001 s"),
+    ],
+)
+def test_invalid_vanes(tmp_path, vanes, message):
+    with pytest.raises(InvalidConfigException, match=message):
+        load_config(config_with(tmp_path, vanes), cache_path="")
+
+
+def test_feed_is_parsed_once_for_all_vanes():
+    vanes = [
+        {"name": "kitchen", "stations": [6260, 6370], "bits": [{"key": "windspeed"}]},
+        {"name": "missing", "stations": [1], "bits": [{"key": "windspeed"}]},
+    ]
+    parser = BuienradarParser(
+        stations=[6320, 6308], bits=[{"key": "winddirection"}], vanes=vanes, parse_mode=BuienradarParser.TARGETED,
+        clock=VirtualClock(FEED_TIME.timestamp()),
+    )
+    assert parser.all_stations == [6320, 6308, 6260, 6370, 1]
+    wd = parser.parse(FEED)
+    assert wd["stationid"] == 6320 and "winddirection" in wd
+    assert wd[VANES]["kitchen"]["stationid"] == 6260 and "windspeed" in wd[VANES]["kitchen"]
+    assert not wd[VANES]["kitchen"]["error"]
+    assert wd[VANES]["missing"]["error"]
+
+    refreshed = parser.refresh(wd)
+    assert refreshed[VANES]["kitchen"] is not wd[VANES]["kitchen"]
+    assert refreshed[VANES]["kitchen"]["stationid"] == 6260
+
+
+def test_one_collection_drives_all_vanes(tmp_path):
+    configuration = dict(
+        load_config(config_with(tmp_path, KITCHEN), cache_path="").as_dict(), test=True, source="test",
+        clock=VirtualClock(FEED_TIME.timestamp()), cache_file="", history_file="", metrics_port=0, config_file="",
+    )
+    wv = WeatherVane(**configuration)
+    created = []
+    create_data_source = wv.create_data_source
+
+    def count_data_sources():
+        created.append(True)
+        return create_data_source()
+
+    wv.collector.source_factory = count_data_sources
+    try:
+        wv.main(seconds=599)
+    finally:
+        wv.display.close()
+
+    kitchen, = wv.vanes
+    assert wv.display_tick == 2.0 and kitchen.every == 2
+    assert len(created) == 1
+    assert kitchen.wd["stationid"] == 6260 and wv.wd["stationid"] == 6320
+    main_transfers = wv.interface.gpio.spi.transfers
+    kitchen_transfers = kitchen.interface.gpio.spi.transfers
+    assert len(kitchen_transfers) > 100
+    assert abs(len(main_transfers) - 2 * len(kitchen_transfers)) <= 1
+    assert {len(transfer.payload) for transfer in kitchen_transfers} == {1}
+    assert kitchen.interface.gpio.spi.device is None, "the SPI device of the vane should be closed at shutdown"
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from weathervane.history import ObservationHistory
+from weathervane.parser import BuienradarParser
+
+START = datetime(2021, 6, 19, 6, 0)
+
+
+def observation(minutes, **values):
+    wd = {"stationid": 6275, "timestamp": (START + timedelta(minutes=minutes)).isoformat()}
+    wd.update(values)
+    return wd
+
+
+@pytest.fixture
+def history():
+    return ObservationHistory(600, hours=24)
+
+
+def test_capacity_is_fixed(history):
+    assert history.capacity == 145
+    for n in range(400):
+        history.add(observation(10 * n, airpressure=1000.0))
+    station = history.station(6275)
+    assert station.count == 145
+    assert len(station.times) == len(station.values[0]) == 145
+
+
+def test_older_observations_are_skipped(history):
+    assert history.add(observation(10, airpressure=1000.0))
+    assert not history.add(observation(10, airpressure=1001.0))
+    assert not history.add(observation(0, airpressure=1001.0))
+    assert not history.add({"stationid": 6275})
+
+
+def test_delta(history):
+    for n in range(0, 31):
+        history.add(observation(10 * n, airpressure=1000.0 + n * 0.1))
+    assert history.delta(6275, "airpressure", 4) == pytest.approx(2.4)
+    assert history.delta(6275, "airpressure", 6) is None
+    assert history.delta(6260, "airpressure", 4) is None
+
+
+def test_delta_skips_missing_values(history):
+    history.add(observation(0, airpressure=1000.0))
+    history.add(observation(240, airpressure=1003.0))
+    history.add(observation(250))
+    assert history.delta(6275, "airpressure", 4) == pytest.approx(3.0)
+
+
+def test_summary_and_peak(history):
+    for n, gust in enumerate([5.0, 12.0, 7.0, 9.0]):
+        history.add(observation(30 * n, windgusts=gust))
+    assert history.summary(6275, "windgusts", 1) == (7.0, 12.0, pytest.approx(28 / 3))
+    assert history.peak(6275, hours=0.5) == 9.0
+    assert history.summary(6275, "humidity", 1) is None
+
+
+@pytest.mark.parametrize(
+    "change, trend", [(2.0, "rising"), (-1.5, "dropping"), (0.5, "stable")]
+)
+def test_barometric_trend(history, change, trend):
+    history.add(observation(0, airpressure=1010.0))
+    assert history.barometric_trend(6275) == "stable"
+    history.add(observation(240, airpressure=1010.0 + change))
+    assert history.barometric_trend(6275) == trend
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "history")
+    history = ObservationHistory(600, path=path)
+    for n in range(200):
+        history.add(observation(10 * n, airpressure=1000.0 + n, windgusts=None))
+    assert history.save()
+    assert not history.save()
+
+    restored = ObservationHistory(600, path=path)
+    restored.load()
+    assert restored.delta(6275, "airpressure", 4) == 24.0
+    assert restored.station(6275).window("windgusts", 24) == []
+    assert not restored.add(observation(10 * 199))
+    assert restored.add(observation(10 * 200, airpressure=1200.0))
+
+
+def test_file_with_other_capacity_is_ignored(tmp_path):
+    path = str(tmp_path / "history")
+    history = ObservationHistory(600, path=path)
+    history.add(observation(0, airpressure=1000.0))
+    history.save()
+    other = ObservationHistory(300, path=path)
+    other.load()
+    assert other.stations == {}
+
+
+def test_parser_computes_trend_from_history(history):
+    parser = BuienradarParser(history=history, barometric_trend=True)
+    parser.enrich(observation(0, airpressure=1010.0))
+    assert parser.enrich(observation(240, airpressure=1008.0))["barometric_trend"] == 2
+    assert BuienradarParser(history=history, barometric_trend=False).history is None
@@ -0,0 +1,56 @@
+import pytest
+
+from weathervane.interpolation import EASINGS, Interpolator
+
+old = {"error": False, "windspeed": 2.0, "winddirection": "N", "stationname": "Arnhem", "temperature": 10.0,
+       "airpressure": 1000}
+new = {"error": False, "windspeed": 0, "winddirection": "ZW", "stationname": "Arnhem", "temperature": 20.0,
+       "airpressure": None, "humidity": 50.0}
+
+
+def test_zero_is_interpolated():
+    interpolator = Interpolator(old, new)
+    assert interpolator.frame(0.5)["windspeed"] == 1.0
+    assert interpolator.frame(1)["windspeed"] == 0.0
+
+
+def test_numeric_fields_are_interpolated():
+    assert Interpolator(old, new).frame(0.25)["temperature"] == 12.5
+
+
+def test_non_numeric_fields_take_new_value():
+    frame = Interpolator(old, new).frame(0.25)
+    assert frame["winddirection"] == "ZW"
+    assert frame["stationname"] == "Arnhem"
+
+
+def test_missing_field_keeps_old_value():
+    assert Interpolator(old, new).frame(0.5)["airpressure"] == 1000
+
+
+def test_new_field_is_added():
+    assert Interpolator(old, new).frame(0.5)["humidity"] == 50.0
+
+
+def test_percentage_is_clamped():
+    interpolator = Interpolator(old, new)
+    assert interpolator.frame(2)["temperature"] == 20.0
+    assert interpolator.frame(-1)["temperature"] == 10.0
+
+
+def test_error_and_first_data_pass_through():
+    error = dict(new, error=True)
+    assert Interpolator(old, error).frame(0.5) is error
+    assert Interpolator(None, new).frame(0.5) is new
+
+
+@pytest.mark.parametrize("easing", list(EASINGS))
+def test_easing_ends(easing):
+    interpolator = Interpolator(old, new, easing=easing)
+    assert interpolator.frame(0)["temperature"] == pytest.approx(10.0)
+    assert interpolator.frame(1)["temperature"] == pytest.approx(20.0)
+    assert 10.0 <= interpolator.frame(0.3)["temperature"] <= 20.0
+
+
+def test_ease_in_out_is_symmetric():
+    assert Interpolator(old, new, easing="ease-in-out").frame(0.5)["temperature"] == pytest.approx(15.0)
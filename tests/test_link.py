@@ -0,0 +1,129 @@
+import pytest
+
+from tests import test_config
+from weathervane.gpio import GPIO, FakeSpiDev
+from weathervane.link import CHECKSUMS, Link, LinkStats, crc8, crc16
+from weathervane.parser import InvalidConfigException
+from weathervane.weathervaneinterface import WeatherVaneInterface
+
+FREQUENCY = 100000
+
+
+def display(checksum, corrupt=lambda n: False):
+    """Return a device that answers like the display: with the CRC of the frame it received"""
+    device = FakeSpiDev()
+    length = len(CHECKSUMS[checksum](b""))
+
+    def respond(_):
+        frame = device.transfers[-2].payload[:-length]
+        n = len(device.transfers) // 2
+        if corrupt(n):
+            frame = bytes([frame[0] ^ 0x01]) + frame[1:]
+        return CHECKSUMS[checksum](frame)
+
+    device.respond = respond
+    return device
+
+
+def link_with(device, **kwargs):
+    return Link(GPIO(channel=0, frequency=FREQUENCY, spi=device), FREQUENCY, **kwargs)
+
+
+def test_check_values():
+    assert crc8(b"123456789") == b"\xf4"
+    assert crc16(b"123456789") == b"\x29\xb1"
+
+
+def test_without_checksum():
+    device = FakeSpiDev()
+    link = link_with(device)
+    assert link.send(bytearray(b"\x01\x02"))
+    assert [t.payload for t in device.transfers] == [b"\x01\x02"]
+
+
+def test_unknown_checksum():
+    with pytest.raises(InvalidConfigException):
+        link_with(FakeSpiDev(), checksum="md5")
+
+
+@pytest.mark.parametrize("checksum", ["crc8", "crc16"])
+def test_intact_frame(checksum):
+    device = display(checksum)
+    link = link_with(device, checksum=checksum)
+    assert link.send(b"\x01\x02\x03")
+    assert device.transfers[0].payload == b"\x01\x02\x03" + CHECKSUMS[checksum](b"\x01\x02\x03")
+    assert len(device.transfers) == 2
+    assert link.error_rate == 0
+
+
+def test_corrupted_frame_is_sent_again():
+    device = display("crc8", corrupt=lambda n: n == 1)
+    link = link_with(device, checksum="crc8")
+    assert link.send(b"\x01\x02")
+    assert len(device.transfers) == 4
+    counts = next(iter(link.stats.hours.values()))
+    assert counts == [1, 2, 1, 0]
+
+
+@pytest.mark.parametrize("checksum", ["crc8", "crc16"])
+def test_frames_verify_in_test_mode(checksum):
+    interface = WeatherVaneInterface(**dict(test_config.config, test=True, checksum=checksum))
+    for direction in ("N", "ZW"):
+        interface.send({"winddirection": direction})
+    assert len(interface.gpio.spi.transfers) == 4
+    assert interface.link.error_rate == 0
+    assert next(iter(interface.link.stats.hours.values())) == [2, 2, 0, 0]
+
+
+def test_lost_frame():
+    link = link_with(display("crc8", corrupt=lambda n: True), checksum="crc8", max_retransmits=3)
+    assert not link.send(b"\x01")
+    assert next(iter(link.stats.hours.values()))[LinkStats.LOST] == 1
+
+
+def test_retransmits_adapt_to_error_rate():
+    link = link_with(FakeSpiDev(), checksum="crc8", max_retransmits=4, error_threshold=0.2)
+    assert link.retransmits == 1
+    link.recent.extend([True, False, False, False, False, False, False, False, False, False])
+    assert link.retransmits == 2
+    link.recent.extend([True] * 10)
+    assert link.retransmits == 4
+
+
+def test_zero_error_threshold_allows_all_retransmits():
+    device = display("crc8")
+    link = link_with(device, checksum="crc8", max_retransmits=2, error_threshold=0)
+    assert link.send(b"\x01\x02")
+    assert link.retransmits == 2
+
+
+def test_frequency_backs_off_and_recovers():
+    broken = [True]
+    device = display("crc8", corrupt=lambda n: broken[0])
+    link = link_with(device, checksum="crc8", max_retransmits=1, min_frequency=20000, window=4)
+    for _ in range(2):
+        link.send(b"\x01")
+    assert device.max_speed_hz == FREQUENCY // 2
+    for _ in range(6):
+        link.send(b"\x01")
+    assert device.max_speed_hz == 20000
+    assert device.transfers[-1].max_speed_hz == 20000
+
+    broken[0] = False
+    for _ in range(4 * 3):
+        link.send(b"\x01")
+    assert device.max_speed_hz == FREQUENCY
+
+
+def test_stats_per_hour():
+    now = [7200.0]
+    stats = LinkStats(keep=2, clock=lambda: now[0])
+    stats.record(attempts=2, errors=1)
+    now[0] += 3600
+    stats.record(attempts=1, errors=0)
+    now[0] += 3600
+    stats.record(attempts=1, errors=0)
+    assert list(stats.hours) == [3, 4]
+    assert stats.error_rate(2) == 0
+    assert stats.error_rate(3) == 0
+    assert stats.retransmissions(4) == 0
@@ -0,0 +1,95 @@
+import json
+import logging
+import multiprocessing
+
+import pytest
+
+from weathervane.logs import JsonFormatter, RateLimitFilter, SampleFilter, setup_logging
+
+
+def make_record(message="Sending data", level=logging.INFO, lineno=10, **extra):
+    record = logging.LogRecord("multiprocessing.spi", level, "interface.py", lineno, message, None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_extra_fields():
+    entry = json.loads(JsonFormatter().format(make_record("weather data", windspeed=3.3, sampled=True)))
+    assert entry["message"] == "weather data"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "multiprocessing.spi"
+    assert entry["windspeed"] == 3.3
+    assert "sampled" not in entry
+
+
+def test_rate_limit_by_line():
+    now = [0.0]
+    rate_limit = RateLimitFilter(60, clock=lambda: now[0])
+    assert rate_limit.filter(make_record("frame 1"))
+    assert not rate_limit.filter(make_record("frame 2"))
+    assert rate_limit.filter(make_record("other line", lineno=20))
+    now[0] = 61
+    record = make_record("frame 3")
+    assert rate_limit.filter(record)
+    assert record.getMessage() == "frame 3 (and 1 similar messages)"
+
+
+def test_rate_limit_keeps_different_warnings():
+    rate_limit = RateLimitFilter(60, clock=lambda: 0.0)
+    assert rate_limit.filter(make_record("station 6260 is missing", logging.WARNING))
+    assert rate_limit.filter(make_record("station 6275 is missing", logging.WARNING))
+    assert not rate_limit.filter(make_record("station 6275 is missing", logging.WARNING))
+
+
+def test_rate_limit_keeps_distinct_messages_from_one_line():
+    rate_limit = RateLimitFilter(60, clock=lambda: 0.0)
+    assert rate_limit.filter(make_record("Set temperature to 20.1", distinct=True))
+    assert rate_limit.filter(make_record("Set humidity to 73", distinct=True))
+    assert not rate_limit.filter(make_record("Set humidity to 73", distinct=True))
+    warning = make_record("station %s is missing", logging.WARNING)
+    warning.args = ("6260",)
+    assert rate_limit.filter(warning)
+    warning.args = ("6275",)
+    assert rate_limit.filter(warning)
+
+
+def test_rate_limit_forgets_old_messages():
+    now = [0.0]
+    rate_limit = RateLimitFilter(60, clock=lambda: now[0])
+    for station in range(100):
+        rate_limit.filter(make_record(f"station {station} is missing", logging.WARNING))
+    assert len(rate_limit.seen) == 100
+    assert not rate_limit.filter(make_record("station 0 is missing", logging.WARNING))
+    now[0] = 61
+    assert rate_limit.filter(make_record("frame 1"))
+    assert len(rate_limit.seen) == 2
+    now[0] = 122
+    assert rate_limit.filter(make_record("frame 2"))
+    assert list(rate_limit.seen) == [rate_limit.key(make_record())]
+
+
+def test_sample_filter():
+    sample = SampleFilter(every=3)
+    assert [sample.filter(make_record(sampled=True)) for _ in range(7)] == [True, False, False] * 2 + [True]
+    assert sample.filter(make_record())
+
+
+@pytest.fixture
+def restore_logger():
+    logger = multiprocessing.get_logger()
+    handlers, level = list(logger.handlers), logger.level
+    yield logger
+    logger.handlers[:] = handlers
+    logger.setLevel(level)
+    for subsystem in ("collector", "parser", "spi", "display"):
+        logger.getChild(subsystem).setLevel(logging.NOTSET)
+
+
+def test_setup_logging(tmp_path, restore_logger):
+    path = tmp_path / "weathervane.log"
+    listener = setup_logging(format="json", file=str(path), level="INFO", levels={"spi": "warning"}, stream=False)
+    restore_logger.getChild("parser").info("parsed", extra={"stations": 2})
+    restore_logger.getChild("spi").info("not logged")
+    listener.stop()
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(line["message"], line["stations"]) for line in lines] == [("parsed", 2)]
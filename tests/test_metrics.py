@@ -0,0 +1,57 @@
+import requests
+
+from weathervane.metrics import MetricsRegistry, MetricsServer
+
+
+def test_counter():
+    registry = MetricsRegistry()
+    counter = registry.counter("frames_total", "Frames", ["outcome"])
+    counter.inc(labels=("sent",))
+    counter.inc(2, labels=("sent",))
+    assert counter.value(("sent",)) == 3
+    assert registry.counter("frames_total", "Frames", ["outcome"]) is counter
+    assert registry.render() == '# HELP frames_total Frames\n# TYPE frames_total counter\nframes_total{outcome="sent"} 3\n'
+
+
+def test_gauge_function():
+    registry = MetricsRegistry()
+    value = [None]
+    registry.gauge("age_seconds", "Age", function=lambda: value[0])
+    assert "\nage_seconds " not in registry.render()
+    value[0] = 12.5
+    assert "age_seconds 12.5\n" in registry.render()
+
+
+def test_histogram():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("parse_seconds", "Parsing", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'parse_seconds_bucket{le="0.1"} 2',
+        'parse_seconds_bucket{le="1"} 3',
+        'parse_seconds_bucket{le="+Inf"} 4',
+        "parse_seconds_sum 3.65",
+        "parse_seconds_count 4",
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("fields_total", "Fields", ["field"]).inc(labels=('say "hi"',))
+    assert 'fields_total{field="say \\"hi\\""} 1' in registry.render()
+
+
+def test_server():
+    registry = MetricsRegistry()
+    registry.counter("frames_total", "Frames").inc()
+    server = MetricsServer(registry, port=0).start()
+    try:
+        r = requests.get(f"http://127.0.0.1:{server.port}/metrics", timeout=5)
+        assert r.status_code == 200
+        assert r.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert "frames_total 1" in r.text
+        assert requests.get(f"http://127.0.0.1:{server.port}/", timeout=5).status_code == 404
+    finally:
+        server.stop()
@@ -0,0 +1,99 @@
+import threading
+import time
+
+from weathervane.datasources import DEFAULT_WEATHER_DATA, DataSource, create_data_source, register_data_source
+from weathervane.multisource import MultiDataSource
+
+bits = [{"key": "windspeed"}, {"key": "airpressure"}, {"key": "error"}]
+
+
+class FastSource(DataSource):
+    def collect(self):
+        return {"timestamp": "2021-06-19T13:40:00", "windspeed": 3.3, "airpressure": None, "error": False}
+
+
+class SlowSource(DataSource):
+    delay = 0.3
+
+    def collect(self):
+        time.sleep(self.delay)
+        return {"timestamp": "2021-06-19T13:30:00", "windspeed": 2.0, "airpressure": 1014.8, "error": False}
+
+
+class BrokenSource(DataSource):
+    def collect(self):
+        raise ValueError("broken")
+
+
+class ErrorSource(DataSource):
+    def collect(self):
+        return DEFAULT_WEATHER_DATA
+
+
+class BlockingSource(DataSource):
+    release = threading.Event()
+    collections = 0
+
+    def collect(self):
+        BlockingSource.collections += 1
+        self.release.wait(5)
+        return FastSource().collect()
+
+
+for source_class in (FastSource, SlowSource, BrokenSource, ErrorSource, BlockingSource):
+    register_data_source(source_class.__name__, "tests.test_multisource:" + source_class.__name__)
+
+
+def create(sources, **kwargs):
+    return create_data_source(source=",".join(sources), bits=bits, **kwargs)
+
+
+def test_several_sources_create_a_multi_source():
+    source = create(["FastSource", "SlowSource"])
+    assert isinstance(source, MultiDataSource)
+    source.close()
+
+
+def test_hedged_uses_first_good_result():
+    source = create(["SlowSource", "BrokenSource", "FastSource"], source_mode="hedged")
+    start = time.monotonic()
+    wd = source.collect()
+    assert time.monotonic() - start < SlowSource.delay
+    assert wd["windspeed"] == 3.3
+    assert wd["field_sources"] == {"windspeed": "FastSource", "error": "FastSource"}
+    source.close()
+
+
+def test_merge_by_freshness():
+    source = create(["SlowSource", "FastSource", "ErrorSource"], source_mode="merge")
+    wd = source.collect()
+    assert wd["windspeed"] == 3.3, "the freshest data source should be the primary one"
+    assert wd["airpressure"] == 1014.8
+    assert wd["data_from_fallback"]
+    assert wd["field_sources"] == {"windspeed": "FastSource", "airpressure": "SlowSource", "error": "FastSource"}
+    source.close()
+
+
+def test_merge_respects_deadline():
+    source = create(["SlowSource", "FastSource"], source_mode="merge", source_deadline=0.1)
+    wd = source.collect()
+    assert wd["field_sources"] == {"windspeed": "FastSource", "error": "FastSource"}
+    assert wd["airpressure"] is None, "the only data source with the air pressure missed the deadline"
+    source.close()
+
+
+def test_no_good_data():
+    source = create(["BrokenSource", "ErrorSource"])
+    assert source.collect() == DEFAULT_WEATHER_DATA
+    source.close()
+
+
+def test_busy_source_is_left_out():
+    BlockingSource.collections = 0
+    BlockingSource.release.clear()
+    source = create(["BlockingSource", "FastSource"], source_deadline=0.1)
+    source.collect()
+    source.collect()
+    assert BlockingSource.collections == 1
+    BlockingSource.release.set()
+    source.close()
@@ -27,13 +27,14 @@ bits = [
 ]
 
 
-def load_test_data(stations):
+def load_test_data(stations, parse_mode=BuienradarParser.FULL):
     file_path = os.path.join(os.getcwd(), "tests", "buienradar.json")
     with open(file_path, "r", encoding="UTF-8") as f:
         data = f.read()
         config = {
             "stations": stations,
             "bits": bits,
+            "parse_mode": parse_mode,
         }
         bp = BuienradarParser(**config)
         return {"data": bp.parse(data=data), "config": config}
@@ -62,3 +63,25 @@ def test_missing_visibility_for_station_6308(
     visibility_fallback = weather_data_with_fallback["data"]["visibility"]
     visibility_complete = complete_weather_data["data"]["visibility"]
     assert visibility_fallback == visibility_complete
+
+
+def test_targeted_parse_matches_full_parse(weather_data_with_fallback):
+    targeted = load_test_data(stations=[6308, 6275], parse_mode=BuienradarParser.TARGETED)["data"]
+    full = weather_data_with_fallback["data"]
+    assert targeted == {key: value for key, value in full.items() if key in targeted}
+    assert targeted["visibility"] == 18100.0
+    assert targeted["stationname"] == "Meetstation Cadzand"
+
+
+def test_targeted_parse_only_keeps_configured_keys():
+    bp = BuienradarParser(stations=[6275, 6308], bits=[{"key": "windspeed"}], parse_mode=BuienradarParser.TARGETED)
+    with open(os.path.join(os.getcwd(), "tests", "buienradar.json"), "r", encoding="UTF-8") as f:
+        stations = bp.extract_stations(f.read())
+    assert set(stations.keys()) == {6275, 6308}
+    assert stations[6275] == {"stationid": 6275, "timestamp": "2021-06-19T13:40:00", "windspeed": 3.3}
+
+
+def test_targeted_parse_falls_back_to_full_decode():
+    data = '{"actual": {"stationmeasurements": [{"stationname": "{", "stationid": 6275, "windspeed": 1.0}]}}'
+    bp = BuienradarParser(stations=[6275], bits=[{"key": "windspeed"}], parse_mode=BuienradarParser.TARGETED)
+    assert bp.extract_stations(data)[6275]["windspeed"] == 1.0
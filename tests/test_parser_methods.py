@@ -39,3 +39,12 @@ def test_single_station():
         "error": False,
         "luchtdruk": None,
     }
+
+
+def test_merge_records_field_sources():
+    """Tests whether the station that supplied each field is recorded"""
+    weather_data = {1: {"luchtdruk": None, "wind": 3}, 2: {"luchtdruk": 1001}}
+
+    field_sources = {}
+    BuienradarParser.merge(weather_data, [1, 2], [{"key": "luchtdruk"}, {"key": "wind"}], field_sources)
+    assert field_sources == {"luchtdruk": 2, "wind": 1}
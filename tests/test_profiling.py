@@ -0,0 +1,56 @@
+import pytest
+
+from weathervane.profiling import NULL_SPAN, Profiler
+
+
+@pytest.fixture
+def profiler():
+    profiler = Profiler()
+    profiler.enable()
+    return profiler
+
+
+def test_disabled_span_does_nothing():
+    profiler = Profiler()
+    assert profiler.span("parse") is NULL_SPAN
+    with profiler.span("parse"):
+        pass
+    assert profiler.durations == {}
+
+
+def test_nested_spans(profiler):
+    for _ in range(3):
+        with profiler.span("cycle"):
+            with profiler.span("parse"):
+                pass
+            with profiler.span("encode"):
+                pass
+    assert list(profiler.durations) == ["parse", "encode", "cycle"]
+    assert all(len(durations) == 3 for durations in profiler.durations.values())
+    assert set(profiler.stacks) == {"cycle", "cycle;parse", "cycle;encode"}
+    assert profiler.stack() == []
+    assert sum(profiler.stacks.values()) == sum(profiler.durations["cycle"])
+
+
+def test_span_records_on_exception(profiler):
+    with pytest.raises(ValueError):
+        with profiler.span("parse"):
+            raise ValueError()
+    assert len(profiler.durations["parse"]) == 1
+    assert profiler.stack() == []
+
+
+def test_percentiles(profiler):
+    for ns in range(1, 101):
+        profiler.record("spi", "spi", ns * 1000000, ns * 1000000)
+    summary = profiler.summary()["spi"]
+    assert (summary["count"], summary["p50"], summary["p95"], summary["p99"]) == (100, 50, 95, 99)
+    assert summary["mean"] == pytest.approx(50.5)
+    assert profiler.report().splitlines()[1].split()[:2] == ["spi", "100"]
+
+
+def test_folded_stacks(profiler, tmp_path):
+    profiler.record("parse", "cycle;parse", 2000000, 1500000)
+    path = tmp_path / "stacks.folded"
+    profiler.write_folded(str(path))
+    assert path.read_text() == "cycle;parse 1500\n"
@@ -0,0 +1,122 @@
+import asyncio
+import gzip
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+from weathervane.clock import VirtualClock, VirtualTimeEventLoop
+from weathervane.datasources import DataCollectionException
+from weathervane.parser import WeathervaneConfigParser
+from weathervane.replay import Record, RecordingFetcher, ReplayFetcher, append_record, read_archive
+
+FEED_TIME = datetime(2021, 6, 19, 13, 40)
+
+with open(os.path.join(os.path.dirname(__file__), "buienradar.json")) as f:
+    FEED = f.read()
+
+
+def feed_at(moment: datetime) -> str:
+    return FEED.replace(FEED_TIME.isoformat(), moment.isoformat())
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return str(tmp_path / "feed.gz")
+
+
+class Fetcher(object):
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def get_weather_string(self):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        pass
+
+
+def test_archive_round_trip(archive):
+    append_record(archive, Record(2.0, "second"))
+    append_record(archive, Record(1.0, "first"))
+    append_record(archive, Record(3.0))
+    append_record(archive, Record(4.0, error="Buienradar: 500"))
+    assert read_archive(archive) == [
+        Record(1.0, "first"), Record(2.0, "second"), Record(3.0), Record(4.0, error="Buienradar: 500")
+    ]
+
+
+def test_archive_that_was_cut_short(archive):
+    append_record(archive, Record(1.0, "first"))
+    size = os.path.getsize(archive)
+    append_record(archive, Record(2.0, "second"))
+    with open(archive, "r+b") as f:
+        f.truncate(size + 10)
+    assert read_archive(archive) == [Record(1.0, "first")]
+
+
+def test_recording_fetcher(archive):
+    clock = VirtualClock(100.0)
+    fetcher = RecordingFetcher(Fetcher(["feed", None, DataCollectionException("down")]), archive, clock)
+    assert fetcher.get_weather_string() == "feed"
+    clock.advance(10)
+    assert fetcher.get_weather_string() is None
+    clock.advance(10)
+    with pytest.raises(DataCollectionException):
+        fetcher.get_weather_string()
+    assert read_archive(archive) == [Record(100.0, "feed"), Record(110.0), Record(120.0, error="down")]
+    with gzip.open(archive, "rt") as f:
+        assert len(f.readlines()) == 3
+
+
+def test_replay_fetcher_follows_the_clock():
+    clock = VirtualClock(0.0)
+    fetcher = ReplayFetcher([Record(10.0, "a"), Record(20.0), Record(30.0, error="down"), Record(40.0, "b")], clock)
+    with pytest.raises(DataCollectionException):
+        fetcher.get_weather_string()
+    clock.advance(10)
+    assert fetcher.get_weather_string() == "a"
+    clock.advance(5)
+    assert fetcher.get_weather_string() is None
+    clock.advance(5)
+    assert fetcher.get_weather_string() is None
+    clock.advance(10)
+    with pytest.raises(DataCollectionException, match="down"):
+        fetcher.get_weather_string()
+    clock.advance(10)
+    assert fetcher.get_weather_string() == "b"
+    fetcher.forget()
+    assert fetcher.get_weather_string() == "b"
+
+
+def test_event_loop_runs_in_virtual_time():
+    clock = VirtualClock(0.0)
+    loop = VirtualTimeEventLoop(clock)
+    try:
+        loop.run_until_complete(asyncio.sleep(3600))
+    finally:
+        loop.close()
+    assert clock.monotonic() == pytest.approx(3600)
+
+
+def test_replay_drives_the_weathervane(archive):
+    for n in range(12):
+        moment = FEED_TIME + timedelta(minutes=10 * n)
+        append_record(archive, Record(moment.timestamp() + 60, feed_at(moment)))
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(os.path.join(os.path.dirname(__file__), "config-test1.ini"))
+    configuration = config_parser.parse_config()
+
+    stats = main.replay(configuration, archive, hours=6)
+
+    assert stats.virtual_seconds == pytest.approx(6 * 3600)
+    assert stats.collections == pytest.approx(6 * 3600 // configuration["data_collection_interval"], abs=1)
+    # the replay starts a minute after the first measurement, and the last measurement turns stale two hours after it
+    # was taken, at 1:50 hours
+    stale = (6 * 3600 - (110 * 60 - 60 + 2 * 3600)) // configuration["data_collection_interval"]
+    assert stats.errors == pytest.approx(stale, abs=1)
+    assert stats.frames_sent > 0
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from weathervane.scheduler import JitterStats, next_deadline, run_periodically
+
+
+def test_next_deadline():
+    assert next_deadline(10.0, 2.0, 10.5) == 12.0
+
+
+def test_next_deadline_skips_missed_deadlines():
+    assert next_deadline(10.0, 2.0, 15.5) == 16.0
+    assert next_deadline(10.0, 2.0, 16.0) == 18.0
+
+
+def test_jitter_stats():
+    jitter = JitterStats("test", report_every=3)
+    jitter.record(0.001)
+    jitter.record(0.003)
+    assert jitter.count == 2
+    assert jitter.mean == pytest.approx(0.002)
+    assert jitter.max == 0.003
+    jitter.record(0.002)
+    assert jitter.count == 0, "the statistics should be reset after they are reported"
+
+
+def test_run_periodically():
+    calls = []
+    jitter = JitterStats("test")
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(run_periodically(0.02, lambda: calls.append(loop.time()), jitter=jitter))
+        await asyncio.sleep(0.11)
+        task.cancel()
+
+    asyncio.run(run())
+    assert 5 <= len(calls) <= 7
+    assert jitter.count == len(calls)
+    assert calls[-1] - calls[0] == pytest.approx(0.02 * (len(calls) - 1), abs=0.01)
@@ -0,0 +1,17 @@
+from benchmarks.startup import first_frame, slowest_imports
+
+
+def test_heavy_dependencies_are_imported_lazily():
+    startup = first_frame()
+    assert startup.lazy_modules_imported == []
+
+
+def test_slowest_imports():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       100 |        100 |     json.decoder",
+        "import time:       200 |        300 |   json",
+        "import time:        50 |         50 |       deep",
+        "import time:       400 |       1000 | main",
+    ])
+    assert slowest_imports(stderr) == [(1000, "main"), (300, "json")]
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+
+import gpiozero
+import pytest
+from gpiozero.pins.mock import MockFactory
+
+from main import WeatherVane
+from weathervane.parser import load_config
+from weathervane.watcher import FileWatcher, Inotify
+
+CONFIG_FILE = os.path.join(os.path.dirname(__file__), "config-test1.ini")
+
+
+@pytest.fixture(autouse=True)
+def pins():
+    previous = gpiozero.Device.pin_factory
+    gpiozero.Device.pin_factory = MockFactory()
+    yield
+    gpiozero.Device.pin_factory.reset()
+    gpiozero.Device.pin_factory = previous
+
+
+@pytest.fixture
+def log(caplog):
+    logger = multiprocessing.get_logger()
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    logger.addHandler(caplog.handler)
+    yield caplog
+    logger.removeHandler(caplog.handler)
+    logger.setLevel(level)
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "config.ini"
+    with open(CONFIG_FILE) as f:
+        path.write_text(f.read())
+    return str(path)
+
+
+def edit(path, old, new):
+    with open(path) as f:
+        text = f.read()
+    assert old in text
+    # like an editor: write a new file and rename it over the old one
+    with open(path + ".new", "w") as f:
+        f.write(text.replace(old, new))
+    os.replace(path + ".new", path)
+
+
+def changes_seen(path, use_inotify, change):
+    calls = []
+
+    async def watch():
+        watcher = FileWatcher(path, lambda: calls.append(watcher.method), poll_interval=0.05, settle=0.05,
+                              use_inotify=use_inotify).start(asyncio.get_running_loop())
+        try:
+            await asyncio.sleep(0.1)
+            change()
+            for _ in range(100):
+                await asyncio.sleep(0.02)
+                if calls:
+                    break
+            # a burst of changes is reported once
+            await asyncio.sleep(0.2)
+        finally:
+            watcher.stop()
+
+    asyncio.run(watch())
+    return calls
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_file_watcher(config_file, use_inotify):
+    def change():
+        edit(config_file, "channel=0", "channel=1")
+        with open(config_file, "a") as f:
+            f.write("\n")
+
+    calls = changes_seen(config_file, use_inotify, change)
+    assert calls == ["inotify" if use_inotify else "polling"]
+
+
+def test_file_watcher_ignores_other_files(config_file):
+    def change():
+        with open(config_file + ".compiled", "w") as f:
+            f.write("{}")
+
+    assert changes_seen(config_file, True, change) == []
+
+
+def test_inotify_on_a_missing_directory(tmp_path):
+    with pytest.raises(OSError):
+        Inotify(str(tmp_path / "missing"))
+
+
+@pytest.fixture
+def weathervane(config_file):
+    configuration = dict(load_config(config_file).as_dict(), test=True, config_file=config_file)
+    configuration["display"] = dict(configuration["display"], **{"auto-turn-off": True})
+    wv = WeatherVane(**configuration)
+    wv.file_configuration = load_config(config_file).as_dict()
+    wv.wd = {"windspeed": 10.0}
+    yield wv
+    wv.collector.stop(timeout=5)
+    wv.display.close()
+
+
+def test_reload_applies_bits_stations_and_display(weathervane, config_file, log):
+    old_encoder = weathervane.interface.encoder
+    edit(config_file, "1=windspeed,6,0,63,1", "1=windspeed,5,0,31,1\n1000=random,1")
+    edit(config_file, "1=6308", "1=6260")
+    edit(config_file, "start-time=06:45", "start-time=07:00")
+    edit(config_file, "frequency=", "frequency=1")
+
+    assert weathervane.reload_config()
+    assert "Changes to frequency in" in log.text
+    assert weathervane.interface.encoder is not old_encoder
+    assert weathervane.interface.encoder.bit_length == old_encoder.bit_length
+    assert weathervane.interface.stations == [6320, 6260]
+    assert weathervane.configuration["stations"] == [6320, 6260]
+    assert weathervane.create_data_source().parser.stations == [6320, 6260]
+    assert weathervane.display.start_at_minutes == 7 * 60
+    assert weathervane.interface.frequency != weathervane.file_configuration["frequency"], "takes a restart"
+    assert weathervane.wd == {"windspeed": 10.0}, "the weather data should be kept"
+    assert not weathervane.reload_config(), "nothing changed since the last reload"
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    [
+        ("1=windspeed,6,0,63,1", "1=windspeed,7,0,63,1"),
+        ("start-time=06:45", "start-time=25:00"),
+        ("[Bit Packing]", "[Bit Packing"),
+    ],
+)
+def test_invalid_config_keeps_the_current_one(weathervane, config_file, old, new, log):
+    encoder, display, configuration = weathervane.interface.encoder, weathervane.display, weathervane.configuration
+    edit(config_file, old, new)
+    edit(config_file, "1=6308", "1=6260")
+
+    assert not weathervane.reload_config()
+    assert weathervane.interface.encoder is encoder
+    assert weathervane.display is display and display.start_at_minutes == 6 * 60 + 45
+    assert weathervane.configuration is configuration
+    assert weathervane.interface.stations == [6320, 6308]
+    assert "Keeping the current configuration" in log.text
+
+
+def test_failed_apply_changes_neither_bits_nor_display(weathervane, config_file, monkeypatch, log):
+    encoder, display = weathervane.interface.encoder, weathervane.display
+    edit(config_file, "1=windspeed,6,0,63,1", "1=windspeed,5,0,31,1\n1000=random,1")
+    edit(config_file, "start-time=06:45", "start-time=07:00")
+
+    def fail(**kwargs):
+        raise OSError("pin 4 is busy")
+
+    monkeypatch.setattr(display, "configure", fail)
+    assert not weathervane.reload_config()
+    assert weathervane.interface.encoder is encoder
+    assert "pin 4 is busy" in log.text
+
+    monkeypatch.undo()
+    monkeypatch.setattr("main.EncoderPlan", lambda bits: fail())
+    assert not weathervane.reload_config()
+    assert display.start_at_minutes == 6 * 60 + 45, "the display should keep its schedule"
+    assert weathervane.interface.encoder is encoder
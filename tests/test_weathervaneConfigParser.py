@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 import os
 
+from weathervane.config import BitField
 from weathervane.parser import WeathervaneConfigParser
 
 config_file_name = "config-test1.ini"
@@ -22,11 +23,32 @@ def test_parse_config():
         "bits",
         "test",
         "barometric_trend",
+        "http",
+        "parse_mode",
+        "source_mode",
+        "source_deadline",
+        "interpolation",
+        "cache_file",
+        "cache_interval",
+        "history_file",
+        "metrics_port",
+        "record_file",
+        "config_poll_interval",
+        "spi_bus",
+        "vanes",
+        "logging",
+        "keep_alive",
+        "spi_mode",
+        "spi_retries",
+        "checksum",
+        "max_retransmits",
+        "min_frequency",
+        "error_threshold",
         "display",
     ]
     observed = cp.parse_config()
     assert set(observed.keys()) == set(expected_keys)
-    assert len(observed["bits"]) == 16
+    assert len(observed["bits"]) == 17
 
 
 def test_parse_station_numbers():
@@ -44,10 +66,20 @@ def test_rain_config():
     cp.read(config_file)
     observed = cp.parse_config()
     rain_config = observed["bits"][13]
-    assert rain_config == {
-        "key": "rainFallLastHour",
-        "length": "10",
-        "min": "0",
-        "max": "99.9",
-        "step": "0.1",
+    assert rain_config == BitField("rainFallLastHour", 10, 0.0, 99.9, 0.1)
+    assert rain_config["key"] == "rainFallLastHour"
+    assert rain_config.get("step", 1) == 0.1
+
+
+def test_http_defaults():
+    config_file = os.path.join(os.getcwd(), "tests", config_file_name)
+    cp = WeathervaneConfigParser()
+    cp.read(config_file)
+    observed = cp.parse_config()
+    assert observed["http"] == {
+        "connect_timeout": 3.05,
+        "read_timeout": 10.0,
+        "retries": 3,
+        "backoff_factor": 0.5,
+        "backoff_max": 30.0,
     }
@@ -80,6 +80,34 @@ class WeatherVaneTest(unittest.TestCase):
         self.interface.send(weather_data)
         self.assertFalse(self.interface.data_changed)
 
+    def test_keep_alive_suppresses_unchanged_frames(self, mock_class):
+        self.interface.keep_alive = 60
+        weather_data = {"winddirection": "NO", "windspeed": 4}
+        self.assertTrue(self.interface.send(weather_data))
+        self.assertFalse(self.interface.send(weather_data))
+        self.assertFalse(self.interface.send(dict(weather_data)))
+        self.assertTrue(self.interface.send({"winddirection": "O", "windspeed": 4}))
+        self.assertEqual(2, self.interface.frames_sent)
+        self.assertEqual(2, self.interface.frames_suppressed)
+        self.assertEqual(2, self.interface.gpio.send_data.call_count)
+
+    def test_keep_alive_resends_after_period(self, mock_class):
+        self.interface.keep_alive = 60
+        weather_data = {"winddirection": "NO"}
+        self.interface.send(weather_data)
+        self.interface.last_sent -= 61
+        self.assertTrue(self.interface.send(weather_data))
+        self.assertEqual(0, self.interface.frames_suppressed)
+
+    def test_random_field_only_changes_when_sent(self, mock_class):
+        bits = [{"key": "winddirection", "length": "4"}, {"key": "random", "length": "12"}]
+        interface = WeatherVaneInterface(**dict(test_config.config, bits=bits, keep_alive=60))
+        weather_data = {"winddirection": "NO"}
+        self.assertTrue(interface.send(weather_data))
+        for _ in range(10):
+            self.assertFalse(interface.send(weather_data))
+        self.assertEqual(interface.new_byte_array, bytes(interface.convert_data(weather_data)))
+
     def test_error_winddirection(self, mock_class):
         weather_data = {"winddirection": "A"}
         requested_data = [{"key": "winddirection", "length": "4"}]
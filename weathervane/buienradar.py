@@ -0,0 +1,225 @@
+import multiprocessing
+import random
+import time
+from collections import Counter
+from typing import List, NamedTuple, Optional
+
+from weathervane.clock import REAL_CLOCK
+from weathervane.datasources import DEFAULT_WEATHER_DATA, UNCHANGED, DataCollectionException, DataSource
+from weathervane.metrics import REGISTRY
+from weathervane.parser import BuienradarParser
+from weathervane.profiling import PROFILER
+
+HTTP_OK = 200
+HTTP_NOT_MODIFIED = 304
+HTTP_TOO_MANY_REQUESTS = 429
+
+logger = multiprocessing.get_logger().getChild("collector")
+
+FETCH_SECONDS = REGISTRY.histogram(
+    "weathervane_fetch_seconds", "Duration of each attempt to retrieve the Buienradar feed", ["status"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+class Attempt(NamedTuple):
+    number: int
+    status: Optional[int]
+    latency: float
+
+
+class BuienradarFetcher(object):
+    """Retrieves the Buienradar feed over a single, long-lived HTTP session.
+
+    The session keeps its connection alive between collections, so only the first request pays for the DNS lookup and
+    the TCP and TLS handshakes. Failed attempts (connection errors, timeouts and 5xx responses) are retried with an
+    exponential backoff and full jitter. The latency of each attempt of the last retrieval is kept in L{attempts}.
+
+    The ETag and Last-Modified validators of the last full response are sent along with the next request, so that
+    Buienradar can answer with a short 304 when the feed has not been refreshed in the meantime.
+    """
+
+    URL = "https://data.buienradar.nl/2.0/feed/json"
+    RETRYABLE_STATUS_CODES = (HTTP_TOO_MANY_REQUESTS,)
+
+    def __init__(self, url=URL, connect_timeout=3.05, read_timeout=10.0, retries=3, backoff_factor=0.5,
+                 backoff_max=30.0, sleep=time.sleep):
+        """
+        @param url: the location of the feed
+        @param connect_timeout: the seconds to wait for the connection to be set up
+        @param read_timeout: the seconds to wait between bytes of the response
+        @param retries: the amount of retries after the first attempt fails
+        @param backoff_factor: the maximum wait in seconds before the first retry, doubled for every next retry
+        @param backoff_max: the upper limit in seconds of the wait between two attempts
+        """
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+        self.attempts: List[Attempt] = []
+        self.etag = None
+        self.last_modified = None
+        self.body_length = 0
+        self.status_counts = Counter()
+        self.bytes_saved = 0
+
+        # requests takes a long time to import, and is not needed to replay or read a feed from a file
+        import requests
+        import requests.adapters
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def __repr__(self):
+        return "BuienradarFetcher(url=%s, retries=%d)" % (self.url, self.retries)
+
+    def backoff(self, retry_number):
+        """Return the seconds to wait before the given retry: a random value up to the exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * 2 ** retry_number))
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def forget(self):
+        """Forget the validators, so that the next request retrieves the complete feed again"""
+        self.etag = None
+        self.last_modified = None
+
+    def get_weather_string(self) -> Optional[str]:
+        """Retrieve the feed, retrying when the request fails in a way that may be temporary.
+
+        @return: the body of the response, or None when the feed has not been modified since the last full response
+        @raise DataCollectionException: when no attempt succeeded, or the response cannot be retried
+        """
+        import requests
+
+        self.attempts = []
+        for number in range(self.retries + 1):
+            if number:
+                self.sleep(self.backoff(number - 1))
+            start = time.monotonic()
+            try:
+                r = self.session.get(self.url, headers=self.conditional_headers(), timeout=self.timeout)
+            except requests.RequestException as e:
+                self.attempts.append(Attempt(number, None, time.monotonic() - start))
+                FETCH_SECONDS.observe(self.attempts[-1].latency, ("error",))
+                logger.warning(f"Attempt {number} failed after {self.attempts[-1].latency:.3f} s: {e!r}")
+                continue
+
+            self.attempts.append(Attempt(number, r.status_code, time.monotonic() - start))
+            logger.info(f"Attempt {number} got status {r.status_code} in {self.attempts[-1].latency:.3f} s")
+            self.status_counts[r.status_code] += 1
+            FETCH_SECONDS.observe(self.attempts[-1].latency, (r.status_code,))
+            if r.status_code == HTTP_OK:
+                self.etag = r.headers.get("ETag")
+                self.last_modified = r.headers.get("Last-Modified")
+                self.body_length = len(r.content)
+                return r.text
+            if r.status_code == HTTP_NOT_MODIFIED:
+                self.bytes_saved += self.body_length
+                return None
+            if r.status_code < 500 and r.status_code not in self.RETRYABLE_STATUS_CODES:
+                raise DataCollectionException(f"Buienradar: {r.status_code}")
+
+        raise DataCollectionException(f"Buienradar: no data after {len(self.attempts)} attempts")
+
+    def close(self):
+        self.session.close()
+
+
+class FileFetcher(object):
+    """Reads a recorded feed from a file instead of retrieving it, to run the weathervane offline"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.status_counts = Counter()
+        self.bytes_saved = 0
+
+    def __repr__(self):
+        return "FileFetcher(path=%s)" % self.path
+
+    def get_weather_string(self) -> str:
+        with open(self.path, encoding="utf-8") as f:
+            data = f.read()
+        self.status_counts[HTTP_OK] += 1
+        return data
+
+    def forget(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class BuienradarDataSource(DataSource):
+    """Collects and parses the Buienradar feed, remembering the last result.
+
+    When the feed has not been modified since the last collection, the last parsed weather data is reused. It is
+    only enriched again, so that it still turns into an error once it becomes stale, and marked as L{UNCHANGED}.
+    """
+
+    def __init__(self, *args, fetcher=None, **kwargs):
+        clock = kwargs.get("clock", REAL_CLOCK)
+        self.fetcher = fetcher if fetcher else BuienradarFetcher(sleep=clock.sleep, **kwargs.get("http", {}))
+        if kwargs.get("record_file"):
+            from weathervane.replay import RecordingFetcher
+
+            self.fetcher = RecordingFetcher(self.fetcher, kwargs["record_file"], clock)
+        self.parser = BuienradarParser(*args, **kwargs)
+        self.last_weather_data = None
+
+    def __repr__(self):
+        return "BuienradarDataSource(fetcher=%r)" % self.fetcher
+
+    def collect(self) -> dict:
+        """Retrieve and parse the weather data
+
+        @return: the weather data, marked as L{UNCHANGED} when it is the same as the last time, or the default weather
+        data when no good data could be retrieved
+        """
+        try:
+            with PROFILER.span("fetch"):
+                data = self.fetcher.get_weather_string()
+        except DataCollectionException as e:
+            logger.error(f"Retrieving data failed several times. Setting error. {e}")
+            return DEFAULT_WEATHER_DATA
+        finally:
+            self.log_counters()
+
+        if data is None:
+            if self.last_weather_data is None:
+                logger.error("Feed was not modified, but there is no earlier data. Setting error.")
+                self.fetcher.forget()
+                return DEFAULT_WEATHER_DATA
+            wd = self.parser.refresh(self.last_weather_data)
+            wd[UNCHANGED] = True
+            return wd
+
+        try:
+            wd = self.parser.parse(data)
+        except Exception as e:
+            logger.error(f"Data parsing failed. Cannot send good data. Setting error. {e!r}")
+            self.fetcher.forget()
+            self.last_weather_data = None
+            return DEFAULT_WEATHER_DATA
+        self.last_weather_data = dict(wd)
+        return wd
+
+    def log_counters(self):
+        counts = self.fetcher.status_counts
+        logger.info(
+            f"Buienradar responses: {counts[HTTP_OK]} full, {counts[HTTP_NOT_MODIFIED]} not modified, "
+            f"{self.fetcher.bytes_saved} bytes saved"
+        )
+
+    def close(self):
+        self.fetcher.close()
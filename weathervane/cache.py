@@ -0,0 +1,128 @@
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+import time
+import zlib
+from typing import Optional, Tuple
+
+logger = multiprocessing.get_logger().getChild("collector")
+
+
+class LastKnownGoodCache(object):
+    """Keeps the last good weather data, and the frame it was encoded into, in a small file on disk.
+
+    At startup the display can be fed from this file right away, instead of waiting for the first collection. The file
+    has a fixed size and is memory-mapped. It holds two slots that are written in turn, each with a sequence number
+    and a CRC. A write that is cut short by a power loss only damages the slot that was being written, so the other
+    slot still holds the previous record. To spare the SD card, a record is only written when the data has changed,
+    and at most once every min_interval seconds.
+    """
+
+    MAGIC = b"WVLG"
+    VERSION = 1
+    SLOT_SIZE = 4096
+    SLOTS = 2
+    HEADER = struct.Struct("<4sBxHQdIII")
+
+    def __init__(self, path: str, min_interval: float = 900.0, layout: bytes = b""):
+        """
+        @param path: the location of the file
+        @param min_interval: the minimum amount of seconds between two writes
+        @param layout: identifies the layout of the frame. A cached frame is only used when the layout is the same.
+        """
+        self.path = path
+        self.min_interval = min_interval
+        self.layout_crc = zlib.crc32(layout)
+        self.sequence = 0
+        self.last_write = None
+        self.last_payload = None
+        self.mm: Optional[mmap.mmap] = None
+
+    def set_layout(self, layout: bytes):
+        """Use another layout for the frames that are saved from now on, such as after the bit fields were changed"""
+        self.layout_crc = zlib.crc32(layout)
+
+    def __repr__(self):
+        return "LastKnownGoodCache(path=%s, min_interval=%.0f)" % (self.path, self.min_interval)
+
+    def open(self):
+        size = self.SLOT_SIZE * self.SLOTS
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+                os.fsync(fd)
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+    def _read_slot(self, slot: int) -> Optional[Tuple[int, float, int, bytes, bytes]]:
+        offset = slot * self.SLOT_SIZE
+        header = self.mm[offset:offset + self.HEADER.size]
+        magic, version, frame_length, sequence, saved_at, layout_crc, payload_length, crc = self.HEADER.unpack(header)
+        if magic != self.MAGIC or version != self.VERSION:
+            return None
+        end = offset + self.HEADER.size + payload_length + frame_length
+        if end > offset + self.SLOT_SIZE:
+            return None
+        body = self.mm[offset + self.HEADER.size:end]
+        if zlib.crc32(header[:-4] + body) != crc:
+            logger.warning(f"Slot {slot} of {self.path} is damaged")
+            return None
+        return sequence, saved_at, layout_crc, body[:payload_length], body[payload_length:]
+
+    def load(self) -> Optional[Tuple[dict, Optional[bytes]]]:
+        """Load the most recent intact record
+
+        @return: the weather data and the frame, or None when there is no intact record. The frame is None when it was
+        encoded with another layout.
+        """
+        if self.mm is None:
+            self.open()
+        records = [record for record in (self._read_slot(slot) for slot in range(self.SLOTS)) if record]
+        if not records:
+            return None
+        sequence, saved_at, layout_crc, payload, frame = max(records)
+        self.sequence = sequence
+        self.last_payload = payload
+        logger.info(f"Loaded the weather data that was saved at {time.ctime(saved_at)} from {self.path}")
+        return json.loads(payload), frame if layout_crc == self.layout_crc else None
+
+    def save(self, weather_data: dict, frame: bytes, force: bool = False) -> bool:
+        """Save the weather data and its frame, unless it has not changed or the last write was too recent.
+
+        @param force: write even when the last write was too recent
+        @return: whether the record was written
+        """
+        payload = json.dumps(weather_data, separators=(",", ":"), default=str).encode("utf-8")
+        if payload == self.last_payload:
+            return False
+        now = time.monotonic()
+        if not force and self.last_write is not None and now - self.last_write < self.min_interval:
+            return False
+        if self.HEADER.size + len(payload) + len(frame) > self.SLOT_SIZE:
+            logger.warning(f"Weather data of {len(payload)} bytes does not fit in {self.path}")
+            return False
+        if self.mm is None:
+            self.open()
+
+        sequence = self.sequence + 1
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, len(frame), sequence, time.time(), self.layout_crc,
+                                  len(payload), 0)
+        body = payload + bytes(frame)
+        record = header[:-4] + struct.pack("<I", zlib.crc32(header[:-4] + body)) + body
+        offset = (sequence % self.SLOTS) * self.SLOT_SIZE
+        self.mm[offset:offset + len(record)] = record
+        self.mm.flush(offset - offset % mmap.PAGESIZE, len(record) + offset % mmap.PAGESIZE)
+
+        self.sequence = sequence
+        self.last_write = now
+        self.last_payload = payload
+        return True
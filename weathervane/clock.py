@@ -0,0 +1,120 @@
+import asyncio
+import selectors
+import time
+from datetime import datetime
+from typing import Callable
+
+
+class Clock(object):
+    """The time as the weathervane sees it.
+
+    monotonic() measures intervals, time() and now() tell the time of day and sleep() waits, like the functions of the
+    same name in the time and datetime modules. The event loop of the weathervane comes from the clock as well, so that
+    its timers follow the same time.
+    """
+
+    def __repr__(self):
+        return "Clock()"
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def time(self) -> float:
+        return time.time()
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def new_event_loop(self, busy: Callable[[], bool] = lambda: False) -> asyncio.AbstractEventLoop:
+        return asyncio.new_event_loop()
+
+
+REAL_CLOCK = Clock()
+
+
+class VirtualClock(Clock):
+    """A clock that only moves when it is advanced, to run the weathervane faster than the real time.
+
+    Sleeping advances the clock at once, and its event loop jumps straight to the next deadline, see
+    L{VirtualTimeEventLoop}. Days of operation take seconds.
+    """
+
+    def __init__(self, start: float, speed: float = 0.0):
+        """
+        @param start: the time of day at which the clock starts, in seconds since the epoch
+        @param speed: how many times faster than the real time the event loop runs, or 0 to jump to the next deadline
+        at once
+        """
+        self.start = start
+        self.speed = speed
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return "VirtualClock(now=%s)" % self.now().isoformat(timespec="seconds")
+
+    def advance(self, seconds: float):
+        self.elapsed += max(0.0, seconds)
+
+    def monotonic(self) -> float:
+        return self.elapsed
+
+    def time(self) -> float:
+        return self.start + self.elapsed
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.time())
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def new_event_loop(self, busy: Callable[[], bool] = lambda: False) -> asyncio.AbstractEventLoop:
+        return VirtualTimeEventLoop(self, busy, self.speed)
+
+
+class VirtualTimeSelector(selectors.DefaultSelector):
+    """Waits for the events of an event loop in virtual time.
+
+    When the loop would wait for its next timer, the L{VirtualClock} is advanced to that timer instead, either at once
+    or at a multiple of the real time. While the loop is busy waiting for work in another thread, such as a collection,
+    the selector waits in real time and the virtual time stands still, so that the work takes no virtual time at all.
+    """
+
+    BUSY_POLL = 1.0
+
+    def __init__(self, clock: VirtualClock, busy: Callable[[], bool], speed: float = 0.0):
+        super(VirtualTimeSelector, self).__init__()
+        self.clock = clock
+        self.busy = busy
+        self.speed = speed
+
+    def select(self, timeout=None):
+        events = super(VirtualTimeSelector, self).select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None or self.busy():
+            return super(VirtualTimeSelector, self).select(self.BUSY_POLL if timeout is not None else None)
+        if not self.speed:
+            self.clock.advance(timeout)
+            return []
+        start = time.monotonic()
+        events = super(VirtualTimeSelector, self).select(timeout / self.speed)
+        self.clock.advance(timeout if not events else (time.monotonic() - start) * self.speed)
+        return events
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    """An event loop whose time is a L{VirtualClock}, so that its timers and sleeps run in virtual time"""
+
+    def __init__(self, clock: VirtualClock, busy: Callable[[], bool] = lambda: False, speed: float = 0.0):
+        """
+        @param busy: tells whether work in another thread is under way, which the loop waits for in real time
+        @param speed: how many times faster than the real time the clock runs, or 0 to jump to the next timer at once
+        """
+        super(VirtualTimeEventLoop, self).__init__(VirtualTimeSelector(clock, busy, speed))
+        self.clock = clock
+
+    def time(self) -> float:
+        return self.clock.monotonic()
@@ -0,0 +1,154 @@
+import multiprocessing
+import queue
+import threading
+from typing import Callable, Optional
+
+from weathervane.clock import REAL_CLOCK, Clock
+from weathervane.datasources import DEFAULT_WEATHER_DATA
+
+logger = multiprocessing.get_logger().getChild("collector")
+
+COLLECT = "collect"
+RELOAD = "reload"
+STOP = "stop"
+
+
+class Collector(object):
+    """A single, long-lived worker that collects weather data on request.
+
+    The worker owns one data source for its whole life, so connections, validators and earlier results are kept
+    between collections. Commands go to the worker over a queue, and the results come back over another. Only one
+    collection can be in flight: a request to collect while the previous collection is still running is ignored.
+
+    The worker is supervised: when it dies, it is started again, with a fresh data source, the next time the collector
+    is used. A collection that was in flight at that moment is handed to the new worker.
+    """
+
+    def __init__(self, source_factory: Callable, on_result: Optional[Callable] = None, clock: Clock = REAL_CLOCK):
+        """
+        @param source_factory: creates the data source of the worker. The data source has a collect() method that
+        returns the weather data
+        @param on_result: called from the worker, without arguments, each time a result is ready to be received
+        @param clock: the clock with which the duration of the collections is measured
+        """
+        self.source_factory = source_factory
+        self.on_result = on_result
+        self.clock = clock
+        self.started_at = None
+        self.last_duration = None
+        self.commands = queue.Queue()
+        self.results = queue.Queue()
+        self.in_flight = False
+        self.restarts = 0
+        self.thread: Optional[threading.Thread] = None
+
+    def __repr__(self):
+        return "Collector(alive=%s, in_flight=%s, restarts=%d)" % (self.is_alive(), self.in_flight, self.restarts)
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="collector", daemon=True)
+        self.thread.start()
+
+    def ensure_alive(self):
+        """Start the worker again when it has died"""
+        if self.is_alive():
+            return
+        if self.thread is not None:
+            self.restarts += 1
+            logger.error(f"Collector died; restarting it (restart {self.restarts})")
+        while not self.commands.empty():
+            self.commands.get_nowait()
+        self.start()
+        if self.in_flight:
+            self.commands.put(COLLECT)
+
+    def collect_now(self) -> bool:
+        """Ask the worker to collect the weather data.
+
+        @return: whether the collection was started. It is not, when the previous collection is still in flight.
+        """
+        self.ensure_alive()
+        if self.in_flight:
+            logger.warning(
+                f"Previous collection is still in flight after {self.clock.monotonic() - self.started_at:.1f} s; "
+                f"skipping this one"
+            )
+            return False
+        self.in_flight = True
+        self.started_at = self.clock.monotonic()
+        self.commands.put(COLLECT)
+        return True
+
+    def receive(self, timeout: float = 0) -> Optional[dict]:
+        """Return the result of the collection in flight, if it is there.
+
+        @param timeout: the seconds to wait for the result
+        @return: the weather data, or None when the collection is not finished yet
+        """
+        try:
+            wd = self.results.get_nowait()
+        except queue.Empty:
+            self.ensure_alive()
+            if not timeout:
+                return None
+            try:
+                wd = self.results.get(timeout=timeout)
+            except queue.Empty:
+                return None
+        self.in_flight = False
+        self.last_duration = self.clock.monotonic() - self.started_at
+        return wd
+
+    def reload(self):
+        """Have the worker close its data source and create a new one, such as after the configuration was changed.
+
+        A collection in flight still finishes with the old data source.
+        """
+        if self.is_alive():
+            self.commands.put(RELOAD)
+
+    def stop(self, timeout: float = None):
+        if self.is_alive():
+            self.commands.put(STOP)
+            self.thread.join(timeout)
+
+    def _run(self):
+        source = self.source_factory()
+        logger.info(f"Collector started with {source!r}")
+        try:
+            while True:
+                command = self.commands.get()
+                if command == STOP:
+                    break
+                if command == RELOAD:
+                    source = self._replace(source)
+                    continue
+                try:
+                    wd = source.collect()
+                except Exception:
+                    logger.exception("Data collection failed. Setting error.")
+                    wd = DEFAULT_WEATHER_DATA
+                self.results.put(wd)
+                if self.on_result:
+                    self.on_result()
+        finally:
+            self._close(source)
+
+    def _replace(self, source):
+        try:
+            new_source = self.source_factory()
+        except Exception:
+            logger.exception(f"Cannot create a new data source; keeping {source!r}")
+            return source
+        self._close(source)
+        logger.info(f"Collector continues with {new_source!r}")
+        return new_source
+
+    @staticmethod
+    def _close(source):
+        close = getattr(source, "close", None)
+        if close:
+            close()
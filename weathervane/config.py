@@ -0,0 +1,342 @@
+import re
+from types import MappingProxyType
+from typing import Any, Mapping, Optional, Sequence, Tuple
+
+
+class InvalidConfigException(Exception):
+    pass
+
+
+class Frozen(object):
+    """The base of the parts of the compiled configuration, which cannot be changed once they are created"""
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} cannot be changed")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} cannot be changed")
+
+    def _set(self, **values):
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._values() == self._values()
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __repr__(self):
+        return "%s(%s)" % (
+            self.__class__.__name__,
+            ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__),
+        )
+
+
+def parse_number(text: str, description: str, kind=float):
+    try:
+        return kind(text.strip())
+    except ValueError:
+        raise InvalidConfigException(f"{description} must be {'an integer' if kind is int else 'a number'}, "
+                                     f"not '{text.strip()}'") from None
+
+
+class BitField(Frozen):
+    """A field in the [Bit Packing] section: the key of the measurement and the amount of bits it takes.
+
+    A numeric field can also have a minimum, a maximum and a step, which scale the measurement to the bits. Fields
+    can be read like the dictionaries that they replace, such as field["key"] and field.get("step", 1).
+    """
+
+    __slots__ = ("key", "length", "min", "max", "step")
+
+    SIMPLE = 2
+    EXTENDED = 5
+
+    def __init__(self, key: str, length: int, min: Optional[float] = None, max: Optional[float] = None,
+                 step: Optional[float] = None):
+        self._set(key=key, length=length, min=min, max=max, step=step)
+
+    @classmethod
+    def parse(cls, text: str, name: str) -> "BitField":
+        """Parse a field as it is written in the configuration: 'key,length' or 'key,length,min,max,step'
+
+        @param name: where the field was found, for the error messages
+        @raise InvalidConfigException: when the field is not written correctly
+        """
+        parts = [part.strip() for part in text.split(",")]
+        if len(parts) not in (cls.SIMPLE, cls.EXTENDED):
+            raise InvalidConfigException(
+                f"{name} = {text}: expected 'key,length' or 'key,length,min,max,step', but got {len(parts)} values"
+            )
+        if not parts[0]:
+            raise InvalidConfigException(f"{name} = {text}: the key is empty")
+        length = parse_number(parts[1], f"{name}: the length of {parts[0]}", int)
+        if len(parts) == cls.SIMPLE:
+            return cls(parts[0], length)
+        minimum, maximum, step = (
+            parse_number(part, f"{name}: the {what} of {parts[0]}", float)
+            for part, what in zip(parts[2:], ("minimum", "maximum", "step"))
+        )
+        return cls(parts[0], length, minimum, maximum, step)
+
+    @classmethod
+    def coerce(cls, bit_config) -> "BitField":
+        """Return a field for a field or for a dictionary in the old form, in which the numbers are strings"""
+        if isinstance(bit_config, BitField):
+            return bit_config
+        try:
+            key = bit_config["key"]
+            length = parse_number(str(bit_config["length"]), f"The length of {key}", int)
+        except KeyError as e:
+            raise InvalidConfigException(f"The field {bit_config} has no {e}") from None
+        optional = (
+            parse_number(str(bit_config[name]), f"The {name} of {key}", float) if name in bit_config else None
+            for name in ("min", "max", "step")
+        )
+        return cls(key, length, *optional)
+
+    @property
+    def extended(self) -> bool:
+        return self.min is not None or self.max is not None or self.step is not None
+
+    def __getitem__(self, name: str):
+        value = getattr(self, name) if name in self.__slots__ else None
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.__slots__ and getattr(self, name) is not None
+
+    def get(self, name: str, default=None):
+        return self[name] if name in self else default
+
+    def to_list(self) -> list:
+        return list(self._values())
+
+
+class OnWindow(Frozen):
+    """A period in which the display is on: from the start minute through the end minute, on the given weekdays.
+
+    A window that does not end after it starts runs past midnight: it is on from the start minute of its weekday
+    through the end minute of the next day.
+    """
+
+    __slots__ = ("days", "start", "end")
+
+    def __init__(self, days: Sequence[int], start: int, end: int):
+        """
+        @param days: the weekdays on which the window starts, where Monday is 0
+        @param start: the first minute of the day on which the display is on
+        @param end: the last minute of the day on which the display is on
+        """
+        self._set(days=tuple(sorted(set(days))), start=start, end=end)
+
+    @property
+    def wraps(self) -> bool:
+        return self.end <= self.start
+
+
+class DisplayWindow(Frozen):
+    """When the display is on, when auto-turn-off is enabled, with the times in minutes since midnight.
+
+    Without a schedule, the display is on every day from the start time through the end time. A schedule lists one or
+    more windows instead, each for some or all weekdays, such as 'mon-fri 06:45-08:30 17:00-22:00; sat,sun 08:00-23:00'.
+    """
+
+    __slots__ = ("auto_turn_off", "start", "end", "pin", "schedule", "windows")
+
+    TIME_PATTERN = re.compile(r"^(\d{1,2}):(\d{2})$")
+    WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+    EVERY_DAY = tuple(range(7))
+
+    def __init__(self, auto_turn_off: bool, start: int, end: int, pin: int, schedule: str = ""):
+        """
+        @raise InvalidConfigException: when the schedule is not written correctly
+        """
+        schedule = " ".join(schedule.split())
+        windows = self.parse_schedule(schedule) if schedule else (OnWindow(self.EVERY_DAY, start, end),)
+        self._set(auto_turn_off=auto_turn_off, start=start, end=end, pin=pin, schedule=schedule, windows=windows)
+
+    @classmethod
+    def parse_time(cls, text: str, name: str) -> int:
+        match = cls.TIME_PATTERN.match(text.strip())
+        if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+            raise InvalidConfigException(f"[Display] {name} must be a time from 00:00 to 23:59, not '{text}'")
+        return int(match.group(1)) * 60 + int(match.group(2))
+
+    @classmethod
+    def parse_days(cls, text: str) -> Tuple[int, ...]:
+        """Parse weekdays such as 'daily', 'sat', 'mon-fri' or 'mon,wed,fri-sun'"""
+        if text.lower() == "daily":
+            return cls.EVERY_DAY
+        days = set()
+        for part in text.lower().split(","):
+            first, _, last = part.partition("-")
+            if first not in cls.WEEKDAYS or (last and last not in cls.WEEKDAYS):
+                raise InvalidConfigException(
+                    f"[Display] schedule: '{text}' are not weekdays such as 'daily', 'mon-fri' or 'sat,sun'"
+                )
+            start = cls.WEEKDAYS.index(first)
+            length = (cls.WEEKDAYS.index(last) - start) % 7 if last else 0
+            days.update((start + offset) % 7 for offset in range(length + 1))
+        return tuple(sorted(days))
+
+    @classmethod
+    def parse_schedule(cls, text: str) -> Tuple[OnWindow, ...]:
+        """Parse a schedule: entries separated by semicolons, each with optional weekdays and one or more times
+
+        @raise InvalidConfigException: when the schedule is not written correctly
+        """
+        windows = []
+        for entry in text.split(";"):
+            parts = entry.split()
+            if not parts:
+                continue
+            days = cls.EVERY_DAY if ":" in parts[0] else cls.parse_days(parts.pop(0))
+            if not parts:
+                raise InvalidConfigException(f"[Display] schedule: '{entry.strip()}' has no times")
+            for part in parts:
+                start, separator, end = part.partition("-")
+                if not separator:
+                    raise InvalidConfigException(f"[Display] schedule: '{part}' is not a time such as 06:45-22:00")
+                windows.append(OnWindow(days, cls.parse_time(start, "schedule"), cls.parse_time(end, "schedule")))
+        if not windows:
+            raise InvalidConfigException("[Display] schedule lists no times")
+        return tuple(windows)
+
+    @classmethod
+    def parse(cls, auto_turn_off: bool, start: str, end: str, pin: int, schedule: str = "") -> "DisplayWindow":
+        return cls(auto_turn_off, cls.parse_time(start, "start-time"), cls.parse_time(end, "end-time"), pin, schedule)
+
+    @classmethod
+    def from_dict(cls, display: Mapping[str, Any]) -> "DisplayWindow":
+        """Parse the window from the keyword arguments of the Display, with the defaults of the Display"""
+        return cls.parse(
+            display.get("auto-turn-off", False),
+            display.get("start-time", "06:30"),
+            display.get("end-time", "22:00"),
+            display.get("pin", 4),
+            display.get("schedule", ""),
+        )
+
+    @staticmethod
+    def format_time(minutes: int) -> str:
+        return "%02d:%02d" % divmod(minutes, 60)
+
+    def as_dict(self) -> dict:
+        """Return the window as the keyword arguments of the Display"""
+        return {
+            "auto-turn-off": self.auto_turn_off,
+            "start-time": self.format_time(self.start),
+            "end-time": self.format_time(self.end),
+            "pin": self.pin,
+            "schedule": self.schedule,
+        }
+
+    def to_list(self) -> list:
+        return [self.auto_turn_off, self.start, self.end, self.pin, self.schedule]
+
+
+class VaneConfig(Frozen):
+    """Another vane that the weathervane drives, from a [Vane <name>] section.
+
+    A vane has its own SPI device, stations, bit fields and display interval. The settings that its section leaves out
+    are those of the weathervane itself.
+    """
+
+    __slots__ = ("name", "spi_bus", "channel", "frequency", "keep_alive", "checksum", "data_display_interval",
+                 "stations", "bits")
+
+    def __init__(self, name: str, spi_bus: int, channel: int, frequency: int, keep_alive: float, checksum: str,
+                 data_display_interval: float, stations: Sequence[int], bits: Sequence[BitField]):
+        self._set(name=name, spi_bus=spi_bus, channel=channel, frequency=frequency, keep_alive=keep_alive,
+                  checksum=checksum, data_display_interval=data_display_interval, stations=tuple(stations),
+                  bits=tuple(bits))
+
+    @classmethod
+    def from_dict(cls, vane: Mapping[str, Any]) -> "VaneConfig":
+        return cls(*(vane[name] for name in cls.__slots__))
+
+    def as_dict(self) -> dict:
+        """Return the vane as the keyword arguments that differ from those of the weathervane itself"""
+        vane = {name: getattr(self, name) for name in self.__slots__}
+        vane["stations"] = list(self.stations)
+        vane["bits"] = list(self.bits)
+        return vane
+
+    def to_list(self) -> list:
+        return [getattr(self, name) for name in self.__slots__[:-2]] + [
+            list(self.stations), [bit.to_list() for bit in self.bits]
+        ]
+
+    @classmethod
+    def from_list(cls, values: list) -> "VaneConfig":
+        return cls(*values[:-1], [BitField(*bit) for bit in values[-1]])
+
+
+class Config(Frozen):
+    """The compiled configuration: parsed, validated and typed once, and not changed after that.
+
+    The bit fields, the stations, the display window and the other vanes are typed; the other settings are kept by the
+    names that the parts of the weathervane use as keyword arguments. The digest is the SHA-256 of the configuration
+    file, and identifies the configuration.
+    """
+
+    __slots__ = ("settings", "bits", "stations", "display", "digest", "vanes")
+
+    def __init__(self, settings: Mapping[str, Any], bits: Sequence[BitField], stations: Sequence[int],
+                 display: DisplayWindow, digest: str = "", vanes: Sequence[VaneConfig] = ()):
+        self._set(
+            settings=MappingProxyType(dict(settings)),
+            bits=tuple(bits),
+            stations=tuple(stations),
+            display=display,
+            digest=digest,
+            vanes=tuple(vanes),
+        )
+
+    def __repr__(self):
+        return "Config(bits=%d, stations=%s, digest=%s)" % (len(self.bits), list(self.stations), self.digest[:12])
+
+    def __hash__(self):
+        return hash((self.digest, self.bits, self.stations, self.display, self.vanes))
+
+    def as_dict(self) -> dict:
+        """Return the configuration as the dictionary of keyword arguments that the parts of the weathervane take"""
+        configuration = {
+            name: dict(value) if isinstance(value, dict) else value for name, value in self.settings.items()
+        }
+        configuration["bits"] = list(self.bits)
+        configuration["stations"] = list(self.stations)
+        configuration["display"] = self.display.as_dict()
+        configuration["vanes"] = [vane.as_dict() for vane in self.vanes]
+        return configuration
+
+    def to_json(self) -> dict:
+        return {
+            "settings": dict(self.settings),
+            "bits": [bit.to_list() for bit in self.bits],
+            "stations": list(self.stations),
+            "display": self.display.to_list(),
+            "digest": self.digest,
+            "vanes": [vane.to_list() for vane in self.vanes],
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Config":
+        """Rebuild a configuration that was compiled before, without validating it again"""
+        return cls(
+            data["settings"],
+            [BitField(*bit) for bit in data["bits"]],
+            data["stations"],
+            DisplayWindow(*data["display"]),
+            data["digest"],
+            [VaneConfig.from_list(vane) for vane in data["vanes"]],
+        )
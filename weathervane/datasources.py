@@ -1,12 +1,7 @@
+import importlib
 import multiprocessing
 import time
 
-import requests
-
-from weathervane.parser import BuienradarParser
-
-HTTP_OK = 200
-
 DEFAULT_WEATHER_DATA = {
     "error": True,
     "airpressure": 900,
@@ -23,34 +18,97 @@ DEFAULT_WEATHER_DATA = {
     "windspeedBft": 0,
 }
 
-logger = multiprocessing.get_logger()
+UNCHANGED = "unchanged"
+# the weather data of each of the other vanes, by the name of the vane, see L{BuienradarParser.parse}
+VANES = "vanes"
+
+logger = multiprocessing.get_logger().getChild("collector")
+
+DATA_SOURCES = {
+    "buienradar": "weathervane.buienradar:BuienradarDataSource",
+    "test": "weathervane.testsource:TestDataSource",
+    "replay": "weathervane.replay:ReplayDataSource",
+}
+
+
+class DataCollectionException(ConnectionError):
+    pass
+
+
+class UnknownDataSourceException(Exception):
+    pass
+
+
+class DataSource(object):
+    """The interface of a provider of weather data.
+
+    A data source is created once, from the configuration, and then asked to collect the weather data over and over
+    again. Every data source returns the same normalized weather data: a dictionary with the fields of the primary
+    station (using the names of the Buienradar station measurements, such as 'windspeed', 'winddirection' and
+    'airpressure', and the 'timestamp' of the measurement), enriched with the derived fields 'error',
+    'data_from_fallback' and 'barometric_trend'. When no good data can be collected, it returns
+    L{DEFAULT_WEATHER_DATA}.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def collect(self) -> dict:
+        """Collect the weather data
+
+        @return: the normalized weather data
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def register_data_source(name: str, location: str):
+    """Register a data source under the name that is used for 'source' in the configuration.
+
+    @param name: the name of the data source
+    @param location: where the class of the data source can be found, as 'module:class'. The module is only imported
+    when the data source is used.
+    """
+    DATA_SOURCES[name] = location
+
+
+def get_data_source_class(name: str) -> type:
+    try:
+        location = DATA_SOURCES[name]
+    except KeyError:
+        raise UnknownDataSourceException(
+            f"Unknown data source '{name}'. Available are: {', '.join(sorted(DATA_SOURCES))}"
+        )
+    module_name, class_name = location.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_data_source(*args, **kwargs) -> DataSource:
+    """Create the data source that is configured as 'source', which is 'buienradar' by default.
+
+    When 'source' names several data sources, separated by commas, they are queried at the same time by a
+    L{MultiDataSource}.
+    """
+    names = [name.strip() for name in kwargs.get("source", "buienradar").split(",") if name.strip()]
+    if len(names) > 1:
+        from weathervane.multisource import MultiDataSource
 
-def get_weather_string_with_retries():
-    logger.info("Starting request to buienradar")
-    r = requests.get("https://data.buienradar.nl/2.0/feed/json", timeout=5)
-    logger.info("Request done")
-    if r.status_code == HTTP_OK:
-        logger.info(f"Weather data retrieved in {r.elapsed} ms")
-        return r.text
-    else:
-        logger.warning(f"Got response in {r.elapsed} ms, but unhandled status code {r.status_code}")
-        raise ConnectionError(f"Buienradar: {r.status_code}")
+        return MultiDataSource(*args, sources=names, **kwargs)
+    return get_data_source_class(names[0])(*args, **kwargs)
 
 
-def fetch_weather_data(conn, *args, **kwargs):
+def fetch_weather_data(conn, *args, data_source=None, **kwargs):
     start_collection_time = time.monotonic()
-    data = get_weather_string_with_retries()
-
-    if data:
-        bp = BuienradarParser(*args, **kwargs)
-        try:
-            wd = bp.parse(data)
-        except Exception as e:
-            logger.error("Data parsing failed. Cannot send good data. Setting error.")
-            wd = DEFAULT_WEATHER_DATA
-    else:
-        logger.error("Retrieving data failed several times. Setting error.")
-        wd = DEFAULT_WEATHER_DATA
+    owns_data_source = data_source is None
+    if owns_data_source:
+        data_source = create_data_source(*args, **kwargs)
+    try:
+        wd = data_source.collect()
+    finally:
+        if owns_data_source:
+            data_source.close()
     logger.info(f"Data retrieval including parsing took {time.monotonic() - start_collection_time}")
     conn.send(wd)
     conn.close()
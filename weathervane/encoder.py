@@ -0,0 +1,233 @@
+import multiprocessing
+from random import getrandbits
+from typing import List, Optional, Sequence
+
+from weathervane.config import BitField, InvalidConfigException
+
+logger = multiprocessing.get_logger().getChild("spi")
+
+WIND_DIRECTIONS = {
+    "N": 0x00,
+    "NNO": 0x01,
+    "NO": 0x02,
+    "ONO": 0x03,
+    "O": 0x04,
+    "OZO": 0x05,
+    "ZO": 0x06,
+    "ZZO": 0x07,
+    "Z": 0x08,
+    "ZZW": 0x09,
+    "ZW": 0x0A,
+    "WZW": 0x0B,
+    "W": 0x0C,
+    "WNW": 0x0D,
+    "NW": 0x0E,
+    "NNW": 0x0F,
+}
+
+NUMBERS = (int, float)
+NUMERIC = 0
+WIND_DIRECTION = 1
+PRECIPITATION = 2
+RANDOM = 3
+
+
+class FieldPlan(object):
+    """The precompiled encoding of a single field in the [Bit Packing] section.
+
+    All conversions of the configuration strings happen here, once, so that encoding a frame only does arithmetic. The
+    field occupies the bytes from byte_offset up to and including last_byte of the frame, and ends shift bits before
+    the end of last_byte.
+    """
+
+    __slots__ = ("key", "kind", "length", "mask", "shift", "bit_offset", "byte_offset", "last_byte", "min_value",
+                 "max_value", "step_value")
+
+    def __init__(self, bit_config: BitField, bit_offset: int):
+        self.key = bit_config.key
+        self.length = bit_config.length
+        self.mask = 2 ** self.length - 1
+        self.bit_offset = bit_offset
+        self.byte_offset = bit_offset // 8
+        self.last_byte = (bit_offset + self.length - 1) // 8
+        self.shift = -(bit_offset + self.length) % 8
+        self.min_value = bit_config.get("min", 0.0)
+        self.max_value = bit_config.get("max", float(min(255, self.mask)))
+        self.step_value = bit_config.get("step", 1.0)
+
+        if self.key == "winddirection":
+            self.kind = WIND_DIRECTION
+        elif self.key == "precipitation":
+            self.kind = PRECIPITATION
+        elif self.key == "random":
+            self.kind = RANDOM
+        else:
+            self.kind = NUMERIC
+
+    def __repr__(self):
+        return "FieldPlan(key=%s, length=%d, byte_offset=%d, shift=%d)" % (
+            self.key,
+            self.length,
+            self.byte_offset,
+            self.shift,
+        )
+
+    def convert(self, value, random_value: Optional[int] = None) -> int:
+        """Convert a value of the weather data into the unsigned integer that fits in the field
+
+        @param random_value: the value of a random field. When None, a new random value is drawn.
+        """
+        kind = self.kind
+        if kind == NUMERIC:
+            try:
+                if value < self.min_value:
+                    value = self.min_value
+                elif value > self.max_value:
+                    value = self.max_value
+                return int((value - self.min_value) / self.step_value) & self.mask
+            except TypeError:
+                logger.debug("Value {} for {} is not a number".format(value, self.key))
+                return 0
+        if kind == WIND_DIRECTION:
+            return WIND_DIRECTIONS.get(value, 0)
+        if kind == PRECIPITATION:
+            return 1 if value and value > 0 else 0
+        if random_value is None:
+            return getrandbits(self.length)
+        return random_value & self.mask
+
+    def read(self, buffer) -> int:
+        """Return the converted value of the field in the frame"""
+        value = 0
+        for index in range(self.byte_offset, self.last_byte + 1):
+            value = (value << 8) | buffer[index]
+        return (value >> self.shift) & self.mask
+
+    def validate(self, extended: bool):
+        if self.length <= 0:
+            raise InvalidConfigException(f"Field {self.key} must have a positive bit length, not {self.length}")
+        if self.kind == WIND_DIRECTION and max(WIND_DIRECTIONS.values()) > self.mask:
+            raise InvalidConfigException(f"Field {self.key} needs at least 4 bits, but has {self.length}")
+        if not extended:
+            return
+        if self.step_value <= 0:
+            raise InvalidConfigException(f"Field {self.key} must have a positive step, not {self.step_value}")
+        if self.max_value < self.min_value:
+            raise InvalidConfigException(
+                f"Field {self.key} has a maximum {self.max_value} below its minimum {self.min_value}"
+            )
+        steps = int((self.max_value - self.min_value) / self.step_value)
+        if steps > self.mask:
+            raise InvalidConfigException(
+                f"Field {self.key} needs {steps + 1} steps from {self.min_value} to {self.max_value}, "
+                f"but {self.length} bits only hold {self.mask + 1}"
+            )
+
+
+class EncoderPlan(object):
+    """Compiled form of the [Bit Packing] section that turns weather data into the frame for the display.
+
+    The plan is built and validated once, when the configuration is loaded. Encoding a frame then only looks up the
+    values, scales them with the precomputed minimum, maximum and step of each field and writes each result into its
+    bytes of a preallocated buffer. The packing rules are the same as the ones described in
+    L{WeatherVaneInterface.convert_data}.
+    """
+
+    def __init__(self, bits: Sequence[BitField]):
+        """
+        @param bits: the fields of the [Bit Packing] section. Dictionaries in the old form, with the numbers as
+        strings, are accepted as well.
+        """
+        bits = [BitField.coerce(bit_config) for bit_config in bits]
+        total_length = sum(bit_config.length for bit_config in bits)
+        if total_length % 8:
+            raise InvalidConfigException(
+                f"The fields in [Bit Packing] add up to {total_length} bits, which is not a multiple of 8"
+            )
+
+        self.fields: List[FieldPlan] = []
+        bit_offset = 0
+        for bit_config in bits:
+            field = FieldPlan(bit_config, bit_offset)
+            field.validate(extended=bit_config.extended)
+            self.fields.append(field)
+            bit_offset += field.length
+
+        self.bit_length = total_length
+        self.byte_length = total_length // 8
+        self.buffer = bytearray(self.byte_length)
+        self._empty = bytes(self.byte_length)
+        self._windspeed = self._field("windspeed")
+        self._windgusts = self._field("windgusts") if self._windspeed is not None else None
+        self.has_random = any(field.kind == RANDOM for field in self.fields)
+        self._plan = tuple(
+            (f.key, f.kind, f.length, f.mask, f.min_value, f.max_value, f.step_value) for f in self.fields
+        )
+
+    def __repr__(self):
+        return "EncoderPlan(fields=%d, bytes=%d)" % (len(self.fields), self.byte_length)
+
+    @property
+    def layout(self) -> bytes:
+        """Identifies the layout of the frame: two plans with the same layout encode data in the same way"""
+        return repr(self._plan).encode("utf-8")
+
+    def _field(self, key) -> Optional[FieldPlan]:
+        for field in self.fields:
+            if field.key == key:
+                return field
+        return None
+
+    def values(self, weather_data: dict, random_value: Optional[int] = None) -> List[int]:
+        """Convert the weather data into the unsigned integer for each field, in the order of the plan.
+
+        The values are read back from the frame, so this overwrites the buffer of the plan like L{encode}.
+
+        @param weather_data: a dictionary containing the weatherdata
+        @param random_value: the value of the random fields. When None, a new random value is drawn for every field.
+        @return: a list of integers, each of which fits in the length of its field
+        """
+        buffer = self.encode(weather_data, random_value)
+        return [field.read(buffer) for field in self.fields]
+
+    def encode(self, weather_data: dict, random_value: Optional[int] = None) -> bytearray:
+        """Encode the weather data into the frame for the display.
+
+        Note that the returned buffer is owned by the plan and is overwritten by the next call. Copy it with bytes()
+        if it needs to be kept.
+
+        @param weather_data: a dictionary containing the weatherdata
+        @param random_value: the value of the random fields, see L{values}
+        @return: the preallocated bytearray of the plan, holding the frame
+        """
+        buffer = self.buffer
+        buffer[:] = self._empty
+        get = weather_data.get
+        windspeed, windgusts = self._windspeed, self._windgusts
+        if windgusts is not None:
+            gusts = windgusts.convert(get(windgusts.key, 0), random_value)
+        for field in self.fields:
+            value = get(field.key, 0)
+            if field.kind == NUMERIC and value.__class__ in NUMBERS:
+                # the common case, inlined
+                min_value = field.min_value
+                if value < min_value:
+                    value = min_value
+                elif value > field.max_value:
+                    value = field.max_value
+                value = int((value - min_value) / field.step_value) & field.mask
+            else:
+                value = field.convert(value, random_value)
+            if field is windspeed and windgusts is not None and value > gusts:
+                logger.debug("Wind speed should not exceed maximum wind speed")
+                value = gusts
+            value <<= field.shift
+            index = field.last_byte
+            if index == field.byte_offset:
+                buffer[index] |= value
+                continue
+            while index >= field.byte_offset:
+                buffer[index] |= value & 0xFF
+                value >>= 8
+                index -= 1
+        return buffer
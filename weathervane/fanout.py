@@ -0,0 +1,73 @@
+import math
+from typing import Optional, Sequence
+
+from weathervane.config import InvalidConfigException
+from weathervane.interpolation import Interpolator
+from weathervane.weathervaneinterface import WeatherVaneInterface
+
+# the shortest tick; intervals such as 2 and 0.999 would otherwise wake up the event loop every millisecond
+MIN_TICK = 0.1
+
+
+def display_tick(intervals: Sequence[float]) -> float:
+    """Return the longest interval of which all display intervals are a whole multiple, to the millisecond
+
+    All displays are sent to from the same tick, so that one wake-up of the event loop encodes and sends the frames of
+    every display that is due.
+
+    @raise InvalidConfigException: when that interval is shorter than L{MIN_TICK}
+    """
+    tick = math.gcd(*(max(1, round(interval * 1000)) for interval in intervals)) / 1000
+    if tick < MIN_TICK:
+        raise InvalidConfigException(
+            f"The display intervals {', '.join(f'{interval:g}' for interval in intervals)} s are only all whole "
+            f"multiples of {tick:g} s; make them multiples of at least {MIN_TICK:g} s"
+        )
+    return tick
+
+
+class Vane(object):
+    """Another vane that the weathervane drives, from a [Vane <name>] section in the configuration.
+
+    A vane has its own SPI device, stations, bit fields and display interval, but no collection of its own: its weather
+    data comes with that of the weathervane, from the same feed, parsed once, see L{BuienradarParser.parse}. The vane
+    keeps its own previous and latest weather data, and interpolates between them like the weathervane does.
+    """
+
+    def __init__(self, name: str, tick: float, **configuration):
+        """
+        @param name: the name of the vane, from its section
+        @param tick: the seconds between the ticks in which the frames are sent, see L{display_tick}
+        @param configuration: the configuration of the weathervane, with the settings of the vane
+        """
+        self.name = name
+        self.interface = WeatherVaneInterface(**configuration)
+        self.data_display_interval = configuration["data_display_interval"]
+        self.every = max(1, round(self.data_display_interval / tick))
+        self.easing = configuration.get("interpolation", "linear")
+        self.old_weatherdata: Optional[dict] = None
+        self.wd: Optional[dict] = None
+        self.interpolator: Optional[Interpolator] = None
+
+    def __repr__(self):
+        return "Vane(name=%s, interface=%r, every=%d)" % (self.name, self.interface, self.every)
+
+    def receive(self, wd: dict, unchanged: bool = False):
+        """Take the weather data of the latest collection
+
+        @param unchanged: whether the feed was the same as the previous time, in which case the vane keeps moving from
+        the same previous data
+        """
+        if not (unchanged and self.wd):
+            self.old_weatherdata = self.wd
+        self.wd = wd
+        self.interpolator = Interpolator(self.old_weatherdata, wd, self.easing)
+
+    def close(self):
+        self.interface.close()
+
+    def send(self, percentage: float):
+        """Send the weather data to the vane, at a percentage of the way from the previous to the latest data"""
+        if not self.wd:
+            return
+        self.interface.send(self.interpolator.frame(percentage))
@@ -1,9 +1,10 @@
 import multiprocessing
-from unittest.mock import Mock
+import time
+from typing import Callable, List, NamedTuple, Optional
 
-import spidev
+from weathervane.link import CHECKSUMS
 
-logger = multiprocessing.get_logger()
+logger = multiprocessing.get_logger().getChild("spi")
 
 
 class SPISetupException(Exception):
@@ -14,39 +15,177 @@ class SPIDataTransmissionError(Exception):
     pass
 
 
+class Transfer(NamedTuple):
+    payload: bytes
+    max_speed_hz: int
+    mode: int
+    time: float
+
+
+class FakeSpiDev(object):
+    """Stands in for spidev.SpiDev where there is no SPI device, in test mode and in the tests.
+
+    Every transfer is recorded with its payload, the speed and mode of the device at that moment, and the time at which
+    it was made. A transfer is answered with the bytes that were sent, like a device that echoes its input. With a
+    checksum, the device answers like the display instead: with the checksum of the frame it received before.
+    """
+
+    def __init__(self, respond: Optional[Callable[[bytes], bytes]] = None, failures: int = 0,
+                 checksum: Optional[Callable[[bytes], bytes]] = None):
+        """
+        @param respond: returns the answer of the device to a payload. By default the device echoes the payload.
+        @param failures: the amount of transfers that raise an OSError, before the transfers succeed
+        @param checksum: the checksum with which the frames are verified, see L{Link}
+        """
+        self.checksum = checksum
+        self.respond = respond or (self.respond_checksum if checksum else bytes)
+        self.failures = failures
+        self.bus = None
+        self.device = None
+        self.max_speed_hz = 0
+        self.mode = 0
+        self.transfers: List[Transfer] = []
+
+    def __repr__(self):
+        return "FakeSpiDev(bus=%s, device=%s, transfers=%d)" % (self.bus, self.device, len(self.transfers))
+
+    def open(self, bus: int, device: int):
+        self.bus = bus
+        self.device = device
+
+    def close(self):
+        self.bus = self.device = None
+
+    def respond_checksum(self, _) -> bytes:
+        """Answer the read-back of the checksum with the checksum of the frame of the previous transfer"""
+        length = len(self.checksum(b""))
+        frame = self.transfers[-2].payload[:-length] if len(self.transfers) > 1 else b""
+        return self.checksum(frame)
+
+    def _record(self, data) -> bytes:
+        if self.device is None:
+            raise OSError(9, "Bad file descriptor")
+        if self.failures:
+            self.failures -= 1
+            raise OSError(121, "Remote I/O error")
+        payload = bytes(data)
+        self.transfers.append(Transfer(payload, self.max_speed_hz, self.mode, time.monotonic()))
+        return payload
+
+    def writebytes2(self, data):
+        self._record(data)
+
+    def xfer3(self, data, *args) -> List[int]:
+        return list(self.respond(self._record(data)))
+
+
 class GPIO(object):
     ERROR_CODE = -1
+    BUS = 0
+    AVAILABLE_BUSES = (0, 1, 2, 3, 4, 5, 6)
     AVAILABLE_CHANNELS = (0, 1)
+    AVAILABLE_MODES = (0, 1, 2, 3)
 
     def __init__(self, *args, **kwargs):
         """
         The constructor makes the protocol ready to send data via the SPI protocol on the pins on the Raspberry Pi.
 
+        @param spi_bus: the SPI bus, 0 by default. Later models of the Pi have more buses, which are enabled with
+        overlays.
         @param channel: the Pi can only drive 2 SPI channels, either 0 or 1
         @param frequency: the amount of bits per second that are sent over the channel. See also:
         http://raspberrypi.stackexchange.com/questions/699/what-spi-frequencies-does-raspberry-pi-support
+        @param spi_mode: the clock polarity and phase, from 0 to 3
+        @param spi_retries: the amount of times a transfer is retried after an OSError
+        @param spi: the device to use instead of the SPI device of the Pi, such as a L{FakeSpiDev}
         @raise SPISetupException: when setup cannot proceed, it will raise a setup exception
         """
+        self.bus = kwargs.get("spi_bus", self.BUS)
+        self.channel = kwargs.get("channel", 0)
         self.frequency = kwargs["frequency"]
-
-        if not kwargs.get("test", False):
-            spi = spidev.SpiDev()
-            spi.open(0, 0)
-            self.spi = spi
+        self.mode = kwargs.get("spi_mode", 0)
+        self.retries = kwargs.get("spi_retries", 2)
+        if self.bus not in self.AVAILABLE_BUSES:
+            raise SPISetupException(f"SPI bus {self.bus} is not one of {self.AVAILABLE_BUSES}")
+        if self.channel not in self.AVAILABLE_CHANNELS:
+            raise SPISetupException(f"SPI channel {self.channel} is not one of {self.AVAILABLE_CHANNELS}")
+        if self.mode not in self.AVAILABLE_MODES:
+            raise SPISetupException(f"SPI mode {self.mode} is not one of {self.AVAILABLE_MODES}")
+
+        self.transfers = 0
+        self.failures = 0
+        self.transfer_seconds = 0.0
+        self.last_transfer_seconds = 0.0
+
+        if "spi" in kwargs:
+            self.spi = kwargs["spi"]
+        elif not kwargs.get("test", False):
+            import spidev
+
+            self.spi = spidev.SpiDev()
         else:
-            self.spi = Mock()
-            self.read_pin = Mock(return_value=[1, 1])
+            self.spi = FakeSpiDev(checksum=CHECKSUMS.get(kwargs.get("checksum")))
+        self.open()
+
+    def __repr__(self):
+        return "GPIO(channel=%d, frequency=%d, mode=%d)" % (self.channel, self.frequency, self.mode)
+
+    def open(self):
+        try:
+            self.spi.open(self.bus, self.channel)
+        except OSError as e:
+            raise SPISetupException(f"Cannot open SPI device {self.bus}.{self.channel}: {e}") from e
+        self.spi.max_speed_hz = self.frequency
+        self.spi.mode = self.mode
+
+    def close(self):
+        self.spi.close()
+
+    def set_frequency(self, frequency: int):
+        """Change the amount of bits per second for the next transfers"""
+        self.frequency = frequency
+        self.spi.max_speed_hz = frequency
+
+    @property
+    def mean_transfer_seconds(self) -> float:
+        return self.transfer_seconds / self.transfers if self.transfers else 0.0
+
+    def _transfer(self, method: Callable, data):
+        for attempt in range(1, self.retries + 2):
+            start = time.perf_counter()
+            try:
+                result = method(data)
+            except OSError as e:
+                self.failures += 1
+                logger.warning(f"SPI transfer failed at attempt {attempt} of {self.retries + 1}: {e}")
+                continue
+            self.last_transfer_seconds = time.perf_counter() - start
+            self.transfer_seconds += self.last_transfer_seconds
+            self.transfers += 1
+            return result
+        raise SPIDataTransmissionError(f"SPI transfer of {len(data)} bytes failed {self.retries + 1} times")
 
     def send_data(self, data):
         """Send data over the 'wire'
 
-        @param data: an iterable that returns only bytes (0 - 255). If the value is outside this range, then
-        value = value mod 256. So -10 will be 246, 257 will be 1 and so on.
-        @raise SPIDataTransmissionError:
+        The data is written in a single transfer, during which chip select stays active, straight from the buffer.
+
+        @param data: bytes, a bytearray or any other object that supports the buffer protocol
+        @raise SPIDataTransmissionError: when the transfer keeps failing
         """
+        self._transfer(self.spi.writebytes2, data)
+        logger.debug(f"Sent {len(data)} bytes via SPI in {self.last_transfer_seconds * 1000:.3f} ms")
+
+    def exchange(self, data) -> bytes:
+        """Send data over the 'wire' and return the bytes that the device sent back at the same time
 
-        self.spi.xfer(data)
-        logger.debug("Sent data via SPI")
+        @param data: bytes, a bytearray or any other object that supports the buffer protocol
+        @return: as many bytes as were sent
+        @raise SPIDataTransmissionError: when the transfer keeps failing
+        """
+        response = bytes(self._transfer(self.spi.xfer3, data))
+        logger.debug(f"Exchanged {len(data)} bytes via SPI in {self.last_transfer_seconds * 1000:.3f} ms")
+        return response
 
 
 class TestInterface(object):
@@ -67,5 +206,4 @@ class TestInterface(object):
         Keyword arguments:
         data -- an enumerable
         """
-        data = list(data)
-        self.gpio.send_data(data)
+        self.gpio.send_data(bytes(data))
@@ -0,0 +1,251 @@
+import math
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from weathervane.interpolation import is_number
+
+logger = multiprocessing.get_logger().getChild("collector")
+
+NAN = float("nan")
+
+
+class StationHistory(object):
+    """A ring buffer with the observations of one station.
+
+    The times and the value of each field are kept in packed arrays of a fixed size, so the memory use does not grow
+    with time. A field that was missing in an observation is stored as NaN. Once the buffer is full, each observation
+    overwrites the oldest one.
+    """
+
+    __slots__ = ("capacity", "fields", "times", "values", "head", "count")
+
+    def __init__(self, capacity: int, fields: Tuple[str, ...]):
+        self.capacity = capacity
+        self.fields = fields
+        self.times = array("d", [0.0]) * capacity
+        self.values = tuple(array("d", [NAN]) * capacity for _ in fields)
+        self.head = 0
+        self.count = 0
+
+    def __repr__(self):
+        return "StationHistory(capacity=%d, count=%d)" % (self.capacity, self.count)
+
+    @property
+    def latest_time(self) -> Optional[float]:
+        return self.times[(self.head - 1) % self.capacity] if self.count else None
+
+    def add(self, timestamp: float, observation: dict):
+        index = self.head
+        self.times[index] = timestamp
+        for field, values in zip(self.fields, self.values):
+            value = observation.get(field)
+            values[index] = value if is_number(value) else NAN
+        self.head = (index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def newest_first(self) -> Iterator[int]:
+        """Iterate over the indices of the observations, from the newest to the oldest"""
+        for age in range(1, self.count + 1):
+            yield (self.head - age) % self.capacity
+
+    def window(self, field: str, hours: float) -> List[float]:
+        """Return the values of a field in the last hours before the latest observation, newest first"""
+        if not self.count:
+            return []
+        values = self.values[self.fields.index(field)]
+        start = self.latest_time - hours * 3600
+        result = []
+        for index in self.newest_first():
+            if self.times[index] < start:
+                break
+            if not math.isnan(values[index]):
+                result.append(values[index])
+        return result
+
+    def delta(self, field: str, hours: float, tolerance: float = 1800.0) -> Optional[float]:
+        """Return how much a field changed over the last hours.
+
+        @param tolerance: the amount of seconds that the earlier observation may be older than the hours asked for
+        @return: the difference between the latest value and the value the given hours before it, or None when there
+        is no value that far back
+        """
+        values = self.values[self.fields.index(field)]
+        latest = None
+        target = None
+        for index in self.newest_first():
+            if math.isnan(values[index]):
+                continue
+            if latest is None:
+                latest = values[index]
+                target = self.times[index] - hours * 3600
+            elif self.times[index] <= target:
+                if target - self.times[index] > tolerance:
+                    return None
+                return latest - values[index]
+        return None
+
+
+class ObservationHistory(object):
+    """Keeps about a day of observations of each station, to answer questions about the recent past.
+
+    Such as how much the air pressure changed over the last hours, which gives the barometric trend, and the minimum,
+    maximum, mean or peak of a field. The capacity of each station follows from the collection interval, so that the
+    history covers at least the given hours.
+
+    The history can be saved to a file and loaded again, so that the trend is available right after a restart. The file
+    is replaced atomically, and at most once every min_interval seconds, to spare the SD card.
+    """
+
+    FIELDS = ("airpressure", "temperature", "humidity", "windspeed", "windgusts")
+    MAGIC = b"WVHS"
+    VERSION = 1
+    HEADER = struct.Struct("<4sBBHI")
+    STATION_HEADER = struct.Struct("<iII")
+    TREND_HOURS = 4
+    TREND_THRESHOLD = 1.0
+
+    def __init__(self, collection_interval: float, hours: float = 24, path: str = "", min_interval: float = 900.0,
+                 max_stations: int = 8):
+        """
+        @param collection_interval: the amount of seconds between two collections
+        @param hours: the amount of hours that is kept at least
+        @param path: the location of the file in which the history is saved, or an empty string to keep it in memory
+        @param min_interval: the minimum amount of seconds between two writes
+        @param max_stations: the highest amount of stations that is kept
+        """
+        self.capacity = math.ceil(hours * 3600 / collection_interval) + 1
+        self.path = path
+        self.min_interval = min_interval
+        self.max_stations = max_stations
+        self.stations: Dict[int, StationHistory] = {}
+        self.lock = threading.Lock()
+        self.last_write = None
+        self.dirty = False
+
+    def __repr__(self):
+        return "ObservationHistory(capacity=%d, stations=%s)" % (self.capacity, list(self.stations))
+
+    def station(self, station_id: int) -> Optional[StationHistory]:
+        return self.stations.get(station_id)
+
+    def add(self, weather_data: dict) -> bool:
+        """Add an observation, unless it is not newer than the latest observation of its station
+
+        @param weather_data: the weather data, with at least a 'stationid' and a 'timestamp'
+        @return: whether the observation was added
+        """
+        try:
+            station_id = int(weather_data["stationid"])
+            timestamp = datetime.fromisoformat(weather_data["timestamp"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return False
+        with self.lock:
+            history = self.stations.get(station_id)
+            if history is None:
+                if len(self.stations) >= self.max_stations:
+                    logger.warning(f"Not keeping the history of station {station_id}: already {self.max_stations}")
+                    return False
+                history = self.stations[station_id] = StationHistory(self.capacity, self.FIELDS)
+            if history.count and timestamp <= history.latest_time:
+                return False
+            history.add(timestamp, weather_data)
+            self.dirty = True
+            return True
+
+    def delta(self, station_id: int, field: str, hours: float) -> Optional[float]:
+        history = self.stations.get(station_id)
+        return history.delta(field, hours) if history else None
+
+    def summary(self, station_id: int, field: str, hours: float) -> Optional[Tuple[float, float, float]]:
+        """Return the minimum, maximum and mean of a field over the last hours, or None when there are no values"""
+        history = self.stations.get(station_id)
+        values = history.window(field, hours) if history else []
+        if not values:
+            return None
+        return min(values), max(values), sum(values) / len(values)
+
+    def peak(self, station_id: int, field: str = "windgusts", hours: float = 1) -> Optional[float]:
+        summary = self.summary(station_id, field, hours)
+        return summary[1] if summary else None
+
+    def barometric_trend(self, station_id: int) -> str:
+        """Return whether the air pressure is 'rising', 'dropping' or 'stable' compared to four hours ago.
+
+        The trend is 'stable' as long as there is not enough history.
+        """
+        delta = self.delta(station_id, "airpressure", self.TREND_HOURS)
+        if delta is None or abs(delta) < self.TREND_THRESHOLD:
+            return "stable"
+        return "rising" if delta > 0 else "dropping"
+
+    def load(self):
+        """Load the history from its file. A missing file, or one with another layout, leaves the history empty."""
+        if not self.path:
+            return
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        try:
+            self._unpack(data)
+        except (struct.error, ValueError) as e:
+            logger.warning(f"Cannot read the history in {self.path}: {e}")
+            self.stations = {}
+
+    def _unpack(self, data: bytes):
+        magic, version, field_count, station_count, capacity = self.HEADER.unpack_from(data)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("not a history file")
+        if field_count != len(self.FIELDS) or capacity != self.capacity:
+            raise ValueError("the history was kept with another capacity")
+        offset = self.HEADER.size
+        size = 8 * capacity
+        stations = {}
+        for _ in range(station_count):
+            station_id, head, count = self.STATION_HEADER.unpack_from(data, offset)
+            offset += self.STATION_HEADER.size
+            history = StationHistory(capacity, self.FIELDS)
+            history.head, history.count = head % capacity, min(count, capacity)
+            for values in (history.times,) + history.values:
+                chunk = data[offset:offset + size]
+                if len(chunk) != size:
+                    raise ValueError("the history is cut short")
+                values[:] = array("d", chunk)
+                offset += size
+            stations[station_id] = history
+        self.stations = stations
+        logger.info(f"Loaded the history of stations {list(stations)} from {self.path}")
+
+    def save(self, force: bool = False) -> bool:
+        """Save the history to its file, unless it has not changed or the last write was too recent
+
+        @param force: write even when the last write was too recent
+        @return: whether the file was written
+        """
+        if not self.path or not self.dirty:
+            return False
+        now = time.monotonic()
+        if not force and self.last_write is not None and now - self.last_write < self.min_interval:
+            return False
+        with self.lock:
+            parts = [self.HEADER.pack(self.MAGIC, self.VERSION, len(self.FIELDS), len(self.stations), self.capacity)]
+            for station_id, history in self.stations.items():
+                parts.append(self.STATION_HEADER.pack(station_id, history.head, history.count))
+                parts.append(history.times.tobytes())
+                parts.extend(values.tobytes() for values in history.values)
+            self.dirty = False
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(b"".join(parts))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        self.last_write = now
+        return True
@@ -0,0 +1,77 @@
+import math
+from array import array
+from typing import Callable, Dict, Optional
+
+NON_INTERPOLATABLE_VARIABLES = ["error", "winddirection", "rain", "barometric_trend", "stationid"]
+
+EASINGS: Dict[str, Callable[[float], float]] = {
+    "linear": lambda p: p,
+    "ease-in": lambda p: p * p,
+    "ease-out": lambda p: p * (2 - p),
+    "ease-in-out": lambda p: p * p * (3 - 2 * p),
+    "cosine": lambda p: (1 - math.cos(math.pi * p)) / 2,
+}
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class Interpolator(object):
+    """Produces the frames of weather data between the previous and the latest collection.
+
+    The interpolator is built once, when new data arrives. It sorts the fields into numeric fields, which are
+    interpolated, and all other fields, which take the latest value straight away. The start values and the
+    differences of the numeric fields are kept in packed arrays, so that each frame is computed in a single pass over
+    the arrays.
+
+    A field that is missing in the latest data keeps its previous value. Note that zero is a value like any other.
+    """
+
+    def __init__(self, old_weatherdata: Optional[dict], new_weatherdata: dict, easing: str = "linear"):
+        """
+        @param old_weatherdata: the weather data of the previous collection, if any
+        @param new_weatherdata: the weather data of the latest collection
+        @param easing: the name of the curve from the previous to the latest value, one of L{EASINGS}
+        """
+        self.easing = EASINGS[easing]
+        self.new_weatherdata = new_weatherdata
+        self.static = {}
+        keys = []
+        self.start = array("d")
+        self.delta = array("d")
+
+        self.passthrough = not old_weatherdata or bool(new_weatherdata.get("error"))
+        if self.passthrough:
+            return
+
+        for key, old_value in old_weatherdata.items():
+            new_value = new_weatherdata.get(key, None)
+            if new_value is None:
+                self.static[key] = old_value
+            elif key not in NON_INTERPOLATABLE_VARIABLES and is_number(old_value) and is_number(new_value):
+                keys.append(key)
+                self.start.append(old_value)
+                self.delta.append(new_value - old_value)
+            else:
+                self.static[key] = new_value
+        for key, new_value in new_weatherdata.items():
+            if key not in old_weatherdata:
+                self.static[key] = new_value
+        self.keys = tuple(keys)
+
+    def __repr__(self):
+        return "Interpolator(numeric=%d, static=%d)" % (len(self.start), len(self.static))
+
+    def frame(self, percentage: float) -> dict:
+        """Return the weather data at the given point between the previous and the latest collection
+
+        @param percentage: the fraction of the way from the previous to the latest data, from 0 to 1
+        @return: the interpolated weather data
+        """
+        if self.passthrough:
+            return self.new_weatherdata
+        p = self.easing(min(max(percentage, 0.0), 1.0))
+        wd = dict(self.static)
+        wd.update(zip(self.keys, [start + p * delta for start, delta in zip(self.start, self.delta)]))
+        return wd
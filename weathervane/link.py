@@ -0,0 +1,213 @@
+import binascii
+import math
+import multiprocessing
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List
+
+from weathervane.config import InvalidConfigException
+from weathervane.metrics import REGISTRY
+
+logger = multiprocessing.get_logger().getChild("spi")
+
+TRANSFERS = REGISTRY.counter("weathervane_verified_transfers_total", "Verified transfers to the display", ["result"])
+
+NO_CHECKSUM = "none"
+
+
+def _crc8_table(polynomial: int = 0x07) -> bytes:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ polynomial) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+CRC8_TABLE = _crc8_table()
+
+
+def crc8(data) -> bytes:
+    """Return the CRC-8 of the data, with polynomial 0x07 and no reflection (CRC-8/SMBUS)"""
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return bytes((crc,))
+
+
+def crc16(data) -> bytes:
+    """Return the CRC-16 of the data, with polynomial 0x1021 and initial value 0xFFFF (CRC-16/CCITT-FALSE), big
+    endian"""
+    return binascii.crc_hqx(data, 0xFFFF).to_bytes(2, byteorder="big")
+
+
+CHECKSUMS: Dict[str, Callable[[bytes], bytes]] = {"crc8": crc8, "crc16": crc16}
+
+
+class LinkStats(object):
+    """Counts the frames, transfer attempts, corrupted transfers and lost frames on the SPI channel, per hour.
+
+    The counts of the last complete hour are logged as soon as a new hour starts.
+    """
+
+    FRAMES = 0
+    ATTEMPTS = 1
+    ERRORS = 2
+    LOST = 3
+
+    def __init__(self, keep: int = 24, clock: Callable[[], float] = time.time):
+        """
+        @param keep: the amount of hours for which the counts are kept
+        @param clock: returns the current time in seconds since the epoch
+        """
+        self.keep = keep
+        self.clock = clock
+        self.hours: "OrderedDict[int, List[int]]" = OrderedDict()
+
+    def __repr__(self):
+        return "LinkStats(hours=%d)" % len(self.hours)
+
+    def current(self) -> List[int]:
+        hour = int(self.clock() // 3600)
+        counts = self.hours.get(hour)
+        if counts is None:
+            if self.hours:
+                self.report(*next(reversed(self.hours.items())))
+            counts = self.hours[hour] = [0, 0, 0, 0]
+            while len(self.hours) > self.keep:
+                self.hours.popitem(last=False)
+        return counts
+
+    @staticmethod
+    def report(hour: int, counts: List[int]):
+        frames, attempts, errors, lost = counts
+        logger.info(
+            f"SPI link in hour {time.strftime('%Y-%m-%d %H:00', time.localtime(hour * 3600))}: {frames} frames, "
+            f"{attempts - frames} retransmissions, {errors} corrupted and {lost} lost"
+        )
+
+    def record(self, attempts: int, errors: int):
+        counts = self.current()
+        counts[self.FRAMES] += 1
+        counts[self.ATTEMPTS] += attempts
+        counts[self.ERRORS] += errors
+        if errors == attempts:
+            counts[self.LOST] += 1
+
+    def error_rate(self, hour: int) -> float:
+        """Return the fraction of corrupted transfers in the given hour"""
+        counts = self.hours.get(hour)
+        return counts[self.ERRORS] / counts[self.ATTEMPTS] if counts and counts[self.ATTEMPTS] else 0.0
+
+    def retransmissions(self, hour: int) -> int:
+        counts = self.hours.get(hour)
+        return counts[self.ATTEMPTS] - counts[self.FRAMES] if counts else 0
+
+
+class Link(object):
+    """Sends frames to the display and, optionally, verifies that they arrived intact.
+
+    Without a checksum the frame is just written to the SPI device. With a checksum, the CRC of the frame is appended
+    to it. The display computes the CRC over the bytes it received, and clocks it out in a second transfer of as many
+    bytes as the CRC. When that differs from the CRC that was sent, the frame is sent again.
+
+    The amount of retransmissions adapts to the link: a clean link gets one, and as the error rate over the last
+    frames approaches the error threshold more are allowed, up to max_retransmits. When the error rate exceeds the
+    threshold the frequency of the SPI bus is halved, down to min_frequency, because long cables corrupt fast
+    signals. After a run of frames without errors the frequency is doubled again, up to the configured frequency.
+    """
+
+    def __init__(self, gpio, frequency: int, checksum: str = NO_CHECKSUM, max_retransmits: int = 3,
+                 min_frequency: int = 0, error_threshold: float = 0.1, window: int = 20,
+                 clock: Callable[[], float] = time.time):
+        """
+        @param gpio: the L{GPIO} through which the frames are sent
+        @param frequency: the configured frequency of the SPI bus, which is also the highest frequency
+        @param checksum: 'none', 'crc8' or 'crc16'
+        @param max_retransmits: the highest amount of times a frame is sent again
+        @param min_frequency: the lowest frequency to back off to. Use 0 to keep the configured frequency.
+        @param error_threshold: the fraction of corrupted transfers above which the frequency is lowered
+        @param window: the amount of transfers over which the error rate is computed
+        @param clock: returns the current time in seconds since the epoch, used for the hourly statistics
+        """
+        if checksum != NO_CHECKSUM and checksum not in CHECKSUMS:
+            raise InvalidConfigException(f"Checksum {checksum} is not one of {NO_CHECKSUM}, {', '.join(CHECKSUMS)}")
+        self.gpio = gpio
+        self.checksum = CHECKSUMS.get(checksum)
+        self.checksum_length = len(self.checksum(b"")) if self.checksum else 0
+        self.max_retransmits = max_retransmits
+        self.max_frequency = self.frequency = frequency
+        self.min_frequency = min(min_frequency, frequency) if min_frequency else frequency
+        self.error_threshold = error_threshold
+        self.recent = deque(maxlen=window)
+        self.stats = LinkStats(clock=clock)
+
+    def __repr__(self):
+        return "Link(checksum=%d bytes, frequency=%d, error_rate=%.2f)" % (
+            self.checksum_length,
+            self.frequency,
+            self.error_rate,
+        )
+
+    @property
+    def error_rate(self) -> float:
+        """The fraction of corrupted transfers among the last ones"""
+        return sum(self.recent) / len(self.recent) if self.recent else 0.0
+
+    @property
+    def retransmits(self) -> int:
+        """The amount of times the next frame may be sent again"""
+        if not self.max_retransmits:
+            return 0
+        if self.error_threshold <= 0:
+            return self.max_retransmits
+        retransmits = math.ceil(self.max_retransmits * self.error_rate / self.error_threshold)
+        return max(1, min(self.max_retransmits, retransmits))
+
+    def verify(self, payload: bytes) -> bool:
+        """Send the payload and check the CRC that the display computed over the bytes it received"""
+        self.gpio.send_data(payload)
+        return self.gpio.exchange(bytes(self.checksum_length)) == payload[-self.checksum_length:]
+
+    def send(self, frame) -> bool:
+        """Send a frame to the display
+
+        @param frame: the encoded frame, without checksum
+        @return: whether the frame arrived intact, which is always assumed when there is no checksum
+        """
+        if self.checksum is None:
+            self.gpio.send_data(frame)
+            return True
+
+        payload = bytes(frame) + self.checksum(frame)
+        attempts = errors = 0
+        for _ in range(self.retransmits + 1):
+            attempts += 1
+            intact = self.verify(payload)
+            self.recent.append(not intact)
+            TRANSFERS.inc(labels=("intact" if intact else "corrupted",))
+            if intact:
+                break
+            errors += 1
+            logger.warning(f"Frame was corrupted at attempt {attempts}")
+        self.stats.record(attempts, errors)
+        self.adapt_frequency()
+        return errors < attempts
+
+    def adapt_frequency(self):
+        if len(self.recent) < self.recent.maxlen:
+            return
+        error_rate = self.error_rate
+        if error_rate > self.error_threshold and self.frequency > self.min_frequency:
+            frequency = max(self.min_frequency, self.frequency // 2)
+        elif error_rate == 0 and self.frequency < self.max_frequency:
+            frequency = min(self.max_frequency, self.frequency * 2)
+        else:
+            return
+        logger.warning(
+            f"Error rate is {error_rate:.0%}; changing the SPI frequency from {self.frequency} to {frequency}"
+        )
+        self.frequency = frequency
+        self.gpio.set_frequency(frequency)
+        self.recent.clear()
@@ -0,0 +1,156 @@
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+SUBSYSTEMS = ("collector", "parser", "spi", "display")
+TEXT_FORMAT = "%(asctime)s:%(levelname)s:%(module)s:%(message)s"
+
+# the attributes that every log record has; all other attributes were passed with 'extra'
+STANDARD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", logging.INFO, "", 0, "", None, None))) | {
+    "message",
+    "asctime",
+    "sampled",
+    "distinct",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a log record as a single line of json, including the fields that were passed with 'extra'"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets a repeated message through at most once every interval seconds.
+
+    Messages below WARNING count as repeated when they come from the same line of code, whatever their text, so that a
+    message that is logged on every tick is reduced to one per interval. Warnings and errors, and messages that are
+    marked with extra={"distinct": True}, only count as repeated when their message and arguments are the same as well,
+    so that different problems, or different fields from one line, are never merged. The first message after a quiet
+    period tells how many were left out. Messages that were last let through more than an interval ago are forgotten,
+    or after two intervals when some of them were left out, so that a message that returns can still tell.
+    """
+
+    def __init__(self, interval: float = 60.0, clock=time.monotonic):
+        super(RateLimitFilter, self).__init__()
+        self.interval = interval
+        self.clock = clock
+        self.seen: Dict[Tuple, Tuple[float, int]] = {}
+        self.pruned = clock()
+
+    @staticmethod
+    def key(record: logging.LogRecord) -> Tuple:
+        if record.levelno < logging.WARNING and not getattr(record, "distinct", False):
+            return record.name, record.levelno, record.lineno
+        key = (record.name, record.levelno, record.lineno, record.msg, record.args)
+        try:
+            hash(key)
+        except TypeError:
+            # arguments in a dictionary
+            return key[:3] + (record.getMessage(),)
+        return key
+
+    def prune(self, now: float):
+        self.pruned = now
+        self.seen = {
+            key: (last, suppressed)
+            for key, (last, suppressed) in self.seen.items()
+            if now - last < (2 * self.interval if suppressed else self.interval)
+        }
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = self.clock()
+        if now - self.pruned >= self.interval:
+            self.prune(now)
+        key = self.key(record)
+        last, suppressed = self.seen.get(key, (None, 0))
+        if last is not None and now - last < self.interval:
+            self.seen[key] = (last, suppressed + 1)
+            return False
+        self.seen[key] = (now, 0)
+        if suppressed:
+            record.msg = f"{record.getMessage()} (and {suppressed} similar messages)"
+            record.args = None
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Lets through one of every few records that are marked with extra={"sampled": True}, per line of code. Other
+    records are not affected."""
+
+    def __init__(self, every: int = 100):
+        super(SampleFilter, self).__init__()
+        self.every = max(1, every)
+        self.counts: Dict[Tuple, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False):
+            return True
+        key = (record.pathname, record.lineno)
+        count = self.counts.get(key, 0)
+        self.counts[key] = count + 1
+        return count % self.every == 0
+
+
+def setup_logging(format: str = "text", file: str = "weathervane.log", level: str = "INFO",
+                  levels: Optional[Dict[str, str]] = None, rate_limit: float = 60.0, frame_sample: int = 100,
+                  stream: bool = True) -> logging.handlers.QueueListener:
+    """Send the log of the weathervane through a queue to the file and the console.
+
+    The main loop only puts the records that pass the filters on a queue. A background thread formats them and writes
+    them, so slow writes to the SD card do not delay the main loop.
+
+    @param format: 'text' or 'json'
+    @param file: the file to write to, which is rotated at midnight. Use an empty string to not write a file.
+    @param level: the level of the weathervane as a whole
+    @param levels: the level of each subsystem in L{SUBSYSTEMS}, where it differs from level
+    @param rate_limit: the seconds between repeated messages, see L{RateLimitFilter}. Use 0 to log all of them.
+    @param frame_sample: log one of every this many frames
+    @param stream: whether to write to the console as well
+    @return: the listener that writes the records. Stop it to write the records that are still on the queue.
+    """
+    formatter = JsonFormatter() if format == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = []
+    if file:
+        handlers.append(logging.handlers.TimedRotatingFileHandler(filename=file, when="midnight", interval=1,
+                                                                  backupCount=1))
+    if stream:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(SampleFilter(frame_sample))
+    if rate_limit:
+        queue_handler.addFilter(RateLimitFilter(rate_limit))
+
+    logger = multiprocessing.get_logger()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(queue_handler)
+    logger.setLevel(level.upper())
+    for subsystem in SUBSYSTEMS:
+        logger.getChild(subsystem).setLevel((levels or {}).get(subsystem, "").upper() or logging.NOTSET)
+
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,245 @@
+import math
+import multiprocessing
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = multiprocessing.get_logger()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric(object):
+    """The base of the metrics in a L{MetricsRegistry}.
+
+    Updating a metric only changes a number in a dictionary, so it can be done in the main loop. The text is only
+    built when the metrics are scraped.
+    """
+
+    TYPE = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """
+        @param name: the name of the metric
+        @param documentation: the help text of the metric
+        @param labelnames: the names of the labels. The values of the labels are passed to each update, in this order.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "%s(name=%s)" % (self.__class__.__name__, self.name)
+
+    def label_pairs(self, labels: Tuple) -> Tuple[Tuple[str, str], ...]:
+        return tuple(zip(self.labelnames, (str(value) for value in labels)))
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        for name, labels, value in self.samples():
+            if labels:
+                label_text = ",".join(f'{key}="{escape(label)}"' for key, label in labels)
+                lines.append(f"{name}{{{label_text}}} {format_value(value)}")
+            else:
+                lines.append(f"{name} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super(Counter, self).__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple, float] = {} if labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, labels: Tuple = ()):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def value(self, labels: Tuple = ()) -> float:
+        return self.values.get(labels, 0.0)
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in sorted(self.values.items()):
+            yield self.name, self.label_pairs(labels), value
+
+
+class Gauge(Metric):
+    """A value that goes up and down. Instead of being set, it can also be computed by a function when it is
+    scraped, which costs nothing in between."""
+
+    TYPE = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], Optional[float]]] = None):
+        super(Gauge, self).__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple, float] = {}
+        self.function = function
+
+    def set(self, value: float, labels: Tuple = ()):
+        self.values[labels] = value
+
+    def value(self, labels: Tuple = ()) -> Optional[float]:
+        if self.function is not None:
+            return self.function()
+        return self.values.get(labels)
+
+    def samples(self) -> Iterable[Sample]:
+        if self.function is not None:
+            value = self.function()
+            if value is not None:
+                yield self.name, (), value
+            return
+        for labels, value in sorted(self.values.items()):
+            yield self.name, self.label_pairs(labels), value
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[Tuple, List[float]] = {} if labelnames else {(): self._empty()}
+
+    def _empty(self) -> List[float]:
+        # the count of each bucket, the count above the last bucket, the sum and the count
+        return [0] * (len(self.buckets) + 1) + [0.0, 0]
+
+    def observe(self, value: float, labels: Tuple = ()):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = self._empty()
+            counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, counts in sorted(self.values.items()):
+            pairs = self.label_pairs(labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield self.name + "_bucket", pairs + (("le", format_value(bound)),), cumulative
+            yield self.name + "_sum", pairs, counts[-2]
+            yield self.name + "_count", pairs, counts[-1]
+
+
+class MetricsRegistry(object):
+    """Holds the metrics of the weathervane and renders them in the text format of Prometheus.
+
+    Asking for a metric that was already registered returns that metric, so modules can declare the metrics they
+    update when they are imported.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "MetricsRegistry(metrics=%d)" % len(self.metrics)
+
+    def _register(self, cls, name: str, *args, **kwargs) -> Metric:
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.TYPE}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              function: Optional[Callable[[], Optional[float]]] = None) -> Gauge:
+        """
+        @param function: computes the value when the metrics are scraped. It replaces the function of a gauge that
+        was already registered.
+        """
+        gauge = self._register(Gauge, name, documentation, labelnames)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class MetricsServer(object):
+    """Serves the metrics of a registry on /metrics, from a thread in the background"""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, port: int = 9101, host: str = "127.0.0.1"):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread: Optional[threading.Thread] = None
+
+    def __repr__(self):
+        return "MetricsServer(host=%s, port=%d)" % (self.host, self.port)
+
+    def start(self) -> "MetricsServer":
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+        self.thread.start()
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
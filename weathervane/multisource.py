@@ -0,0 +1,113 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from weathervane.datasources import DEFAULT_WEATHER_DATA, UNCHANGED, DataSource, get_data_source_class
+from weathervane.parser import BuienradarParser
+
+logger = multiprocessing.get_logger().getChild("collector")
+
+HEDGED = "hedged"
+MERGE = "merge"
+
+
+class MultiDataSource(DataSource):
+    """Queries several data sources at the same time, with a shared deadline.
+
+    In the 'hedged' mode the first good result wins, so the data is as fast as the fastest healthy data source. In the
+    'merge' mode all good results that arrive before the deadline are merged: the freshest result is used as the
+    primary data, and missing fields are taken from the other results, in order of freshness, just like fallback
+    stations in L{BuienradarParser.merge}. In both modes 'field_sources' in the result tells which data source supplied
+    each field.
+
+    A data source that is still busy with the previous collection is left out, so each data source has at most one
+    collection in flight.
+    """
+
+    def __init__(self, *args, sources: List[str], **kwargs):
+        """
+        @param sources: the names of the data sources, as they are registered
+        """
+        super(MultiDataSource, self).__init__(*args, **kwargs)
+        self.mode = kwargs.get("source_mode", HEDGED)
+        self.deadline = kwargs.get("source_deadline", 10.0)
+        self.bits = kwargs.get("bits", [])
+        self.sources: Dict[str, DataSource] = {
+            name: get_data_source_class(name)(*args, **kwargs) for name in sources
+        }
+        self.pending: Dict[str, Future] = {}
+        self.executor = ThreadPoolExecutor(max_workers=len(self.sources), thread_name_prefix="source")
+
+    def __repr__(self):
+        return "MultiDataSource(sources=%s, mode=%s)" % (list(self.sources), self.mode)
+
+    @staticmethod
+    def is_good(wd: Optional[dict]) -> bool:
+        return bool(wd) and wd is not DEFAULT_WEATHER_DATA and not wd.get("error", False)
+
+    @staticmethod
+    def freshness(wd: dict) -> float:
+        try:
+            return datetime.fromisoformat(wd["timestamp"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return float("-inf")
+
+    def submit(self) -> Dict[Future, str]:
+        futures = {}
+        for name, source in self.sources.items():
+            if name in self.pending and not self.pending[name].done():
+                logger.warning(f"Data source {name} is still busy; leaving it out")
+                continue
+            self.pending[name] = future = self.executor.submit(source.collect)
+            futures[future] = name
+        return futures
+
+    def result(self, future: Future, name: str) -> Optional[dict]:
+        try:
+            wd = future.result()
+        except Exception:
+            logger.exception(f"Data source {name} failed")
+            return None
+        if not self.is_good(wd):
+            logger.warning(f"Data source {name} returned no good data")
+            return None
+        wd = dict(wd)
+        wd.pop(UNCHANGED, None)
+        return wd
+
+    def collect(self) -> dict:
+        end = time.monotonic() + self.deadline
+        remaining = self.submit()
+        results = {}
+        while remaining:
+            done, _ = wait(remaining, timeout=max(0.0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                logger.warning(f"Deadline passed; no result from {', '.join(remaining.values())}")
+                break
+            for future in done:
+                name = remaining.pop(future)
+                wd = self.result(future, name)
+                if wd is None:
+                    continue
+                if self.mode == HEDGED:
+                    wd["field_sources"] = {f["key"]: name for f in self.bits if wd.get(f["key"]) is not None}
+                    logger.info(f"Using the data of {name}")
+                    return wd
+                results[name] = wd
+
+        if not results:
+            logger.error("None of the data sources returned good data. Setting error.")
+            return DEFAULT_WEATHER_DATA
+        names = sorted(results, key=lambda n: self.freshness(results[n]), reverse=True)
+        field_sources = {}
+        wd = BuienradarParser.merge(results, names, self.bits, field_sources)
+        wd["field_sources"] = field_sources
+        logger.info(f"Merged the data of {', '.join(names)}")
+        return wd
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        for source in self.sources.values():
+            source.close()
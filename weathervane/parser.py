@@ -1,56 +1,61 @@
+import hashlib
 import json
 import logging
 import multiprocessing
+import os
+import re
+import time
 from configparser import ConfigParser
 from datetime import datetime, timedelta
-from typing import List, Sequence
+from typing import List, Optional, Sequence
 
-HOUR_ERROR_LIMIT = 2.0 * 60 * 60
-
-SIMPLE_CONFIG = 2
-EXTENDED_CONFIG = 5
+from weathervane.clock import REAL_CLOCK, Clock
+from weathervane.config import BitField, Config, DisplayWindow, InvalidConfigException, VaneConfig, parse_number
+from weathervane.datasources import DEFAULT_WEATHER_DATA, VANES
+from weathervane.encoder import EncoderPlan
+from weathervane.interpolation import EASINGS
+from weathervane.logs import SUBSYSTEMS
+from weathervane.metrics import REGISTRY
+from weathervane.profiling import PROFILER
 
-logger = multiprocessing.get_logger()
+HOUR_ERROR_LIMIT = 2.0 * 60 * 60
 
+logger = multiprocessing.get_logger().getChild("parser")
 
-class InvalidConfigException(Exception):
-    pass
+PARSE_SECONDS = REGISTRY.histogram(
+    "weathervane_parse_seconds", "Duration of parsing a feed into weather data", ["mode"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+FALLBACK_FIELDS = REGISTRY.counter(
+    "weathervane_fallback_fields_total", "Fields that were taken from a fallback station", ["field"]
+)
 
 
 class WeathervaneConfigParser(ConfigParser):
     DEFAULT_STATIONS = [6260, 6370]
-    KEY_INDEX = 0
-    LENGTH_INDEX = 1
-    MIN_INDEX = 2
-    MAX_INDEX = 3
-    STEP_INDEX = 4
+    VANE_SECTION = "Vane "
 
     def __init__(self):
         super(WeathervaneConfigParser, self).__init__()
 
-    def parse_bit_packing_section(self) -> List[dict]:
-        bit_numbers = self.options("Bit Packing")
-        bit_numbers = sorted([int(n) for n in bit_numbers])
-
-        bits = []
-        for bit_number in bit_numbers:
-            bit_config = self.get("Bit Packing", str(bit_number))
-            bit_config = bit_config.split(",")
-            if len(bit_config) == SIMPLE_CONFIG:
-                bits.append({"key": bit_config[self.KEY_INDEX], "length": bit_config[self.LENGTH_INDEX]})
-            elif len(bit_config) == EXTENDED_CONFIG:
-                bits.append(
-                    {
-                        "key": bit_config[self.KEY_INDEX],
-                        "length": bit_config[self.LENGTH_INDEX],
-                        "min": bit_config[self.MIN_INDEX],
-                        "max": bit_config[self.MAX_INDEX],
-                        "step": bit_config[self.STEP_INDEX],
-                    }
-                )
-            else:
-                raise InvalidConfigException("")
-        return bits
+    def _get_conv(self, section, option, conv, **kwargs):
+        """Convert an option with getint, getfloat or getboolean, and tell which option is wrong when it fails"""
+        try:
+            return super(WeathervaneConfigParser, self)._get_conv(section, option, conv, **kwargs)
+        except ValueError as e:
+            raise InvalidConfigException(f"[{section}] {option}: {e}") from None
+
+    def parse_bit_packing_section(self, section: str = "Bit Packing") -> List[BitField]:
+        """Parse the fields in [Bit Packing], or in another section, in the order of their numbers
+
+        @raise InvalidConfigException: when a field is not written as 'key,length' or 'key,length,min,max,step'
+        """
+        bit_numbers = self.options(section)
+        bit_numbers = sorted([int(n) for n in bit_numbers if n.isdigit()])
+        return [
+            BitField.parse(self.get(section, str(bit_number)), f"[{section}] {bit_number}")
+            for bit_number in bit_numbers
+        ]
 
     def parse_station_numbers(self):
         try:
@@ -70,6 +75,40 @@ class WeathervaneConfigParser(ConfigParser):
                 stations.append(station_id)
         return stations
 
+    def parse_vanes(self, configuration: dict) -> List[dict]:
+        """Parse the [Vane <name>] sections: the other vanes that the weathervane drives
+
+        A vane has its own SPI device, stations, bit fields and display interval. What its section leaves out, it takes
+        from the weathervane itself: the SPI device from [SPI], the stations from [Stations] and the bit fields from
+        [Bit Packing]. The stations of a vane are written as a list, such as 'stations=6260,6370'.
+
+        @param configuration: the configuration of the weathervane itself
+        """
+        vanes = []
+        for section in self.sections():
+            if section != self.VANE_SECTION.strip() and not section.startswith(self.VANE_SECTION):
+                continue
+            name = section[len(self.VANE_SECTION):].strip()
+            stations = [
+                parse_number(station, f"[{section}] stations", int)
+                for station in self.get(section, "stations", fallback="").split(",")
+                if station.strip()
+            ]
+            vanes.append({
+                "name": name,
+                "spi_bus": self.getint(section, "bus", fallback=configuration["spi_bus"]),
+                "channel": self.getint(section, "channel", fallback=configuration["channel"]),
+                "frequency": self.getint(section, "frequency", fallback=configuration["frequency"]),
+                "keep_alive": self.getfloat(section, "keep_alive", fallback=configuration["keep_alive"]),
+                "checksum": self.get(section, "checksum", fallback=configuration["checksum"]),
+                "data_display_interval": self.getfloat(
+                    section, "data_display_interval", fallback=configuration["data_display_interval"]
+                ),
+                "stations": stations or list(configuration["stations"]),
+                "bits": self.parse_bit_packing_section(section) or list(configuration["bits"]),
+            })
+        return vanes
+
     def parse_config(self):
         """Takes a configuration parser and returns the configuration as a dictionary
 
@@ -77,17 +116,52 @@ class WeathervaneConfigParser(ConfigParser):
         """
         logger.info("Parsing configuration")
         station_config = self.parse_station_numbers()
-        bits: List[dict] = self.parse_bit_packing_section()
+        bits: List[BitField] = self.parse_bit_packing_section()
 
         configuration = {
             "channel": self.getint("SPI", "channel"),
             "frequency": self.getint("SPI", "frequency"),
             "library": self.get("SPI", "library"),
+            "spi_bus": self.getint("SPI", "bus", fallback=0),
+            "keep_alive": self.getfloat("SPI", "keep_alive", fallback=0.0),
+            "spi_mode": self.getint("SPI", "mode", fallback=0),
+            "spi_retries": self.getint("SPI", "retries", fallback=2),
+            "checksum": self.get("Bit Packing", "checksum", fallback="none"),
+            "max_retransmits": self.getint("SPI", "max_retransmits", fallback=3),
+            "min_frequency": self.getint("SPI", "min_frequency", fallback=0),
+            "error_threshold": self.getfloat("SPI", "error_threshold", fallback=0.1),
             "data_collection_interval": self.getint("General", "data_collection_interval"),
             "source": self.get("General", "source"),
             "data_display_interval": float(self.get("General", "data_display_interval")),
             "test": self.getboolean("General", "test"),
             "barometric_trend": self.getboolean("General", "barometric_trend"),
+            "parse_mode": self.get("General", "parse_mode", fallback=BuienradarParser.FULL),
+            "source_mode": self.get("General", "source_mode", fallback="hedged"),
+            "source_deadline": self.getfloat("General", "source_deadline", fallback=10.0),
+            "interpolation": self.get("General", "interpolation", fallback="linear"),
+            "cache_file": self.get("General", "cache_file", fallback=""),
+            "cache_interval": self.getfloat("General", "cache_interval", fallback=900.0),
+            "history_file": self.get("General", "history_file", fallback=""),
+            "metrics_port": self.getint("General", "metrics_port", fallback=0),
+            "record_file": self.get("General", "record_file", fallback=""),
+            "config_poll_interval": self.getfloat("General", "config_poll_interval", fallback=5.0),
+            "http": {
+                "connect_timeout": self.getfloat("General", "connect_timeout", fallback=3.05),
+                "read_timeout": self.getfloat("General", "read_timeout", fallback=10.0),
+                "retries": self.getint("General", "retries", fallback=3),
+                "backoff_factor": self.getfloat("General", "backoff_factor", fallback=0.5),
+                "backoff_max": self.getfloat("General", "backoff_max", fallback=30.0),
+            },
+            "logging": {
+                "format": self.get("Logging", "format", fallback="text"),
+                "file": self.get("Logging", "file", fallback="weathervane.log"),
+                "level": self.get("Logging", "level", fallback="INFO"),
+                "levels": {
+                    subsystem: self.get("Logging", subsystem, fallback="") for subsystem in SUBSYSTEMS
+                },
+                "rate_limit": self.getfloat("Logging", "rate_limit", fallback=60.0),
+                "frame_sample": self.getint("Logging", "frame_sample", fallback=100),
+            },
             "stations": station_config,
             "bits": bits,
             "display": {
@@ -95,15 +169,174 @@ class WeathervaneConfigParser(ConfigParser):
                 "start-time": self.get("Display", "start-time"),
                 "end-time": self.get("Display", "end-time"),
                 "pin": self.getint("Display", "pin"),
+                "schedule": self.get("Display", "schedule", fallback=""),
             },
         }
+        if configuration["interpolation"] not in EASINGS:
+            raise InvalidConfigException(
+                f"Unknown interpolation '{configuration['interpolation']}'. Use one of: {', '.join(EASINGS)}"
+            )
+        configuration["vanes"] = self.parse_vanes(configuration)
+        self.validate(configuration)
         logger.info("Configuration successfully parsed")
         return configuration
 
+    @staticmethod
+    def validate(configuration: dict):
+        """Check the settings that would otherwise only fail once the weathervane runs
+
+        @raise InvalidConfigException: with the setting that is wrong
+        """
+        from weathervane.fanout import display_tick
+        from weathervane.gpio import GPIO
+
+        if not configuration["stations"]:
+            raise InvalidConfigException("[Stations] lists no stations")
+        for name in ("data_collection_interval", "data_display_interval"):
+            if configuration[name] <= 0:
+                raise InvalidConfigException(f"[General] {name} must be more than 0, not {configuration[name]}")
+        if configuration["spi_mode"] not in GPIO.AVAILABLE_MODES:
+            raise InvalidConfigException(
+                f"[SPI] mode must be one of {GPIO.AVAILABLE_MODES}, not {configuration['spi_mode']}"
+            )
+        WeathervaneConfigParser.validate_device("[SPI]", configuration, checksum_section="[Bit Packing]")
+        DisplayWindow.from_dict(configuration["display"])
+        EncoderPlan(configuration["bits"])
+
+        devices = {(configuration["spi_bus"], configuration["channel"]): "[SPI]"}
+        intervals = [configuration["data_display_interval"]]
+        for vane in configuration["vanes"]:
+            WeathervaneConfigParser.validate_vane(dict(configuration, **vane), devices)
+            intervals.append(vane["data_display_interval"])
+        display_tick(intervals)
+
+    @staticmethod
+    def validate_device(section: str, settings: dict, checksum_section: Optional[str] = None):
+        """Check the SPI device and the settings of the link of the weathervane or of a vane
+
+        @param section: the section with the SPI device, for the messages
+        @param settings: the configuration of the weathervane or the vane
+        @param checksum_section: the section with the checksum, when it is another one
+        @raise InvalidConfigException: with the setting that is wrong
+        """
+        from weathervane.gpio import GPIO
+        from weathervane.link import CHECKSUMS, NO_CHECKSUM
+
+        bus, channel, checksum = settings["spi_bus"], settings["channel"], settings["checksum"]
+        if bus not in GPIO.AVAILABLE_BUSES:
+            raise InvalidConfigException(f"{section} bus must be one of {GPIO.AVAILABLE_BUSES}, not {bus}")
+        if channel not in GPIO.AVAILABLE_CHANNELS:
+            raise InvalidConfigException(f"{section} channel must be one of {GPIO.AVAILABLE_CHANNELS}, not {channel}")
+        if checksum not in CHECKSUMS and checksum != NO_CHECKSUM:
+            raise InvalidConfigException(
+                f"{checksum_section or section} checksum must be one of {NO_CHECKSUM}, {', '.join(CHECKSUMS)}, "
+                f"not {checksum}"
+            )
+        for name in ("max_retransmits", "min_frequency"):
+            if settings.get(name, 0) < 0:
+                raise InvalidConfigException(f"{section} {name} must be 0 or more, not {settings[name]}")
+        error_threshold = settings.get("error_threshold", 0.1)
+        if not 0 < error_threshold <= 1:
+            raise InvalidConfigException(
+                f"{section} error_threshold must be more than 0 and at most 1, not {error_threshold}"
+            )
+
+    @staticmethod
+    def validate_vane(vane: dict, devices: dict):
+        """Check the settings of a vane
+
+        @param vane: the configuration of the weathervane, with the settings of the vane
+        @param devices: the sections by the (bus, channel) of the SPI devices so far, to which the vane is added
+        @raise InvalidConfigException: with the setting that is wrong
+        """
+        if not vane["name"]:
+            raise InvalidConfigException("[Vane] has no name; use [Vane <name>]")
+        section = f"[{WeathervaneConfigParser.VANE_SECTION}{vane['name']}]"
+        if vane["data_display_interval"] <= 0:
+            raise InvalidConfigException(
+                f"{section} data_display_interval must be more than 0, not {vane['data_display_interval']}"
+            )
+        WeathervaneConfigParser.validate_device(section, vane)
+        device = (vane["spi_bus"], vane["channel"])
+        if device in devices:
+            raise InvalidConfigException(
+                f"{section} uses SPI bus {device[0]}, channel {device[1]}, which {devices[device]} uses already"
+            )
+        devices[device] = section
+        try:
+            EncoderPlan(vane["bits"])
+        except InvalidConfigException as e:
+            raise InvalidConfigException(f"{section} {e}") from None
+
+    def compile(self, digest: str = "") -> Config:
+        """Parse and validate the configuration into its compiled, immutable form
+
+        @param digest: the SHA-256 of the configuration file
+        """
+        configuration = self.parse_config()
+        display = DisplayWindow.from_dict(configuration.pop("display"))
+        return Config(
+            configuration,
+            configuration.pop("bits"),
+            configuration.pop("stations"),
+            display,
+            digest,
+            [VaneConfig.from_dict(vane) for vane in configuration.pop("vanes")],
+        )
+
+
+CONFIG_CACHE_VERSION = 6
+
+
+def load_config(path: str, cache_path: Optional[str] = None) -> Config:
+    """Return the compiled configuration in a file.
 
-def is_weather_data_stale(timestamp, now):
+    The compiled configuration is cached in a file next to it. As long as the configuration file has the same
+    modification time and SHA-256, a restart takes the compiled configuration from the cache, and skips parsing and
+    validating it.
+
+    @param cache_path: the file in which the compiled configuration is cached, by default the path of the
+    configuration with '.compiled' appended. Use an empty string to not use a cache.
+    @raise InvalidConfigException: when the configuration is not valid
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    mtime_ns = os.stat(path).st_mtime_ns
+    cache_path = path + ".compiled" if cache_path is None else cache_path
+
+    if cache_path:
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+            if (cached["version"], cached["mtime_ns"], cached["config"]["digest"]) == (
+                CONFIG_CACHE_VERSION, mtime_ns, digest
+            ):
+                logger.info(f"Using the compiled configuration in {cache_path}")
+                return Config.from_json(cached["config"])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Cannot use the compiled configuration in {cache_path}: {e!r}")
+
+    config_parser = WeathervaneConfigParser()
+    config_parser.read_string(data.decode("utf-8"), source=path)
+    config = config_parser.compile(digest)
+
+    if cache_path:
+        temporary = cache_path + ".tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump({"version": CONFIG_CACHE_VERSION, "mtime_ns": mtime_ns, "config": config.to_json()}, f)
+            os.replace(temporary, cache_path)
+        except OSError as e:
+            logger.warning(f"Cannot cache the compiled configuration in {cache_path}: {e!r}")
+    return config
+
+
+def is_weather_data_stale(timestamp, clock: Clock = REAL_CLOCK):
     weather_data_ts = datetime.fromisoformat(timestamp).timestamp()
-    now_ts = now.timestamp()
+    now_ts = clock.time()
     time_delta_in = now_ts - weather_data_ts
     if time_delta_in > HOUR_ERROR_LIMIT:
         logger.error(f"{timestamp} is more than {(time_delta_in/3600):.2f} hours old; data is stale")
@@ -119,41 +352,164 @@ class BuienradarParser(object):
         "data_from_fallback",
         "random",
         "service_byte",
+        "field_sources",
     ]
     TREND_MAPPING = {'dropping': 2, 'stable': 4, 'rising': 1}
+    FULL = "full"
+    TARGETED = "targeted"
+    STATION_MEASUREMENTS = '"stationmeasurements"'
+    STATION_ID_PATTERN = re.compile(r'"stationid"\s*:\s*(\d+)')
+    REQUIRED_KEYS = ("stationid", "timestamp")
 
     def __init__(self, *args, **kwargs):
         self.fallback_used = None
         self.stations = kwargs.get("stations", None)
         self.bits = kwargs.get("bits", None)
+        self.vanes = [(vane["name"], vane["stations"], vane["bits"]) for vane in kwargs.get("vanes", [])]
+        self.parse_mode = kwargs.get("parse_mode", self.FULL)
+        self.history = kwargs.get("history", None) if kwargs.get("barometric_trend", True) else None
+        self.clock = kwargs.get("clock", REAL_CLOCK)
+
+    @property
+    def all_stations(self) -> list:
+        """Return the stations of the weathervane and of the other vanes, in order and without duplicates"""
+        stations = list(self.stations or [])
+        for _, vane_stations, _ in self.vanes:
+            stations.extend(station for station in vane_stations if station not in stations)
+        return stations
 
     def parse(self, data: str) -> dict:
-        raw_weather_data = json.loads(data)
-        raw_stations_weather_data = self._to_dict(
-            raw_weather_data["actual"]["stationmeasurements"]
-        )
-        raw_primary_station_data = self.merge(
-            raw_stations_weather_data, self.stations, self.bits
-        )
-        station_weather_data = self.enrich(raw_primary_station_data)
+        """Parse the feed into the weather data of the primary station.
+
+        The feed is decoded once for the weathervane and the other vanes together. The weather data of each of the
+        other vanes, with its own stations and fields, is added under L{VANES}.
+        """
+        start = time.perf_counter()
+        with PROFILER.span("parse"):
+            if self.parse_mode == self.TARGETED:
+                raw_stations_weather_data = self.extract_stations(data)
+            else:
+                raw_weather_data = json.loads(data)
+                raw_stations_weather_data = self._to_dict(
+                    raw_weather_data["actual"]["stationmeasurements"]
+                )
+        with PROFILER.span("merge"):
+            vanes = {
+                name: self.merge_vane(name, raw_stations_weather_data, stations, bits)
+                for name, stations, bits in self.vanes
+            }
+            raw_primary_station_data = self.merge(
+                raw_stations_weather_data, self.stations, self.bits
+            )
+        with PROFILER.span("enrich"):
+            station_weather_data = self.enrich(raw_primary_station_data)
+            if self.vanes:
+                station_weather_data[VANES] = {
+                    name: self.enrich(wd) if wd is not DEFAULT_WEATHER_DATA else dict(wd) for name, wd in vanes.items()
+                }
+        PARSE_SECONDS.observe(time.perf_counter() - start, (self.parse_mode,))
 
         return station_weather_data
 
-    @staticmethod
-    def enrich(weather_data: dict) -> dict:
-        weather_data["barometric_trend"] = BuienradarParser.TREND_MAPPING['stable']
-        weather_data["error"] = is_weather_data_stale(weather_data["timestamp"], datetime.now())
+    def extract_stations(self, data: str) -> dict:
+        """Extract the measurements of the configured stations, without decoding the rest of the document.
+
+        The station ids in the station measurements are scanned with a regular expression, which stops as soon as
+        all configured stations have been found. Only the objects of those stations are decoded, and only the keys
+        that are named in the bits are kept. This relies on the station measurements being flat objects; when an
+        object cannot be cut out of the document, the whole document is decoded instead.
+
+        @param data: the Buienradar feed as a json string
+        @return: a dictionary with the measurements of each configured station that is in the feed
+        """
+        start = data.find(self.STATION_MEASUREMENTS)
+        if start < 0:
+            raise KeyError("stationmeasurements")
+
+        wanted = set(self.all_stations)
+        keys = {field["key"] for field in self.bits}.union(self.REQUIRED_KEYS)
+        for _, _, bits in self.vanes:
+            keys.update(field["key"] for field in bits)
+        if self.history is not None:
+            keys.update(self.history.FIELDS)
+        result = {}
+        for match in self.STATION_ID_PATTERN.finditer(data, start):
+            station_id = int(match.group(1))
+            if station_id not in wanted:
+                continue
+            object_start = data.rfind("{", start, match.start())
+            object_end = data.find("}", match.end()) + 1
+            try:
+                station_data = json.loads(data[object_start:object_end])
+            except ValueError:
+                logger.warning(f"Cannot extract station {station_id} from the feed; decoding all of it")
+                return self._to_dict(json.loads(data)["actual"]["stationmeasurements"])
+            result[station_id] = {key: value for key, value in station_data.items() if key in keys}
+            wanted.discard(station_id)
+            if not wanted:
+                break
+        return result
+
+    def merge_vane(self, name: str, weather_data: dict, stations: list, bits: Sequence[dict]) -> dict:
+        """Merge the data of the stations of another vane, without changing the data of the stations itself
+
+        @return: the data of the primary station of the vane, or the default weather data when it is not in the feed
+        """
+        primary_station = stations[0]
+        if primary_station not in weather_data:
+            logger.error(f"Station {primary_station} of vane {name} is not in the feed. Setting error.")
+            return DEFAULT_WEATHER_DATA
+        copies = {station: dict(weather_data[station]) for station in stations if station in weather_data}
+        return self.merge(copies, stations, bits)
+
+    def refresh(self, weather_data: dict) -> dict:
+        """Enrich weather data that was parsed before once more, with the weather data of the other vanes, so that it
+        turns into an error once it becomes stale
+        """
+        wd = self.enrich(dict(weather_data))
+        if VANES in weather_data:
+            wd[VANES] = {
+                name: self.enrich(dict(vane)) if "timestamp" in vane else vane
+                for name, vane in weather_data[VANES].items()
+            }
+        return wd
+
+    def enrich(self, weather_data: dict) -> dict:
+        """Add the derived fields to the weather data of the primary station.
+
+        The barometric trend comes from the L{ObservationHistory}, when there is one. Otherwise it is always stable.
+        """
+        trend = 'stable'
+        if self.history is not None:
+            self.history.add(weather_data)
+            trend = self.history.barometric_trend(weather_data.get("stationid"))
+        weather_data["barometric_trend"] = BuienradarParser.TREND_MAPPING[trend]
+        weather_data["error"] = is_weather_data_stale(weather_data["timestamp"], self.clock)
         return weather_data
 
     @staticmethod
     def merge(
-            weather_data: dict, stations: list, required_fields: Sequence[dict]
+            weather_data: dict, stations: list, required_fields: Sequence[dict], field_sources: Optional[dict] = None
     ) -> dict:
+        """Merge the data of the stations into the data of the primary station.
+
+        Fields that are missing at the primary station are taken from the first fallback station that has them.
+
+        @param weather_data: the data of each station, keyed by station
+        @param stations: the primary station, followed by the fallback stations in order of preference
+        @param required_fields: the fields that should be present
+        @param field_sources: when given, it is filled with the station that supplied each of the required fields
+        @return: the data of the primary station
+        """
         primary_station = stations[0]
         weather_data[primary_station]["data_from_fallback"] = False
         weather_data[primary_station]["error"] = False
         assert primary_station
         secondary_stations = stations[1:]
+        if field_sources is not None:
+            for field_dict in required_fields:
+                if weather_data[primary_station].get(field_dict["key"], None) is not None:
+                    field_sources[field_dict["key"]] = primary_station
         if not secondary_stations:
             return weather_data[primary_station]
         for field_dict in required_fields:
@@ -161,20 +517,33 @@ class BuienradarParser(object):
             value = weather_data[primary_station].get(field_name, None)
             if value is None and field_name not in BuienradarParser.DERIVED_FIELDS:
                 logger.warning(f"Using data from fallback stations for field {field_name}")
-                for secondary_station in secondary_stations:
-                    try:
-                        fallback_data = weather_data.get(secondary_station, {})[field_name]
-                        weather_data[primary_station][field_name] = fallback_data
-                        weather_data[primary_station]["data_from_fallback"] = True
-                        logger.info(f"Set {field_name} to {fallback_data}, due to missing data at the primary station")
-                        break
-                    except KeyError:
-                        continue
-                else:
+                secondary_station, fallback_data = BuienradarParser.fallback(
+                    weather_data, secondary_stations, field_name
+                )
+                if secondary_station is None:
                     logger.error(f"No backup value found for {field_name}; setting error")
                     weather_data[primary_station]["error"] = True
+                    continue
+                weather_data[primary_station][field_name] = fallback_data
+                weather_data[primary_station]["data_from_fallback"] = True
+                FALLBACK_FIELDS.inc(labels=(field_name,))
+                if field_sources is not None:
+                    field_sources[field_name] = secondary_station
+                logger.info(
+                    f"Set {field_name} to {fallback_data}, due to missing data at the primary station",
+                    extra={"distinct": True},
+                )
         return weather_data[primary_station]
 
+    @staticmethod
+    def fallback(weather_data: dict, secondary_stations: list, field_name: str) -> tuple:
+        """Return the first fallback station that has the field, with its value, or None and None"""
+        for secondary_station in secondary_stations:
+            station_data = weather_data.get(secondary_station, {})
+            if field_name in station_data:
+                return secondary_station, station_data[field_name]
+        return None, None
+
     @staticmethod
     def _to_dict(stations_weather_data: dict) -> dict:
         return {
@@ -0,0 +1,124 @@
+import math
+import threading
+from array import array
+from contextlib import nullcontext
+from time import perf_counter_ns
+from typing import Dict, List
+
+NULL_SPAN = nullcontext()
+
+
+class Span(object):
+    """Times a named stage of the pipeline, from entering it to leaving it"""
+
+    __slots__ = ("profiler", "name", "start", "child_ns")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+        self.child_ns = 0
+
+    def __enter__(self):
+        self.profiler.stack().append(self)
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = perf_counter_ns() - self.start
+        stack = self.profiler.stack()
+        path = ";".join(span.name for span in stack)
+        stack.pop()
+        if stack:
+            stack[-1].child_ns += elapsed
+        self.profiler.record(self.name, path, elapsed, elapsed - self.child_ns)
+        return False
+
+
+class Profiler(object):
+    """Collects the duration of the stages of the pipeline: fetch, parse, merge, enrich, interpolate, encode and spi.
+
+    Each stage is wrapped in a span: 'with PROFILER.span("parse"):'. While the profiler is disabled, which it is
+    unless the weathervane runs with --profile, a span is a shared context manager that does nothing. When it is
+    enabled, the duration of each span is kept, and so is the time spent in each stack of nested spans, excluding the
+    nested spans themselves. The stacks can be written as folded stacks, which flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.durations: Dict[str, array] = {}
+        self.stacks: Dict[str, int] = {}
+
+    def __repr__(self):
+        return "Profiler(enabled=%s, stages=%s)" % (self.enabled, list(self.durations))
+
+    def span(self, name: str):
+        return Span(self, name) if self.enabled else NULL_SPAN
+
+    def stack(self) -> List[Span]:
+        try:
+            return self.local.stack
+        except AttributeError:
+            self.local.stack = []
+            return self.local.stack
+
+    def record(self, name: str, path: str, elapsed_ns: int, self_ns: int):
+        with self.lock:
+            durations = self.durations.get(name)
+            if durations is None:
+                durations = self.durations[name] = array("q")
+            durations.append(elapsed_ns)
+            self.stacks[path] = self.stacks.get(path, 0) + self_ns
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.durations = {}
+            self.stacks = {}
+
+    @staticmethod
+    def percentile(ordered, fraction: float) -> int:
+        """Return the value below which the given fraction of the ordered values lies, by the nearest rank"""
+        rank = max(1, math.ceil(fraction * len(ordered) - 1e-9))
+        return ordered[rank - 1]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Return the count, mean, p50, p95 and p99 of each stage, in milliseconds"""
+        result = {}
+        for name, durations in self.durations.items():
+            ordered = sorted(durations)
+            result[name] = {
+                "count": len(ordered),
+                "mean": sum(ordered) / len(ordered) / 1e6,
+                "p50": self.percentile(ordered, 0.50) / 1e6,
+                "p95": self.percentile(ordered, 0.95) / 1e6,
+                "p99": self.percentile(ordered, 0.99) / 1e6,
+            }
+        return result
+
+    def report(self) -> str:
+        lines = ["%-12s %8s %10s %10s %10s %10s" % ("stage", "count", "mean ms", "p50 ms", "p95 ms", "p99 ms")]
+        for name, stats in self.summary().items():
+            lines.append(
+                "%-12s %8d %10.3f %10.3f %10.3f %10.3f"
+                % (name, stats["count"], stats["mean"], stats["p50"], stats["p95"], stats["p99"])
+            )
+        return "\n".join(lines)
+
+    def folded(self) -> str:
+        """Return the time spent in each stack of spans as folded stacks, in microseconds"""
+        return "".join(f"{path} {self_ns // 1000}\n" for path, self_ns in self.stacks.items())
+
+    def write_folded(self, path: str):
+        with open(path, "w") as f:
+            f.write(self.folded())
+
+
+PROFILER = Profiler()
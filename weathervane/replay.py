@@ -0,0 +1,183 @@
+import gzip
+import json
+import multiprocessing
+import zlib
+from bisect import bisect_right
+from collections import Counter
+from typing import List, NamedTuple, Optional
+
+from weathervane.buienradar import HTTP_NOT_MODIFIED, HTTP_OK, BuienradarDataSource
+from weathervane.clock import REAL_CLOCK, Clock
+from weathervane.datasources import DataCollectionException
+
+logger = multiprocessing.get_logger().getChild("collector")
+
+
+class Record(NamedTuple):
+    """A response of the provider, at the time of day at which it was retrieved.
+
+    The body is None when the feed was not modified, and the error is set when the retrieval failed.
+    """
+
+    time: float
+    body: Optional[str] = None
+    error: Optional[str] = None
+
+
+def append_record(path: str, record: Record):
+    """Append a record to an archive.
+
+    An archive is a gzip file with a line of json per record. Each record is appended as a gzip member of its own, so
+    an archive that was cut short by a power failure only loses its last record.
+    """
+    entry = {"time": record.time}
+    if record.body is not None:
+        entry["body"] = record.body
+    if record.error is not None:
+        entry["error"] = record.error
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+
+def read_archive(path: str) -> List[Record]:
+    """Read the records of an archive, ordered by time. A record that was cut short ends the archive."""
+    records = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                records.append(Record(entry["time"], entry.get("body"), entry.get("error")))
+    except (EOFError, zlib.error, ValueError) as e:
+        logger.warning(f"The archive {path} ends after {len(records)} records: {e!r}")
+    records.sort(key=lambda record: record.time)
+    return records
+
+
+class RecordingFetcher(object):
+    """Retrieves the feed with another fetcher, and appends each response to an archive, to replay it later"""
+
+    def __init__(self, fetcher, path: str, clock: Clock = REAL_CLOCK):
+        self.fetcher = fetcher
+        self.path = path
+        self.clock = clock
+
+    def __repr__(self):
+        return "RecordingFetcher(fetcher=%r, path=%s)" % (self.fetcher, self.path)
+
+    @property
+    def status_counts(self) -> Counter:
+        return self.fetcher.status_counts
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.fetcher.bytes_saved
+
+    def get_weather_string(self) -> Optional[str]:
+        now = self.clock.time()
+        try:
+            body = self.fetcher.get_weather_string()
+        except DataCollectionException as e:
+            self.record(Record(now, error=str(e)))
+            raise
+        self.record(Record(now, body))
+        return body
+
+    def record(self, record: Record):
+        try:
+            append_record(self.path, record)
+        except OSError as e:
+            logger.error(f"Cannot record the response in {self.path}: {e!r}")
+
+    def forget(self):
+        self.fetcher.forget()
+
+    def close(self):
+        self.fetcher.close()
+
+
+class ReplayFetcher(object):
+    """Plays back the responses of an archive, following a clock.
+
+    Each retrieval returns the latest response that had been recorded at the time of the clock. When that is the same
+    response as the last time, or a recorded 'not modified', it answers as if the feed was not modified. A recorded
+    failure raises the same exception as a real one.
+    """
+
+    def __init__(self, records: List[Record], clock: Clock = REAL_CLOCK):
+        self.records = records
+        self.times = [record.time for record in records]
+        self.clock = clock
+        self.status_counts = Counter()
+        self.bytes_saved = 0
+        self.body_indices = []
+        body_index = None
+        for index, record in enumerate(records):
+            if record.body is not None:
+                body_index = index
+            self.body_indices.append(body_index)
+        self.last_index = None
+
+    def __repr__(self):
+        return "ReplayFetcher(records=%d, clock=%r)" % (len(self.records), self.clock)
+
+    def get_weather_string(self) -> Optional[str]:
+        position = bisect_right(self.times, self.clock.time()) - 1
+        if position < 0:
+            raise DataCollectionException("Replay: nothing was recorded yet")
+        record = self.records[position]
+        if record.error is not None:
+            raise DataCollectionException(record.error)
+        index = self.body_indices[position]
+        if index is None:
+            raise DataCollectionException("Replay: only 'not modified' was recorded yet")
+        if index == self.last_index:
+            self.status_counts[HTTP_NOT_MODIFIED] += 1
+            self.bytes_saved += len(self.records[index].body)
+            return None
+        self.last_index = index
+        self.status_counts[HTTP_OK] += 1
+        return self.records[index].body
+
+    def forget(self):
+        self.last_index = None
+
+    def close(self):
+        pass
+
+
+class ReplayDataSource(BuienradarDataSource):
+    """Replays the Buienradar feed that was recorded in the archive 'replay_file', through the Buienradar parser"""
+
+    def __init__(self, *args, **kwargs):
+        clock = kwargs.get("clock", REAL_CLOCK)
+        fetcher = ReplayFetcher(read_archive(kwargs["replay_file"]), clock)
+        super(ReplayDataSource, self).__init__(*args, fetcher=fetcher, **kwargs)
+
+    def __repr__(self):
+        return "ReplayDataSource(fetcher=%r)" % self.fetcher
+
+
+class ReplayStats(NamedTuple):
+    virtual_seconds: float
+    wall_seconds: float
+    cpu_seconds: float
+    collections: int
+    errors: int
+    frames_sent: int
+    frames_suppressed: int
+    max_rss_start_kib: int
+    max_rss_end_kib: int
+
+    @property
+    def speedup(self) -> float:
+        return self.virtual_seconds / self.wall_seconds if self.wall_seconds else 0.0
+
+    def report(self) -> str:
+        return "\n".join([
+            f"Replayed {self.virtual_seconds / 3600:.1f} hours in {self.wall_seconds:.2f} s "
+            f"({self.speedup:.0f}x), using {self.cpu_seconds:.2f} s of CPU",
+            f"Collections: {self.collections}, of which {self.errors} with an error",
+            f"Frames: {self.frames_sent} sent, {self.frames_suppressed} suppressed",
+            f"Maximum resident memory: {self.max_rss_start_kib} KiB at the start, "
+            f"{self.max_rss_end_kib} KiB at the end",
+        ])
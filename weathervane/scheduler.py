@@ -0,0 +1,86 @@
+import asyncio
+import math
+import multiprocessing
+from typing import Callable, Optional
+
+from weathervane.metrics import REGISTRY
+
+logger = multiprocessing.get_logger().getChild("display")
+
+LATENESS = REGISTRY.histogram(
+    "weathervane_task_lateness_seconds", "How late a timed task woke up compared to its deadline", ["task"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+
+
+class JitterStats(object):
+    """Keeps track of how late a timed task wakes up compared to its deadline, and logs it periodically."""
+
+    def __init__(self, name: str, report_every: int = 300):
+        """
+        @param name: the name of the task, used in the log
+        @param report_every: the amount of measurements after which the statistics are logged and reset
+        """
+        self.name = name
+        self.report_every = report_every
+        self.reset()
+
+    def __repr__(self):
+        return "JitterStats(name=%s, count=%d, mean=%.6f, max=%.6f)" % (self.name, self.count, self.mean, self.max)
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def record(self, lateness: float):
+        LATENESS.observe(lateness, (self.name,))
+        self.count += 1
+        self.total += lateness
+        if lateness > self.max:
+            self.max = lateness
+        if self.count >= self.report_every:
+            logger.info(
+                f"Timing of {self.name}: {self.count} runs, {self.mean * 1000:.2f} ms mean and "
+                f"{self.max * 1000:.2f} ms maximum jitter"
+            )
+            self.reset()
+
+
+def next_deadline(deadline: float, interval: float, now: float) -> float:
+    """Return the deadline after the given one, skipping the deadlines that have already passed.
+
+    The deadlines are always a whole number of intervals after the first one, so they do not drift, no matter how
+    long the task took or how late it woke up.
+    """
+    deadline += interval
+    if deadline <= now:
+        deadline += math.ceil((now - deadline) / interval) * interval
+        if deadline <= now:
+            deadline += interval
+    return deadline
+
+
+async def run_periodically(interval: float, action: Callable, jitter: Optional[JitterStats] = None,
+                           delay: float = 0):
+    """Call the action every interval seconds, until the task is cancelled.
+
+    @param interval: the seconds between two calls
+    @param action: the function to call
+    @param jitter: the statistics in which the lateness of each call is recorded
+    @param delay: the seconds to wait before the first call
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + delay
+    if delay:
+        await asyncio.sleep(delay)
+    while True:
+        if jitter is not None:
+            jitter.record(loop.time() - deadline)
+        action()
+        deadline = next_deadline(deadline, interval, loop.time())
+        await asyncio.sleep(deadline - loop.time())
@@ -0,0 +1,83 @@
+import json
+import math
+from bisect import bisect_right
+
+from weathervane.clock import REAL_CLOCK
+from weathervane.datasources import DataSource
+from weathervane.encoder import WIND_DIRECTIONS
+from weathervane.parser import BuienradarParser
+from weathervane.profiling import PROFILER
+
+COMPASS = list(WIND_DIRECTIONS)
+BEAUFORT_LIMITS = [0.3, 1.6, 3.4, 5.5, 8.0, 10.8, 13.9, 17.2, 20.8, 24.5, 28.5, 32.7]
+
+
+class TestDataSource(DataSource):
+    """A data source that needs no network, for testing the weathervane and benchmarking it offline.
+
+    Every collection generates a feed in the format of Buienradar, with measurements for the configured stations that
+    follow slow waves. The values only depend on the number of the collection, so every run produces the same
+    sequence. The feed then goes through the same parser as the real Buienradar feed.
+    """
+
+    __test__ = False
+
+    def __init__(self, *args, now=None, **kwargs):
+        """
+        @param now: returns the current time, which is used as the time of the measurements. By default that is the
+        time of the configured clock.
+        """
+        super(TestDataSource, self).__init__(*args, **kwargs)
+        self.parser = BuienradarParser(*args, **kwargs)
+        self.stations = self.parser.all_stations or [6260]
+        self.now = now if now else kwargs.get("clock", REAL_CLOCK).now
+        self.collections = 0
+
+    def __repr__(self):
+        return "TestDataSource(stations=%s)" % self.stations
+
+    @staticmethod
+    def measurement(station_id: int, n: int, timestamp: str) -> dict:
+        """Return the measurement of a station at the given collection"""
+        windspeed = round(6 + 5 * math.sin(n / 7), 1)
+        temperature = round(12 + 8 * math.sin(n / 30), 1)
+        rain = round(max(0.0, 3 * math.sin(n / 5)), 1)
+        return {
+            "stationid": station_id,
+            "stationname": "Teststation %d" % station_id,
+            "lat": 52.1,
+            "lon": 5.18,
+            "timestamp": timestamp,
+            "weatherdescription": "Test",
+            "winddirection": COMPASS[n % len(COMPASS)],
+            "winddirectiondegrees": 22.5 * (n % len(COMPASS)),
+            "windspeed": windspeed,
+            "windgusts": round(windspeed * 1.4, 1),
+            "windspeedBft": bisect_right(BEAUFORT_LIMITS, windspeed),
+            "temperature": temperature,
+            "groundtemperature": round(temperature - 1, 1),
+            "feeltemperature": round(temperature - windspeed / 3, 1),
+            "humidity": round(70 + 20 * math.sin(n / 11)),
+            "airpressure": round(1013 + 10 * math.sin(n / 50), 1),
+            "visibility": 20000.0,
+            "precipitation": rain,
+            "rainFallLastHour": rain,
+            "rainFallLast24Hour": round(rain * 6, 1),
+            "sunpower": round(max(0.0, 600 * math.sin(n / 20))),
+        }
+
+    def feed(self) -> str:
+        """Return the feed of the next collection, as a json string in the format of Buienradar"""
+        now = self.now()
+        timestamp = now.replace(minute=now.minute - now.minute % 10, second=0, microsecond=0).isoformat()
+        measurements = [
+            self.measurement(station_id, self.collections + offset, timestamp)
+            for offset, station_id in enumerate(self.stations)
+        ]
+        return json.dumps({"actual": {"stationmeasurements": measurements}})
+
+    def collect(self) -> dict:
+        self.collections += 1
+        with PROFILER.span("fetch"):
+            feed = self.feed()
+        return self.parser.parse(feed)
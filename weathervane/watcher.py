@@ -0,0 +1,172 @@
+import asyncio
+import ctypes
+import multiprocessing
+import os
+import struct
+from typing import Callable, List, Optional
+
+from weathervane.scheduler import run_periodically
+
+logger = multiprocessing.get_logger().getChild("parser")
+
+# from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+EVENT = struct.Struct("iIII")
+
+
+class Inotify(object):
+    """Watches a directory with the inotify API of Linux, through ctypes.
+
+    The directory is watched, rather than the file itself, because most editors save a file by writing a new file and
+    renaming it over the old one, after which a watch on the old file sees nothing.
+    """
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, directory: str):
+        """
+        @raise OSError: when inotify is not available, or the directory cannot be watched
+        """
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError) as e:
+            raise OSError(f"inotify is not available: {e}") from None
+        self.fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        if add_watch(self.fd, os.fsencode(directory), self.MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, os.strerror(errno), directory)
+
+    def __repr__(self):
+        return "Inotify(fd=%d)" % self.fd
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def read_names(self) -> List[str]:
+        """Return the names of the files in the directory that changed since the last call, without waiting
+
+        When the kernel dropped events because too many happened, the name is an empty string.
+        """
+        names = []
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return names
+            offset = 0
+            while offset + EVENT.size <= len(data):
+                _, mask, _, length = EVENT.unpack_from(data, offset)
+                offset += EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                names.append("" if mask & IN_Q_OVERFLOW else os.fsdecode(name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher(object):
+    """Calls a function in the event loop when a file has changed.
+
+    The file is watched with inotify where it is available, and otherwise by checking its modification time, size and
+    inode every poll_interval seconds. A burst of changes, as an editor makes when it saves the file, results in a
+    single call once the file has been left alone for the settle time.
+    """
+
+    def __init__(self, path: str, on_change: Callable[[], None], poll_interval: float = 5.0, settle: float = 0.5,
+                 use_inotify: bool = True):
+        """
+        @param on_change: called without arguments, in the event loop, after the file has changed
+        @param poll_interval: the seconds between two checks of the file when inotify is not used
+        @param settle: the seconds that the file has to be left alone before on_change is called
+        @param use_inotify: whether to use inotify when it is available
+        """
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.settle = settle
+        self.use_inotify = use_inotify
+        self.inotify: Optional[Inotify] = None
+        self.poll_task: Optional[asyncio.Task] = None
+        self.pending: Optional[asyncio.TimerHandle] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.signature = self.stat()
+
+    def __repr__(self):
+        return "FileWatcher(path=%s, method=%s)" % (self.path, self.method)
+
+    @property
+    def method(self) -> str:
+        if self.inotify is not None:
+            return "inotify"
+        return "polling" if self.poll_task is not None else "stopped"
+
+    def stat(self) -> Optional[tuple]:
+        try:
+            result = os.stat(self.path)
+        except OSError:
+            return None
+        return result.st_mtime_ns, result.st_size, result.st_ino
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        if self.use_inotify:
+            try:
+                self.inotify = Inotify(os.path.dirname(self.path))
+                loop.add_reader(self.inotify.fileno(), self._read_events)
+            except (OSError, NotImplementedError) as e:
+                logger.info(f"Cannot watch {self.path} with inotify, checking it every {self.poll_interval} s: {e}")
+                if self.inotify is not None:
+                    self.inotify.close()
+                    self.inotify = None
+        if self.inotify is None:
+            self.poll_task = loop.create_task(run_periodically(self.poll_interval, self.poll, delay=self.poll_interval))
+        logger.info(f"Watching {self.path} for changes with {self.method}")
+        return self
+
+    def stop(self):
+        if self.pending is not None:
+            self.pending.cancel()
+            self.pending = None
+        if self.inotify is not None:
+            self.loop.remove_reader(self.inotify.fileno())
+            self.inotify.close()
+            self.inotify = None
+        if self.poll_task is not None:
+            self.poll_task.cancel()
+            self.poll_task = None
+
+    def _read_events(self):
+        name = os.path.basename(self.path)
+        if any(changed in (name, "") for changed in self.inotify.read_names()):
+            self.changed()
+
+    def poll(self):
+        if self.stat() != self.signature:
+            self.changed()
+
+    def changed(self):
+        """Call on_change once the file has been left alone for the settle time"""
+        if self.pending is not None:
+            self.pending.cancel()
+        self.pending = self.loop.call_later(self.settle, self._settled)
+
+    def _settled(self):
+        self.pending = None
+        signature = self.stat()
+        if signature is None:
+            # removed or being replaced; the new file causes another event
+            return
+        self.signature = signature
+        self.on_change()
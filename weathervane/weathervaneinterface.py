@@ -1,44 +1,53 @@
+import asyncio
 import multiprocessing
-import time
-from random import randint
-from typing import List
-
-import gpiozero
+from datetime import datetime, timedelta
+from random import getrandbits, randint
+from typing import List, Optional, Tuple
 
+from weathervane.clock import REAL_CLOCK
+from weathervane.config import DisplayWindow
+from weathervane.encoder import WIND_DIRECTIONS, EncoderPlan
 from weathervane.gpio import GPIO
+from weathervane.link import Link
+from weathervane.metrics import REGISTRY
+from weathervane.profiling import PROFILER
+
+logger = multiprocessing.get_logger().getChild("spi")
+display_logger = multiprocessing.get_logger().getChild("display")
+
+MINUTES_PER_DAY = 24 * 60
 
-logger = multiprocessing.get_logger()
+FRAMES = REGISTRY.counter("weathervane_frames_total", "Frames for the display, by whether they were sent", ["outcome"])
 
 
 class WeatherVaneInterface(object):
-    wind_directions = {
-        "N": 0x00,
-        "NNO": 0x01,
-        "NO": 0x02,
-        "ONO": 0x03,
-        "O": 0x04,
-        "OZO": 0x05,
-        "ZO": 0x06,
-        "ZZO": 0x07,
-        "Z": 0x08,
-        "ZZW": 0x09,
-        "ZW": 0x0A,
-        "WZW": 0x0B,
-        "W": 0x0C,
-        "WNW": 0x0D,
-        "NW": 0x0E,
-        "NNW": 0x0F,
-    }
+    wind_directions = WIND_DIRECTIONS
 
     def __init__(self, *args, **kwargs):
         self.channel = kwargs["channel"]
         self.frequency = kwargs["frequency"]
         self.gpio = GPIO(**kwargs)
+        self.clock = kwargs.get("clock", REAL_CLOCK)
+        self.link = Link(
+            self.gpio,
+            self.frequency,
+            checksum=kwargs.get("checksum", "none"),
+            max_retransmits=kwargs.get("max_retransmits", 3),
+            min_frequency=kwargs.get("min_frequency", 0),
+            error_threshold=kwargs.get("error_threshold", 0.1),
+            clock=self.clock.time,
+        )
         self.old_byte_array = None
         self.new_byte_array = None
         self.weather_data = {}
         self.bits: List[dict] = kwargs["bits"]
+        self.encoder = EncoderPlan(self.bits)
         self.stations = kwargs["stations"]
+        self.keep_alive = kwargs.get("keep_alive", 0.0)
+        self.random_value = None
+        self.last_sent = None
+        self.frames_sent = 0
+        self.frames_suppressed = 0
 
     def __repr__(self):
         return "WeatherVaneInterface(channel=%d, frequency=%d)" % (
@@ -46,6 +55,24 @@ class WeatherVaneInterface(object):
             self.frequency,
         )
 
+    def close(self):
+        """Release the SPI device"""
+        self.gpio.close()
+
+    def set_bits(self, bits: List[dict], encoder: Optional[EncoderPlan] = None):
+        """Encode the next frames with other bit fields, such as after the configuration was changed
+
+        The new L{EncoderPlan} is compiled before it replaces the current one, so a frame is always encoded with either
+        the old or the new fields. The next frame is sent even when its bytes have not changed.
+
+        @param encoder: the plan compiled from the bits, when it was compiled already
+        @raise InvalidConfigException: when the bit fields cannot be encoded
+        """
+        encoder = encoder or EncoderPlan(bits)
+        self.bits, self.encoder = bits, encoder
+        self.random_value = None
+        self.last_sent = None
+
     @property
     def data_changed(self):
         """Return whether or not the data was different the last time it was sent.
@@ -66,35 +93,64 @@ class WeatherVaneInterface(object):
         # Each element has a maximum value
         # Each element can vary only in discrete steps
 
+        The conversion itself is done by the L{EncoderPlan} that was compiled from the configuration when the
+        interface was created. The returned buffer is reused for the next frame. The random fields get the value of
+        the last frame that was sent, see L{send}.
+
         @precondition: the member 'requested data' is properly set
         @param weather_data: a dictionary containing the weatherdata
         @return: a byte array
         """
-        t_data = self.transmittable_data(weather_data, self.bits)
-
-        r = 0b0
-        length = 0
-        for data in self.bits:
-            bit_length = int(data["length"])
-            length += bit_length
-            bit_key = data["key"]
-            bit_value = t_data[bit_key]
-            r = r << bit_length
-            r += bit_value
-
-        result = r.to_bytes(length // 8, byteorder='big')
-        return result
+        with PROFILER.span("encode"):
+            return self.encoder.encode(weather_data, self.random_value)
 
     def send(self, weather_data):
-        """Send data to the connected SPI device.
+        """Send data to the connected SPI device, unless it is the same as the last frame that was sent.
+
+        Without a keep-alive period every frame is sent. With a keep-alive period, a frame that is the same as the
+        last frame is left out, until the keep-alive period has passed since the last transmission. The random fields
+        keep their value between transmissions, so they do not make an unchanged frame look different. They only get
+        a new value when a frame is actually sent.
 
         Keyword arguments:
         weather_data -- a dictionary with the data
+
+        @return: whether the frame was sent
+        """
+        frame = None
+        if self.keep_alive > 0:
+            frame = self.convert_data(weather_data)
+            if (
+                frame == self.new_byte_array
+                and self.last_sent is not None
+                and self.clock.monotonic() - self.last_sent < self.keep_alive
+            ):
+                logger.debug("Frame has not changed; not sending it")
+                self.frames_suppressed += 1
+                FRAMES.inc(labels=("suppressed",))
+                return False
+        if self.encoder.has_random:
+            self.random_value = getrandbits(self.encoder.bit_length)
+            frame = None
+        if frame is None:
+            frame = self.convert_data(weather_data)
+        self.send_frame(frame)
+        return True
+
+    def send_frame(self, data_array):
+        """Send a frame that has already been encoded to the connected SPI device.
+
+        Keyword arguments:
+        data_array -- the bytes of the frame
         """
-        data_array = self.convert_data(weather_data)
-        logger.info(f'Sending data {data_array} to device')
-        self.gpio.send_data(data_array)
-        self.old_byte_array, self.new_byte_array = self.new_byte_array, data_array
+        logger.info("Sending data %s to device", data_array, extra={"sampled": True})
+        with PROFILER.span("spi"):
+            delivered = self.link.send(data_array)
+        self.old_byte_array, self.new_byte_array = self.new_byte_array, bytes(data_array)
+        # a frame that did not arrive intact is sent again at the next tick, even when it has not changed
+        self.last_sent = self.clock.monotonic() if delivered else None
+        self.frames_sent += 1
+        FRAMES.inc(labels=("sent",))
 
     @property
     def sent_data(self):
@@ -104,7 +160,8 @@ class WeatherVaneInterface(object):
         that device, use get_data().
 
         Note that the data that actually reached the connected SPI device may have been altered due to all kinds of
-        transmission errors. This function does not actually return the data that reached the device.
+        transmission errors. This function does not actually return the data that reached the device. Configure a
+        checksum in [Bit Packing] to have the L{Link} verify that frames arrived intact.
 
         Returns:
         array of bytes
@@ -169,13 +226,65 @@ class WeatherVaneInterface(object):
 
 
 class Display(object):
+    """Turns the display on and off on a schedule, when auto-turn-off is enabled.
+
+    The periods in which the display is on are worked out once, from the windows of the L{DisplayWindow}. The display
+    then knows when it has to switch next, and does nothing until that moment: L{run} sleeps until then, and L{tick}
+    only reads the clock. The pin is only set when the display actually switches.
+
+    The periods are in local time, so a window from 06:45 through 22:00 starts at 06:45 on the days on which daylight
+    saving time begins or ends as well. Because the clock of a Raspberry Pi without a real-time clock can jump when it
+    is synchronised, the schedule is worked out again at least every MAX_SLEEP seconds.
+
+    The pin of the display is only claimed when auto-turn-off is enabled, so gpiozero is not imported otherwise.
+    """
+
+    MAX_SLEEP = 3600.0
+    # a switch that is due within this many seconds is made at once
+    TOLERANCE = 0.001
+
     def __init__(self, **kwargs):
-        self.auto_disable_display = kwargs.get("auto-turn-off", False)
-        start_time = kwargs.get("start-time", "6:30")
-        self.start_at_minutes = Display.convert_to_minutes(start_time)
-        end_time = kwargs.get("end-time", "22:00")
-        self.end_at_minutes = Display.convert_to_minutes(end_time)
-        self.display = gpiozero.LED(kwargs.get("pin", 4))
+        self.display = None
+        self.pin = None
+        self.lit = None
+        self.next_switch = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.clock = kwargs.get("clock", REAL_CLOCK)
+        self.configure(**kwargs)
+
+    def __repr__(self):
+        return "Display(auto_turn_off=%s, lit=%s, next_switch=%s)" % (
+            self.auto_disable_display,
+            self.lit,
+            datetime.fromtimestamp(self.next_switch).isoformat(timespec="minutes") if self.next_switch else None,
+        )
+
+    def configure(self, **kwargs):
+        """Take another schedule or pin, such as after the configuration was changed.
+
+        The pin is only released and claimed again when it changes, or when auto-turn-off is switched, so the display
+        does not flicker when only the times change. The new pin is claimed before the old one is released, so when it
+        cannot be claimed, the display keeps its current configuration.
+
+        @raise InvalidConfigException: when the times or the schedule are not written correctly
+        """
+        window = DisplayWindow.from_dict(kwargs)
+        pin = window.pin if window.auto_turn_off else None
+        if pin != self.pin:
+            display = None
+            if pin is not None:
+                import gpiozero
+
+                display = gpiozero.LED(pin)
+            self.close()
+            self.display, self.pin, self.lit = display, pin, None
+        self.window = window
+        self.auto_disable_display = window.auto_turn_off
+        self.start_at_minutes = window.start
+        self.end_at_minutes = window.end
+        self.next_switch = None
+        if self.wakeup is not None:
+            self.wakeup.set()
 
     @staticmethod
     def convert_to_minutes(time_text):
@@ -185,17 +294,78 @@ class Display(object):
         return minutes
 
     def is_active(self, current_minute):
+        """Return whether the display is on at a minute of the day, by the start time and the end time alone"""
         if self.start_at_minutes < self.end_at_minutes:
             return self.start_at_minutes <= current_minute <= self.end_at_minutes
-        else:
-            return (self.convert_to_minutes("00:00") <= current_minute <= self.end_at_minutes &
-                    self.start_at_minutes <= current_minute <= self.convert_to_minutes("23:59"))
+        return current_minute >= self.start_at_minutes or current_minute <= self.end_at_minutes
+
+    def periods(self, moment: datetime) -> List[Tuple[datetime, datetime]]:
+        """Return the periods in which the display is on, from the day before the moment until a week after it
+
+        @return: the start and the end of each period, in local time, sorted and without overlaps
+        """
+        periods = []
+        for offset in range(-1, 8):
+            day = datetime.combine(moment.date() + timedelta(days=offset), datetime.min.time())
+            for window in self.window.windows:
+                if day.weekday() in window.days:
+                    end = window.end + 1 + (MINUTES_PER_DAY if window.wraps else 0)
+                    periods.append((day + timedelta(minutes=window.start), day + timedelta(minutes=end)))
+        merged = []
+        for start, end in sorted(periods):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def state_at(self, moment: datetime) -> Tuple[bool, Optional[datetime]]:
+        """Return whether the display is on at a moment in local time, and when that changes next"""
+        for start, end in self.periods(moment):
+            if moment < start:
+                return False, start
+            if moment < end:
+                return True, end
+        return False, None
 
     def tick(self):
-        if self.auto_disable_display:
-            time_text = time.strftime("%H:%M")
-            current_minute = Display.convert_to_minutes(time_text)
-            if self.is_active(current_minute):
+        """Switch the display on or off, if a switch is due. Until then, only the clock is read."""
+        if not self.auto_disable_display:
+            return
+        now = self.clock.time()
+        if self.next_switch is not None:
+            if self.next_switch - self.MAX_SLEEP <= now < self.next_switch - self.TOLERANCE:
+                return
+            if abs(now - self.next_switch) < self.TOLERANCE:
+                now = self.next_switch
+        lit, change = self.state_at(datetime.fromtimestamp(now))
+        self.next_switch = min(change.timestamp(), now + self.MAX_SLEEP) if change else now + self.MAX_SLEEP
+        if lit != self.lit:
+            display_logger.info(f"Turning the display {'on' if lit else 'off'}")
+            if lit:
                 self.display.on()
             else:
                 self.display.off()
+            self.lit = lit
+
+    async def run(self):
+        """Switch the display on and off until the task is cancelled, sleeping until each next switch"""
+        self.wakeup = asyncio.Event()
+        try:
+            while True:
+                self.wakeup.clear()
+                self.tick()
+                if self.auto_disable_display and self.next_switch is not None:
+                    timeout = max(0.0, self.next_switch - self.clock.time())
+                else:
+                    timeout = self.MAX_SLEEP
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.wakeup = None
+
+    def close(self):
+        if self.display is not None:
+            self.display.close()